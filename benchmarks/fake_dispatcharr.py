@@ -0,0 +1,256 @@
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+# Local stand-in for a Dispatcharr server plus the IPTV provider behind it.
+# One process serves:
+#   /api/channels/channels/               full channel list
+#   /api/channels/channels/{id}/streams/  a channel's streams
+#   /api/channels/streams/                all streams, DRF-paginated (?page=&page_size=)
+#   /output/m3u[?direct=true]             playlist
+#   /proxy/ts/status                      live channels (a configurable few)
+#   /media/{key}.ts, /hls/{key}/...       ffmpeg-generated test streams
+#   /__bench/stats, /__bench/reset        request counters for the benchmark runner
+# Stream faults (latency, stalls, failures) are picked deterministically from
+# the stream key, so every run of a given catalogue sees the same faults.
+
+MEDIA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".media")
+STALL_SECONDS = 30
+
+
+def ensure_media(folder=MEDIA_DIR):
+    # One short H.264 test clip as MPEG-TS and as HLS, generated once and reused
+    ts_path = os.path.join(folder, "test.ts")
+    hls_path = os.path.join(folder, "hls", "index.m3u8")
+    if os.path.exists(ts_path) and os.path.exists(hls_path):
+        return ts_path, hls_path
+    os.makedirs(os.path.dirname(hls_path), exist_ok=True)
+    source = ["-f", "lavfi", "-i", "testsrc=size=1280x720:rate=25", "-f", "lavfi", "-i", "sine=frequency=1000",
+              "-t", "6", "-c:v", "libx264", "-preset", "ultrafast", "-g", "50", "-c:a", "aac"]
+    subprocess.run(["ffmpeg", "-y", "-v", "error"] + source + ["-f", "mpegts", ts_path], check=True)
+    subprocess.run(["ffmpeg", "-y", "-v", "error"] + source + ["-f", "hls", "-hls_time", "2", "-hls_list_size", "0", hls_path], check=True)
+    return ts_path, hls_path
+
+
+def _fraction(key, salt):
+    digest = hashlib.sha1(f"{salt}:{key}".encode()).digest()
+    return int.from_bytes(digest[:4], 'big') / 2 ** 32
+
+
+class Catalogue:
+    def __init__(self, channels=1000, streams_per_channel=2, duplicate_ratio=0.1, hls_ratio=0.2,
+                 metadata_ratio=0.0, latency_ratio=0.1, latency_ms=800, stall_ratio=0.02, fail_ratio=0.05,
+                 live_channels=0, base_url="http://127.0.0.1:9191"):
+        self.channels = []
+        self.streams = {}      # channel id -> [stream]
+        self.all_streams = []
+        self.faults = {}       # stream key -> 'latency' | 'stall' | 'fail'
+        self.latency_ms = latency_ms
+        stream_id = 0
+        for cid in range(1, channels + 1):
+            uuid = f"00000000-0000-4000-8000-{cid:012d}"
+            self.channels.append({'id': cid, 'uuid': uuid, 'name': f"Bench Channel {cid}", 'channel_number': cid,
+                                  'channel_group_id': cid % 50})
+            streams = []
+            for n in range(streams_per_channel):
+                stream_id += 1
+                # Duplicates: some channels re-use an earlier channel's stream URL
+                key = f"s{stream_id}"
+                if cid > 1 and _fraction(cid * 100 + n, 'dup') < duplicate_ratio:
+                    key = f"s{1 + int(_fraction(cid, 'dup-of') * (stream_id - 1))}"
+                if _fraction(key, 'hls') < hls_ratio:
+                    url = f"{base_url}/hls/{key}/index.m3u8"
+                else:
+                    url = f"{base_url}/media/{key}.ts"
+                stream = {'id': stream_id, 'name': f"Bench Stream {stream_id}", 'url': url}
+                if _fraction(key, 'meta') < metadata_ratio:
+                    stream.update({'codec': 'h264', 'resolution': '1280x720', 'fps': 25})
+                roll = _fraction(key, 'fault')
+                if roll < fail_ratio:
+                    self.faults[key] = 'fail'
+                elif roll < fail_ratio + stall_ratio:
+                    self.faults[key] = 'stall'
+                elif roll < fail_ratio + stall_ratio + latency_ratio:
+                    self.faults[key] = 'latency'
+                streams.append(stream)
+                self.all_streams.append(stream)
+            self.streams[cid] = streams
+        self.by_uuid = {ch['uuid']: ch for ch in self.channels}
+        self.live = [self.channels[i] for i in range(min(live_channels, channels))]
+        self.base_url = base_url
+
+    def m3u(self, direct):
+        lines = ["#EXTM3U"]
+        for ch in self.channels:
+            streams = self.streams[ch['id']]
+            if not streams:
+                continue
+            lines.append(f'#EXTINF:-1 tvg-id="bench.{ch["id"]}" tvg-name="{ch["name"]}" tvg-chno="{ch["channel_number"]}" '
+                         f'group-title="Group {ch["channel_group_id"]}",{ch["name"]}')
+            lines.append(streams[0]['url'] if direct else f"{self.base_url}/proxy/ts/stream/{ch['uuid']}")
+        return "\n".join(lines) + "\n"
+
+    def proxy_status(self):
+        channels = []
+        for ch in self.live:
+            channels.append({'channel_id': ch['uuid'], 'state': 'active', 'url': self.streams[ch['id']][0]['url'],
+                             'client_count': 1, 'video_codec': 'h264', 'resolution': '1280x720', 'source_fps': 25})
+        return {'channels': channels, 'count': len(channels)}
+
+
+class FakeDispatcharr(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, catalogue, media):
+        super().__init__(address, FakeHandler)
+        self.catalogue = catalogue
+        self.ts_path, self.hls_path = media
+        self._lock = threading.Lock()
+        self.counts = {}
+
+    def count(self, name):
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+
+class FakeHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, body, content_type="application/json", status=200):
+        if not isinstance(body, bytes):
+            body = (body if isinstance(body, str) else json.dumps(body)).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        cat = server.catalogue
+        parsed = urlparse(self.path)
+        path = parsed.path
+        query = parse_qs(parsed.query)
+        parts = [p for p in path.split('/') if p]
+
+        if path == '/__bench/stats':
+            with server._lock:
+                return self._send(dict(server.counts))
+        if path == '/__bench/reset':
+            with server._lock:
+                server.counts = {}
+            return self._send({})
+
+        if path == '/api/channels/channels/':
+            server.count('channels')
+            return self._send(cat.channels)
+        if len(parts) == 5 and parts[:3] == ['api', 'channels', 'channels'] and parts[4] == 'streams':
+            server.count('channel_streams')
+            try:
+                return self._send(cat.streams.get(int(parts[3]), []))
+            except ValueError:
+                return self._send({'detail': 'Not found.'}, status=404)
+        if path == '/api/channels/streams/':
+            server.count('streams')
+            page = int(query.get('page', ['1'])[0])
+            size = int(query.get('page_size', ['100'])[0])
+            start = (page - 1) * size
+            results = cat.all_streams[start:start + size]
+            next_url = f"{cat.base_url}{path}?page={page + 1}&page_size={size}" if start + size < len(cat.all_streams) else None
+            return self._send({'count': len(cat.all_streams), 'next': next_url, 'previous': None, 'results': results})
+        if path == '/output/m3u':
+            server.count('output_m3u')
+            return self._send(cat.m3u(query.get('direct', [''])[0] == 'true'), "audio/x-mpegurl")
+        if path == '/proxy/ts/status':
+            server.count('proxy_status')
+            return self._send(cat.proxy_status())
+
+        if parts and parts[0] in ('media', 'hls', 'proxy'):
+            return self._serve_media(parts)
+        return self._send({'detail': 'Not found.'}, status=404)
+
+    def _serve_media(self, parts):
+        server = self.server
+        if parts[0] == 'proxy':
+            # Proxy URLs play the channel's first stream
+            uuid = parts[-1]
+            ch = server.catalogue.by_uuid.get(uuid)
+            streams = server.catalogue.streams.get(ch['id'], []) if ch else []
+            if not streams:
+                return self._send(b"", status=404)
+            parts = [p for p in urlparse(streams[0]['url']).path.split('/') if p]
+        key = parts[1].split('.')[0]
+        if parts[0] == 'media' or parts[-1].endswith('.m3u8'):
+            server.count('stream_opens')
+        fault = server.catalogue.faults.get(key)
+        if fault == 'fail':
+            server.count('faults_fail')
+            return self._send(b"", "text/plain", status=503)
+        if fault == 'latency':
+            time.sleep(server.catalogue.latency_ms / 1000)
+        if parts[0] == 'hls':
+            filename = os.path.join(os.path.dirname(server.hls_path), parts[-1])
+            content_type = "application/vnd.apple.mpegurl" if filename.endswith('.m3u8') else "video/mp2t"
+        else:
+            filename = server.ts_path
+            content_type = "video/mp2t"
+        if not os.path.exists(filename):
+            return self._send(b"", status=404)
+        with open(filename, 'rb') as f:
+            data = f.read()
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        if fault == 'stall':
+            # Headers and a little data, then nothing: the client's timeout has to fire
+            server.count('faults_stall')
+            self.wfile.write(data[:188 * 10])
+            self.wfile.flush()
+            time.sleep(STALL_SECONDS)
+            self.close_connection = True
+            return
+        self.wfile.write(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Dispatcharr server with synthetic streams for benchmarks")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9191)
+    parser.add_argument('--channels', type=int, default=1000)
+    parser.add_argument('--streams-per-channel', type=int, default=2)
+    parser.add_argument('--duplicate-ratio', type=float, default=0.1)
+    parser.add_argument('--hls-ratio', type=float, default=0.2)
+    parser.add_argument('--metadata-ratio', type=float, default=0.0, help='Fraction of streams whose JSON already has codec/resolution/fps')
+    parser.add_argument('--latency-ratio', type=float, default=0.1)
+    parser.add_argument('--latency-ms', type=int, default=800)
+    parser.add_argument('--stall-ratio', type=float, default=0.02)
+    parser.add_argument('--fail-ratio', type=float, default=0.05)
+    parser.add_argument('--live-channels', type=int, default=0)
+    args = parser.parse_args()
+
+    media = ensure_media()
+    catalogue = Catalogue(args.channels, args.streams_per_channel, args.duplicate_ratio, args.hls_ratio,
+                          args.metadata_ratio, args.latency_ratio, args.latency_ms, args.stall_ratio,
+                          args.fail_ratio, args.live_channels, base_url=f"http://{args.host}:{args.port}")
+    server = FakeDispatcharr((args.host, args.port), catalogue, media)
+    print(f"ready http://{args.host}:{args.port} channels={args.channels}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+import argparse
+import gc
+import json
+import os
+import sys
+import tracemalloc
+import uuid
+
+# Memory benchmark for the in-memory catalogue. For each size it builds the
+# same synthetic lineup twice, in a fresh tracemalloc window each time:
+#   dicts  the API's channel dicts as fetched, plus a result row tuple of
+#          strings per channel (what the GUI held before dispatcharr_store)
+#   store  dispatcharr_store.CatalogueStore loaded from those dicts, with the
+#          same results set through set_result()
+# and reports the bytes retained by each layout and the ratio. Channel dicts
+# carry the fields a real Dispatcharr /api/channels/channels/ response does.
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+CODECS = ("h264", "hevc", "mpeg2video")
+RESOLUTIONS = ("1920x1080", "1280x720", "720x576", "3840x2160")
+FPS = ("25", "29.97", "50", "59.94")
+
+
+def make_channels(count):
+    channels = []
+    for i in range(1, count + 1):
+        channels.append({
+            'id': i, 'uuid': str(uuid.UUID(int=i)), 'name': f"Channel {i} HD", 'channel_number': float(i),
+            'channel_group_id': i % 50, 'tvg_id': f"channel{i}.example", 'tvc_guide_stationid': None,
+            'epg_data_id': i, 'logo_id': i, 'logo_url': f"https://logos.example/{i}.png",
+            'streams': [i * 2, i * 2 + 1], 'stream_profile_id': None, 'user_level': 0,
+            'auto_created': False, 'auto_created_by': None, 'auto_created_by_name': None,
+        })
+    return channels
+
+
+def make_results(count):
+    results = []
+    for i in range(count):
+        if i % 7 == 0:
+            results.append({'status': "Offline", 'codec': None, 'resolution': None, 'fps': None})
+        else:
+            results.append({'status': "Online", 'codec': CODECS[i % 3], 'resolution': RESOLUTIONS[i % 4], 'fps': FPS[i % 4]})
+    return results
+
+
+def _measure(build):
+    gc.collect()
+    tracemalloc.start()
+    kept = build()
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del kept
+    return current, peak
+
+
+def dict_layout(count):
+    results = make_results(count)
+
+    def build():
+        channels = make_channels(count)
+        # Tree row values as the GUI built them: strings per column
+        rows = [(str(ch['id']), ch['name'], r['status'], str(r['codec'] or ''), str(r['resolution'] or ''),
+                 str(r['fps'] or ''), "Show Image") for ch, r in zip(channels, results)]
+        return channels, rows
+    return _measure(build)
+
+
+def store_layout(count):
+    from dispatcharr_store import CatalogueStore
+    results = make_results(count)
+
+    def build():
+        store = CatalogueStore().load(make_channels(count))
+        for record, r in zip(store.records, results):
+            store.set_result(record.id, r)
+        return store
+    return _measure(build)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="In-memory catalogue layout benchmark")
+    parser.add_argument('--sizes', default="1000,10000,50000", help="Comma-separated channel counts")
+    parser.add_argument('--out', help="Also write the JSON report to this file")
+    args = parser.parse_args()
+    report = {'python': sys.version.split()[0], 'cases': []}
+    for size in [int(s) for s in args.sizes.split(',') if s.strip()]:
+        dict_current, dict_peak = dict_layout(size)
+        store_current, store_peak = store_layout(size)
+        report['cases'].append({
+            'channels': size,
+            'dicts_mb': round(dict_current / 1048576, 2), 'dicts_peak_mb': round(dict_peak / 1048576, 2),
+            'store_mb': round(store_current / 1048576, 2), 'store_peak_mb': round(store_peak / 1048576, 2),
+            'bytes_per_channel': {'dicts': dict_current // size, 'store': store_current // size},
+            'ratio': round(dict_current / store_current, 1) if store_current else None,
+        })
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+
+
+if __name__ == '__main__':
+    main()
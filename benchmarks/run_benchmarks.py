@@ -0,0 +1,236 @@
+import argparse
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+# Benchmark runner. For each catalogue size it starts fake_dispatcharr.py in
+# its own process, then runs each case in a fresh child process (so peak RSS
+# is per case) against it:
+#   gui  the GUI's analyze path (dispatcharr_probe.analyze_channel driven by
+#        AnalyzeRun, with the GUI's capture and history), no Tk window
+#   cli  dispatcharr_channel_status_cli.py --analyze ... --format jsonl
+# and prints/saves one JSON report so runs before and after a change can be
+# diffed. With --replay FIXTURE (recorded by the CLI's --record) no server is
+# started: both cases replay the recorded production responses instead.
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+REPO = os.path.dirname(HERE)
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _peak_rss_mb(who):
+    if resource is None:
+        return None
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(who).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def _latency_stats(results):
+    from dispatcharr_channel_status_cli import percentile
+    probe_ms = [r['probe_ms'] for r in results if r.get('probe_ms') is not None]
+    statuses = {}
+    for r in results:
+        statuses[r.get('status')] = statuses.get(r.get('status'), 0) + 1
+    p50, p95 = percentile(probe_ms, 50), percentile(probe_ms, 95)
+    return {
+        'streams': len(results),
+        'probed': len(probe_ms),
+        'p50_ms': round(p50, 1) if p50 is not None else None,
+        'p95_ms': round(p95, 1) if p95 is not None else None,
+        'statuses': statuses,
+    }
+
+
+def run_gui_case(url, sample, workers):
+    from dispatcharr_errors import ErrorLog
+    from dispatcharr_history import HistoryStore
+    from dispatcharr_metrics import METRICS
+    from dispatcharr_probe import fetch_channels, analyze_channel, CAPTURE_PROBED
+    from dispatcharr_runs import AnalyzeRun
+
+    started = time.monotonic()
+    channels = fetch_channels(url, "bench")
+    selected = channels[:sample]
+    history = HistoryStore()
+    errors = ErrorLog()
+    results = []
+
+    def analyze(values):
+        # The GUI's hooks (see ChannelStatusApp._on_channel_result), minus the Tk row updates
+        channel_id, name, channel = values
+
+        def on_result(channel_results, measured):
+            if measured:
+                history.record(channel_results)
+            results.extend(channel_results)
+
+        analyze_channel(channel_id, name, channel, url, "bench", run, capture=CAPTURE_PROBED, on_result=on_result,
+                        on_error=lambda category, message, host: errors.record(category, message, host, channel_id, name))
+
+    run = AnalyzeRun(analyze, max_workers=workers, key_fn=lambda values: str(values[0]))
+    run.add([(ch['id'], ch['name'], ch) for ch in selected])
+    run.start()
+    while run.running():
+        time.sleep(0.05)
+    history.close()
+    wall = time.monotonic() - started
+    counters, _ = METRICS.snapshot()
+    report = {
+        'channels': len(selected),
+        'wall_s': round(wall, 2),
+        'peak_rss_mb': _peak_rss_mb(resource.RUSAGE_SELF) if resource else None,
+        'errors': errors.total(),
+        'client_api_calls': {dict(labels).get('endpoint', name): v for (name, labels), v in counters.items() if name == 'api_calls_total'},
+    }
+    report.update(_latency_stats(results))
+    return report
+
+
+def run_cli_case(url, sample, workers, total_channels, replay=None, replay_speed=1.0):
+    cmd = [sys.executable, os.path.join(REPO, "dispatcharr_channel_status_cli.py"), "--url", url, "--api-key", "bench",
+           "--format", "jsonl", "--no-history", "--workers", str(workers)]
+    if replay:
+        cmd += ["--replay", replay, "--replay-speed", str(replay_speed)]
+    if sample >= total_channels:
+        cmd.append("--analyze-all")
+    else:
+        cmd += ["--analyze", ",".join(str(i) for i in range(1, sample + 1))]
+    started = time.monotonic()
+    proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    wall = time.monotonic() - started
+    results = [json.loads(line) for line in proc.stdout.splitlines() if line.startswith('{')]
+    report = {
+        'channels': len({r.get('channel_id') for r in results}),
+        'wall_s': round(wall, 2),
+        'peak_rss_mb': _peak_rss_mb(resource.RUSAGE_CHILDREN) if resource else None,
+        'exit_code': proc.returncode,
+    }
+    report.update(_latency_stats([r for r in results if not r.get('error')]))
+    return report
+
+
+def start_server(size, args):
+    port = _free_port()
+    cmd = [sys.executable, os.path.join(HERE, "fake_dispatcharr.py"), "--port", str(port), "--channels", str(size),
+           "--streams-per-channel", str(args.streams_per_channel), "--duplicate-ratio", str(args.duplicate_ratio),
+           "--latency-ratio", str(args.latency_ratio), "--stall-ratio", str(args.stall_ratio),
+           "--fail-ratio", str(args.fail_ratio), "--live-channels", str(args.live_channels)]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True)
+    line = proc.stdout.readline()
+    if not line.startswith("ready"):
+        proc.kill()
+        raise RuntimeError(f"fake server failed to start: {line!r}")
+    return proc, f"http://127.0.0.1:{port}"
+
+
+def run_child(args):
+    # Child process: one case, JSON on stdout
+    sys.path.insert(0, REPO)
+    replay = os.path.abspath(args.replay) if args.replay else None
+    os.chdir(tempfile.mkdtemp(prefix="dispatcharr-bench-"))
+    if args.child == 'gui':
+        if replay:
+            from dispatcharr_replay import Replayer
+            Replayer(replay, args.replay_speed).start()
+        report = run_gui_case(args.url, args.sample, args.workers)
+    else:
+        report = run_cli_case(args.url, args.sample, args.workers, args.total, replay, args.replay_speed)
+    print(json.dumps(report))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dispatcharr Channel Status offline benchmarks")
+    parser.add_argument('--sizes', default="1000,10000,50000", help='Catalogue sizes (channels), comma separated')
+    parser.add_argument('--sample', type=int, default=300, help='Channels analyzed per case (default 300)')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--cases', default="gui,cli")
+    parser.add_argument('--streams-per-channel', type=int, default=2)
+    parser.add_argument('--duplicate-ratio', type=float, default=0.1)
+    parser.add_argument('--latency-ratio', type=float, default=0.1)
+    parser.add_argument('--stall-ratio', type=float, default=0.02)
+    parser.add_argument('--fail-ratio', type=float, default=0.05)
+    parser.add_argument('--live-channels', type=int, default=0)
+    parser.add_argument('--replay', metavar='FIXTURE', help='Run the cases against a recorded fixture instead of the fake server')
+    parser.add_argument('--replay-speed', type=float, default=1.0, help='Replay: scale recorded latencies (default 1)')
+    parser.add_argument('--out', help='Also write the JSON report to this file')
+    parser.add_argument('--child', choices=['gui', 'cli'], help=argparse.SUPPRESS)
+    parser.add_argument('--url', help=argparse.SUPPRESS)
+    parser.add_argument('--total', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args)
+        return
+
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        rev = None
+    report = {
+        'meta': {'git_rev': rev, 'python': platform.python_version(), 'platform': platform.platform(),
+                 'started': time.strftime("%Y-%m-%dT%H:%M:%S"), 'sample': args.sample, 'workers': args.workers},
+        'results': [],
+    }
+    sizes = [int(s) for s in args.sizes.split(',') if s.strip()]
+    if args.replay:
+        # The fixture fixes the catalogue; its size is whatever was recorded
+        sizes = [args.sample]
+        report['meta']['replay'] = os.path.basename(args.replay)
+    for size in sizes:
+        if args.replay:
+            server, url = None, "http://replay.invalid"
+        else:
+            server, url = start_server(size, args)
+        try:
+            for case in [c.strip() for c in args.cases.split(',') if c.strip()]:
+                if server:
+                    requests.get(f"{url}/__bench/reset", timeout=10)
+                cmd = [sys.executable, os.path.abspath(__file__), "--child", case, "--url", url,
+                       "--sample", str(args.sample), "--workers", str(args.workers), "--total", str(size)]
+                if args.replay:
+                    cmd += ["--replay", os.path.abspath(args.replay), "--replay-speed", str(args.replay_speed)]
+                proc = subprocess.run(cmd, stdout=subprocess.PIPE, text=True)
+                result = {'case': case, 'catalogue': size if server else None}
+                try:
+                    result.update(json.loads(proc.stdout.strip().splitlines()[-1]))
+                except (IndexError, ValueError):
+                    result['error'] = f"case exited with {proc.returncode}"
+                if server:
+                    result['server_requests'] = requests.get(f"{url}/__bench/stats", timeout=10).json()
+                if result.get('wall_s'):
+                    result['streams_per_s'] = round(result.get('streams', 0) / result['wall_s'], 2)
+                report['results'].append(result)
+                print(f"{case:>4} {size:>6} channels: {result.get('wall_s')}s, {result.get('streams_per_s')} streams/s, "
+                      f"p50 {result.get('p50_ms')} ms, p95 {result.get('p95_ms')} ms, rss {result.get('peak_rss_mb')} MB",
+                      file=sys.stderr)
+        finally:
+            if server:
+                server.kill()
+                server.wait()
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
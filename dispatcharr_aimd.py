@@ -0,0 +1,149 @@
+import threading
+import time
+from contextlib import contextmanager
+
+from dispatcharr_metrics import percentile
+from dispatcharr_probe import stream_host, host_capacity
+
+# Adaptive probe concurrency (AIMD). Instead of a fixed thread count, each
+# window of completed probes is judged: if throughput held up and timeouts,
+# errors and latency stayed near their baseline the limit grows by one; if
+# probes start timing out, failing or slowing down (a provider throttling us)
+# it is halved. This runs once globally and once per stream host, so one
+# struggling provider is backed off without slowing the rest.
+# The configured thread count / per-host value is only the ceiling.
+
+PROBE_TIMEOUT = 10.0        # ffprobe_stream's timeout; probes this slow count as timeouts
+TIMEOUT_RATE_LIMIT = 0.10   # more than 10% timeouts in a window -> back off
+ERROR_RATE_MARGIN = 0.25    # error rate this far above its baseline -> back off
+LATENCY_FACTOR = 2.0        # median latency this many times the baseline -> back off
+THROUGHPUT_TOLERANCE = 0.9  # grow while throughput is at least 90% of the last window's
+
+
+class _Controller:
+    def __init__(self, level, ceiling, min_level=1):
+        self.level = max(min_level, min(level, ceiling))
+        self.ceiling = ceiling
+        self.min_level = min_level
+        self.baseline_latency = None
+        self.baseline_errors = None
+        self.last_throughput = None
+        self._reset()
+
+    def _reset(self):
+        self.started = time.monotonic()
+        self.count = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.latencies = []
+
+    def observe(self, ok, timed_out, latency):
+        self.count += 1
+        self.errors += 0 if ok else 1
+        self.timeouts += 1 if timed_out else 0
+        if latency is not None:
+            self.latencies.append(latency)
+        # A window is a couple of "rounds" at the current level
+        if self.count >= max(4, 2 * int(self.level)):
+            self._adjust()
+
+    def _adjust(self):
+        elapsed = max(1e-6, time.monotonic() - self.started)
+        throughput = self.count / elapsed
+        error_rate = self.errors / self.count
+        timeout_rate = self.timeouts / self.count
+        p50 = percentile(self.latencies, 50)
+        congested = (
+            timeout_rate > TIMEOUT_RATE_LIMIT
+            or (self.baseline_errors is not None and error_rate > self.baseline_errors + ERROR_RATE_MARGIN)
+            or (p50 is not None and self.baseline_latency and p50 > LATENCY_FACTOR * self.baseline_latency)
+        )
+        if congested:
+            self.level = max(self.min_level, int(self.level / 2))
+        else:
+            if self.last_throughput is None or throughput >= THROUGHPUT_TOLERANCE * self.last_throughput:
+                self.level = min(self.ceiling, self.level + 1)
+            # Baselines only learn from healthy windows
+            if p50 is not None:
+                self.baseline_latency = p50 if self.baseline_latency is None else self.baseline_latency + 0.2 * (p50 - self.baseline_latency)
+            self.baseline_errors = error_rate if self.baseline_errors is None else self.baseline_errors + 0.2 * (error_rate - self.baseline_errors)
+        self.last_throughput = throughput
+        self._reset()
+
+
+class AdaptiveLimiter:
+    # Drop-in for dispatcharr_probe.HostLimiter: limit(url) yields False when
+    # viewers hold the host's whole budget, and observe() feeds back results.
+    def __init__(self, ceiling, per_host=0, sessions=None, start=2):
+        self.ceiling = max(1, int(ceiling))
+        self.per_host = per_host
+        self.host_ceiling = int(per_host) if per_host else self.ceiling
+        self.sessions = sessions
+        self.start = start
+        self._cond = threading.Condition()
+        self._global = _Controller(start, self.ceiling)
+        self._hosts = {}
+        self._inflight = {}
+        self._total = 0
+
+    def _host(self, host):
+        controller = self._hosts.get(host)
+        if controller is None:
+            controller = self._hosts[host] = _Controller(self.start, self.host_ceiling)
+        return controller
+
+    def _host_capacity(self, host):
+        # Viewer connections only come out of a real budget (--per-host or the
+        # account's max_streams), as in HostLimiter; the ceiling alone never makes a host busy
+        capacity = host_capacity(host, self.per_host, self.sessions)
+        level = self._host(host).level
+        return level if capacity is None else min(level, capacity)
+
+    @contextmanager
+    def limit(self, url):
+        if not url:
+            yield True
+            return
+        host = stream_host(url)
+        with self._cond:
+            while True:
+                capacity = self._host_capacity(host)
+                if capacity <= 0:
+                    break
+                if self._total < self._global.level and self._inflight.get(host, 0) < capacity:
+                    break
+                self._cond.wait(timeout=1.0)
+            allowed = capacity > 0
+            if allowed:
+                self._inflight[host] = self._inflight.get(host, 0) + 1
+                self._total += 1
+        if not allowed:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            with self._cond:
+                self._inflight[host] -= 1
+                self._total -= 1
+                self._cond.notify_all()
+
+    def observe(self, url, result):
+        # Only real probes teach the controller; answers from API/stats/cache cost nothing
+        if not url or result.get('probe_ms') is None:
+            return
+        latency = result['probe_ms'] / 1000
+        ok = result.get('status') == "Online"
+        timed_out = latency >= PROBE_TIMEOUT * 0.95
+        with self._cond:
+            self._global.observe(ok, timed_out, latency)
+            self._host(stream_host(url)).observe(ok, timed_out, latency)
+            self._cond.notify_all()
+
+    def level(self):
+        with self._cond:
+            return self._global.level
+
+    def host_levels(self):
+        with self._cond:
+            return {host: c.level for host, c in self._hosts.items()}
@@ -0,0 +1,174 @@
+import sqlite3
+import time
+import numpy as np
+
+from dispatcharr_history import HISTORY_DB, connect, ensure_schema
+
+# Reliability analytics over the probe history. Each (channel, stream) pair is
+# a series; rows are loaded as NumPy columns sorted by (series, ts) and every
+# metric is computed with array ops over the whole table at once.
+
+FPS_CHANGE_TOLERANCE = 0.5
+
+# Latest known name per channel; MAX(rowid) per channel_id is answered from the index
+NAMES_SQL = """
+SELECT channel_id, channel_name FROM probes_hourly
+UNION ALL
+SELECT channel_id, channel_name FROM probes WHERE rowid IN (SELECT MAX(rowid) FROM probes GROUP BY channel_id)
+"""
+
+# Numeric columns only, each row straight into RAW_DTYPE (the series is the
+# history's integer series_id). Unordered: sorting in NumPy is much cheaper
+# than ORDER BY in SQLite
+RAW_SQL = """
+SELECT series_id, ts, status, IFNULL(probe_ms, -1.0), IFNULL(width, 0), IFNULL(height, 0), IFNULL(fps, -1.0)
+FROM probes WHERE ts >= ? AND ts < ? AND series_id IS NOT NULL
+"""
+
+# Rollups only contribute to uptime, so SQLite sums them per series
+ROLLUP_SQL = """
+SELECT s.id, SUM(h.samples), SUM(h.online)
+FROM probes_hourly h JOIN series s ON s.channel_id = h.channel_id AND s.stream_url = h.stream_url
+WHERE h.hour >= ? AND h.hour < ? GROUP BY s.id
+"""
+
+RAW_DTYPE = np.dtype([
+    ('series', np.int64), ('ts', np.float64), ('status', np.int8), ('probe_ms', np.float64),
+    ('width', np.int32), ('height', np.int32), ('fps', np.float64),
+])
+ROLLUP_DTYPE = np.dtype([('series', np.int64), ('samples', np.int64), ('online', np.int64)])
+
+
+def load_history(path=HISTORY_DB, since=None, until=None):
+    # Returns (labels, raw rows, hourly rollups) for [since, until); 'series'
+    # in both arrays indexes labels
+    until = until if until is not None else time.time() + 1
+    since = since if since is not None else 0
+    conn = connect(path)
+    try:
+        ensure_schema(conn)
+        names = dict(conn.execute(NAMES_SQL).fetchall())
+        keys = {series_id: (channel_id, stream_url) for series_id, channel_id, stream_url in conn.execute("SELECT id, channel_id, stream_url FROM series")}
+        raw = np.fromiter(conn.execute(RAW_SQL, (since, until)), dtype=RAW_DTYPE)
+        # Skip hours already covered by raw rows
+        rollup_until = min(until, raw['ts'].min()) if len(raw) else until
+        rollups = np.fromiter(conn.execute(ROLLUP_SQL, (since, rollup_until)), dtype=ROLLUP_DTYPE)
+    except sqlite3.OperationalError:
+        # No history recorded yet
+        return [], np.empty(0, dtype=RAW_DTYPE), np.empty(0, dtype=ROLLUP_DTYPE)
+    finally:
+        conn.close()
+    # Dense indices for the series present, in (channel_id, stream_url) order
+    present = np.array(sorted(np.unique(np.concatenate((raw['series'], rollups['series']))).tolist(), key=keys.__getitem__),
+                       dtype=np.int64)
+    index = np.zeros(int(present.max()) + 1 if len(present) else 0, dtype=np.int64)
+    index[present] = np.arange(len(present))
+    raw['series'] = index[raw['series']]
+    rollups['series'] = index[rollups['series']]
+    raw = raw[np.lexsort((raw['ts'], raw['series']))]
+    labels = []
+    for series_id in present.tolist():
+        channel_id, stream_url = keys[series_id]
+        labels.append((channel_id, names.get(channel_id), stream_url))
+    return labels, raw, rollups
+
+
+def _group_percentiles(groups, values, count, quantiles):
+    # Linear-interpolated percentiles per group, from one lexsort
+    out = {q: np.full(count, np.nan) for q in quantiles}
+    if not len(values):
+        return out
+    order = np.lexsort((values, groups))
+    groups, values = groups[order], values[order]
+    sizes = np.bincount(groups, minlength=count)
+    starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+    present = sizes > 0
+    for q in quantiles:
+        pos = (sizes[present] - 1) * (q / 100.0)
+        lo = np.floor(pos).astype(np.int64)
+        hi = np.ceil(pos).astype(np.int64)
+        frac = pos - lo
+        base = starts[present]
+        out[q][present] = values[base + lo] * (1 - frac) + values[base + hi] * frac
+    return out
+
+
+def compute_reliability(raw, rollups, count):
+    series = raw['series']
+    status = raw['status'].astype(np.int64)
+    ts = raw['ts']
+
+    samples = np.bincount(series, minlength=count) + np.bincount(rollups['series'], weights=rollups['samples'], minlength=count)
+    online = np.bincount(series, weights=status, minlength=count) + np.bincount(rollups['series'], weights=rollups['online'], minlength=count)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        uptime = np.where(samples > 0, online / samples * 100.0, np.nan)
+
+    # Consecutive probes of the same series
+    same = series[1:] == series[:-1]
+    nxt = series[1:]
+    was_up = status[:-1] == 1
+    flips = same & (status[1:] != status[:-1])
+    drops = same & was_up & (status[1:] == 0)
+    flaps = np.bincount(nxt[flips], minlength=count)
+    failures = np.bincount(nxt[drops], minlength=count)
+    up_seconds = np.bincount(nxt[same & was_up], weights=(ts[1:] - ts[:-1])[same & was_up], minlength=count)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mtbf_hours = np.where(failures > 0, up_seconds / failures / 3600.0, np.nan)
+
+    width, height, fps = raw['width'], raw['height'], raw['fps']
+    has_res = (width[1:] > 0) & (width[:-1] > 0)
+    res_changed = same & has_res & ((width[1:] != width[:-1]) | (height[1:] != height[:-1]))
+    has_fps = (fps[1:] > 0) & (fps[:-1] > 0)
+    fps_changed = same & has_fps & (np.abs(fps[1:] - fps[:-1]) > FPS_CHANGE_TOLERANCE)
+
+    timed = raw['probe_ms'] >= 0
+    pct = _group_percentiles(series[timed], raw['probe_ms'][timed], count, (50, 95))
+
+    return {
+        'samples': samples.astype(np.int64),
+        'uptime_pct': uptime,
+        'failures': failures,
+        'mtbf_hours': mtbf_hours,
+        'flaps': flaps,
+        'p50_ms': pct[50],
+        'p95_ms': pct[95],
+        'resolution_changes': np.bincount(nxt[res_changed], minlength=count),
+        'fps_changes': np.bincount(nxt[fps_changed], minlength=count),
+    }
+
+
+def _value(v):
+    if isinstance(v, (np.floating, float)):
+        return None if np.isnan(v) else round(float(v), 2)
+    return int(v)
+
+
+def reliability_report(path=HISTORY_DB, since=None, until=None):
+    labels, raw, rollups = load_history(path, since, until)
+    if not labels:
+        return []
+    metrics = compute_reliability(raw, rollups, len(labels))
+    rows = []
+    for i, (channel_id, channel_name, stream_url) in enumerate(labels):
+        row = {'channel_id': channel_id, 'channel_name': channel_name, 'stream_url': stream_url}
+        for key, column in metrics.items():
+            row[key] = _value(column[i])
+        rows.append(row)
+    # Least reliable first
+    rows.sort(key=lambda r: (r['uptime_pct'] if r['uptime_pct'] is not None else 101, -r['flaps']))
+    return rows
+
+
+def format_report(rows):
+    header = f"{'ID':>6}  {'Channel':<32} {'Uptime%':>8} {'MTBF h':>8} {'Flaps':>6} {'p50 ms':>8} {'p95 ms':>8} {'Res Δ':>6} {'FPS Δ':>6} {'Samples':>8}"
+    lines = [header, "-" * len(header)]
+
+    def fmt(v):
+        return "--" if v is None else f"{v}"
+
+    for r in rows:
+        lines.append(
+            f"{str(r['channel_id']):>6}  {str(r['channel_name'] or '')[:32]:<32} {fmt(r['uptime_pct']):>8} {fmt(r['mtbf_hours']):>8} "
+            f"{r['flaps']:>6} {fmt(r['p50_ms']):>8} {fmt(r['p95_ms']):>8} {r['resolution_changes']:>6} {r['fps_changes']:>6} {r['samples']:>8}"
+        )
+    return "\n".join(lines)
@@ -0,0 +1,135 @@
+import base64
+import json
+import threading
+import time
+
+import requests
+
+from dispatcharr_metrics import METRICS
+
+# Token lifecycle. Dispatcharr hands out a short-lived JWT access token and a
+# refresh token (/api/accounts/token/). A TokenManager stands in for the API
+# key string everywhere one is passed: every header is built as
+# f"Bearer {api_key}", and str() of the manager is the current access token,
+# refreshed shortly before the JWT's exp claim. Refreshes are single-flight:
+# the first worker to need one posts it while the others wait on the lock and
+# reuse its token. A request that still gets a 401 refreshes (once, shared the
+# same way) and is retried, so a token expiring mid-run costs one refresh, not
+# a 401 per channel. Without a refresh token, stored username/password log in
+# again; a plain API key (no JWT exp, nothing to refresh with) is passed through.
+
+TOKEN_PATH = "/api/accounts/token/"
+REFRESH_PATH = "/api/accounts/token/refresh/"
+REFRESH_MARGIN = 60     # seconds before exp at which the access token is renewed
+
+
+def jwt_expiry(token):
+    # exp claim of a JWT (not verified, only read); None for anything else
+    try:
+        payload = str(token).split('.')[1]
+        payload += '=' * (-len(payload) % 4)
+        exp = json.loads(base64.urlsafe_b64decode(payload)).get('exp')
+        return float(exp) if exp else None
+    except (IndexError, ValueError, TypeError, AttributeError):
+        return None
+
+
+def login(url, username, password, timeout=10):
+    # (access, refresh) for a username/password
+    resp = requests.post(f"{url}{TOKEN_PATH}", json={"username": username, "password": password}, timeout=timeout)
+    resp.raise_for_status()
+    data = resp.json()
+    return data.get("access"), data.get("refresh")
+
+
+class TokenManager:
+    def __init__(self, url, access, refresh=None, username=None, password=None, on_update=None):
+        self.url = (url or "").rstrip('/')
+        self.refresh_token = refresh or None
+        self.username = username or None
+        self.password = password or None
+        self.on_update = on_update
+        self.refreshes = 0
+        self.issued = {access or ""}    # every access token held, so callers can recognise them
+        self._current = (access or "", jwt_expiry(access))
+        self._lock = threading.Lock()
+
+    def __str__(self):
+        return self.token()
+
+    def __bool__(self):
+        return bool(self._current[0]) or self.can_refresh()
+
+    def set_token(self, access, refresh=None):
+        # A token obtained elsewhere (login dialog, a coordinator's lease)
+        with self._lock:
+            self.issued.add(access or "")
+            self._current = (access or "", jwt_expiry(access))
+            if refresh:
+                self.refresh_token = refresh
+
+    def can_refresh(self):
+        return bool(self.refresh_token or (self.username and self.password))
+
+    def token(self):
+        # Current access token, renewed first if it expires within REFRESH_MARGIN
+        access, expires = self._current
+        if expires is not None and expires - time.time() < REFRESH_MARGIN and self.can_refresh():
+            try:
+                return self.refresh(access)
+            except requests.RequestException:
+                # Possibly still valid; a 401 will try again
+                pass
+        return access
+
+    def refresh(self, stale):
+        # New access token replacing `stale`. If another thread already
+        # replaced it, that token is returned without a second request.
+        with self._lock:
+            access = self._current[0]
+            if access != stale:
+                return access
+            access, refresh = None, self.refresh_token
+            if self.refresh_token:
+                METRICS.inc('api_calls_total', endpoint='token_refresh')
+                try:
+                    resp = requests.post(f"{self.url}{REFRESH_PATH}", json={"refresh": self.refresh_token}, timeout=10)
+                    resp.raise_for_status()
+                    data = resp.json()
+                    access, refresh = data.get("access"), data.get("refresh") or self.refresh_token
+                except requests.HTTPError:
+                    # Refresh token expired or revoked: log in again if possible
+                    if not (self.username and self.password):
+                        raise
+            if not access and self.username and self.password:
+                METRICS.inc('api_calls_total', endpoint='token')
+                access, refresh = login(self.url, self.username, self.password)
+            if not access:
+                raise requests.HTTPError("Token refresh returned no access token")
+            self.refresh_token = refresh
+            self.issued.add(access)
+            self._current = (access, jwt_expiry(access))
+            self.refreshes += 1
+            METRICS.inc('token_refreshes_total')
+        if self.on_update is not None:
+            self.on_update(access, refresh)
+        return access
+
+
+def token_manager(url, config, api_key=None, on_update=None):
+    # TokenManager for a config's API_KEY / REFRESH_TOKEN / USERNAME / PASSWORD
+    # (api_key, e.g. from --api-key, overrides the stored access token)
+    return TokenManager(url, api_key or config.get("API_KEY", ""), config.get("REFRESH_TOKEN"),
+                        config.get("USERNAME"), config.get("PASSWORD"), on_update)
+
+
+def api_get(url, api_key, **kwargs):
+    # GET with the Bearer token; on a 401 a TokenManager refreshes and the request is retried once
+    token = str(api_key)
+    resp = requests.get(url, headers={"Authorization": f"Bearer {token}"}, **kwargs)
+    if resp.status_code == 401 and isinstance(api_key, TokenManager) and api_key.can_refresh():
+        resp.close()
+        METRICS.inc('api_retries_total', reason='401')
+        token = api_key.refresh(token)
+        resp = requests.get(url, headers={"Authorization": f"Bearer {token}"}, **kwargs)
+    return resp
@@ -1,10 +1,20 @@
 import argparse
+import atexit
+import csv
 import json
 import os
-import re
-import requests
-import subprocess
-from pprint import pprint
+import queue
+import sys
+import time
+
+from dispatcharr_probe import (
+    fetch_channels, sanitize_filename, HostLimiter, set_stream_stats_max_age, ActiveSessions,
+    analyze_channel, NO_STREAMS, CAPTURE_ALL,
+)
+from dispatcharr_auth import api_get, login, token_manager
+from dispatcharr_metrics import percentile
+from dispatcharr_runs import AnalyzeRun
+from dispatcharr_trace import span, enable as enable_trace
 
 CONFIG_FILE = "dispatcharr_gui_config.json"
 
@@ -19,29 +29,9 @@ def save_config(config):
     with open(CONFIG_FILE, "w") as f:
         json.dump(config, f)
 
-def ffprobe_stream(url):
-    cmd = [
-        "ffprobe", "-v", "error",
-        "-select_streams", "v:0",
-        "-show_entries", "stream=codec_name,width,height,avg_frame_rate",
-        "-of", "json", url
-    ]
-    try:
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=10)
-        info = json.loads(result.stdout)
-        stream = info['streams'][0]
-        codec = stream.get('codec_name')
-        width = stream.get('width')
-        height = stream.get('height')
-        fps = eval(stream.get('avg_frame_rate')) if stream.get('avg_frame_rate') else None
-        return codec, f"{width}x{height}", fps
-    except Exception:
-        return None, None, None
-
 def fetch_streams(dispatcharr_url, api_key):
     streams_url = f"{dispatcharr_url}/api/channels/streams/"
-    headers = {"Authorization": f"Bearer {api_key}"}
-    resp = requests.get(streams_url, headers=headers)
+    resp = api_get(streams_url, api_key)
     resp.raise_for_status()
     streams = resp.json()
     if isinstance(streams, dict):
@@ -54,35 +44,271 @@ def fetch_streams(dispatcharr_url, api_key):
                     break
     return streams
 
-def fetch_channels(dispatcharr_url, api_key):
-    channels_url = f"{dispatcharr_url}/api/channels/channels/"
-    headers = {"Authorization": f"Bearer {api_key}"}
-    resp = requests.get(channels_url, headers=headers)
-    resp.raise_for_status()
-    return resp.json()
-
-def sanitize_filename(name):
-    return re.sub(r'[^\w\-_\. ]', '_', name).strip()
-
-def capture_image_from_stream(stream_url, channel_name):
-    folder = "captured"
-    if not os.path.exists(folder):
-        os.makedirs(folder)
-    filename = os.path.join(folder, sanitize_filename(channel_name) + ".jpg")
-    cmd = [
-        "ffmpeg", "-y", "-i", stream_url, "-frames:v", "1", "-q:v", "2", filename
-    ]
+def run_monitor(url, api_key, args):
+    import threading
+    from dispatcharr_history import HistoryStore
+    from dispatcharr_monitor import MonitorScheduler
+    from dispatcharr_servers import ServerPool, load_profiles, channel_key, DEFAULT_SERVER
+    history = None if args.no_history else HistoryStore()
+    print_lock = threading.Lock()
+    # --all-servers: every SERVERS profile in one scheduler (shared connection budget and probe cache)
+    profiles = load_profiles(load_config()) if args.all_servers else [{'name': DEFAULT_SERVER, 'url': url, 'api_key': api_key}]
+    pool = ServerPool(profiles, probe_live=args.probe_live)
+
+    def probe(ch):
+        results = pool.probe_channel(ch)
+        if history:
+            history.record(results)
+        with print_lock:
+            for r in results:
+                print(f"{time.strftime('%H:%M:%S')}  {channel_key(ch)}  {ch.get('name')}: {r['status']} {r['codec']} {r['resolution']} {r['fps']}", flush=True)
+            if not results:
+                print(f"{time.strftime('%H:%M:%S')}  {channel_key(ch)}  {ch.get('name')}: Offline (no streams)", flush=True)
+        return any(r['status'] == "Online" for r in results)
+
+    def on_result(ch, online, error):
+        if error:
+            with print_lock:
+                print(f"{time.strftime('%H:%M:%S')}  {channel_key(ch)}  {ch.get('name')}: Error {error}", flush=True)
+
+    def load_channels():
+        channels = pool.fetch_channels()
+        for name, error in pool.errors.items():
+            print(f"Error fetching channels from {name}: {error}", file=sys.stderr)
+        if not channels and pool.errors:
+            raise next(iter(pool.errors.values()))
+        return channels
+
+    pinned = set()
+    for arg in args.pin or []:
+        for s in arg.split(','):
+            if s.strip():
+                pinned.add(s.strip())
+    scheduler = MonitorScheduler(probe, interval=args.interval, max_connections=args.max_connections, on_result=on_result, key_fn=channel_key)
+    scheduler.set_channels(load_channels(), pinned)
+    scheduler.start()
+    servers = f" on {len(profiles)} servers ({', '.join(pool.names())})" if pool.multi() else ""
+    print(f"Monitoring every {args.interval:.0f}s with up to {args.max_connections} connections{servers}. Ctrl+C to stop.")
     try:
-        subprocess.run(cmd, capture_output=True, timeout=10)
-    except Exception:
-        pass
-    return filename
+        next_reload = time.time() + args.interval
+        while True:
+            time.sleep(1)
+            # Pick up added/removed channels once per interval
+            if time.time() >= next_reload:
+                try:
+                    scheduler.set_channels(load_channels(), pinned)
+                except Exception as e:
+                    print(f"Error refreshing channels: {e}")
+                next_reload = time.time() + args.interval
+    except KeyboardInterrupt:
+        print("Stopping monitor...")
+    finally:
+        scheduler.stop()
+        if history:
+            history.close()
+
+RESULT_FIELDS = ['channel_id', 'channel_name', 'status', 'codec', 'resolution', 'fps', 'probe_ms', 'source', 'stream_url', 'image', 'error']
+CHANGE_FIELDS = ['channel_id', 'channel_name', 'kind', 'old', 'new', 'ts']
+
+
+class ResultWriter:
+    # Prints results as they complete: text (per-channel blocks), table, jsonl or csv.
+    # With changes_only it prints the run-to-run changes instead (write_changes).
+    def __init__(self, fmt, out=sys.stdout, changes_only=False):
+        self.fmt = fmt
+        self.out = out
+        self._csv = None
+        if fmt == 'csv':
+            self._csv = csv.DictWriter(out, fieldnames=CHANGE_FIELDS if changes_only else RESULT_FIELDS, extrasaction='ignore')
+            self._csv.writeheader()
+        elif fmt == 'table' and changes_only:
+            print(f"{'ID':>6}  {'Name':<32} {'Change':<16} {'Old':>12} -> New", file=out)
+        elif fmt == 'table':
+            print(f"{'ID':>6}  {'Name':<32} {'Status':<8} {'Codec':<8} {'Resolution':<11} {'FPS':>7} {'Probe ms':>9}", file=out)
+
+    def write_changes(self, changes):
+        from dispatcharr_diff import format_change
+        for c in changes:
+            if self.fmt == 'text':
+                print(format_change(c), file=self.out)
+            elif self.fmt == 'table':
+                print(f"{str(c['channel_id']):>6}  {str(c['channel_name'] or '')[:32]:<32} {c['kind']:<16} {str(c['old']):>12} -> {c['new']}", file=self.out)
+            elif self.fmt == 'jsonl':
+                print(json.dumps(c), file=self.out)
+            else:
+                self._csv.writerow(c)
+        self.out.flush()
+
+    def write_channel(self, ch, results):
+        if self.fmt == 'text':
+            print(f"\nAnalyzing Channel: {ch.get('name')} (ID: {ch.get('id')})", file=self.out)
+            if results and results[0].get('source') == 'unchanged':
+                print("  Unchanged since last run, not re-probed.", file=self.out)
+            elif results and results[0].get('source') == 'live':
+                print(f"  Being watched ({results[0].get('viewers') or 0} viewers): live stats from Dispatcharr, not probed.", file=self.out)
+            elif results and all(r.get('source') in ('deadline', 'cached') for r in results):
+                print("  Not probed before the deadline: last recorded values.", file=self.out)
+            for r in results:
+                if r.get('error') == NO_STREAMS:
+                    print(f"  {NO_STREAMS}.", file=self.out)
+                    continue
+                if r.get('error'):
+                    # The message names its stage ("Fetch streams: ...")
+                    print(f"  Error: {r['error']}", file=self.out)
+                    continue
+                print(f"    Status: {r['status']}", file=self.out)
+                print(f"    Codec: {r['codec']}", file=self.out)
+                print(f"    Resolution: {r['resolution']}", file=self.out)
+                print(f"    FPS: {r['fps']}", file=self.out)
+                if r.get('image'):
+                    print(f"    Image captured: {r['image']}", file=self.out)
+        else:
+            for r in results:
+                if self.fmt == 'jsonl':
+                    print(json.dumps({k: r.get(k) for k in RESULT_FIELDS + ['ts']}), file=self.out)
+                elif self.fmt == 'csv':
+                    self._csv.writerow(r)
+                else:
+                    fps = f"{float(r['fps']):.2f}" if r.get('fps') else "--"
+                    probe_ms = f"{r['probe_ms']:.0f}" if r.get('probe_ms') is not None else "--"
+                    print(f"{str(r['channel_id']):>6}  {str(r['channel_name'] or '')[:32]:<32} {r['status']:<8} {str(r.get('codec') or '--'):<8} {str(r.get('resolution') or '--'):<11} {fps:>7} {probe_ms:>9}", file=self.out)
+        self.out.flush()
+
+
+def analyze_channels(url, api_key, selected, args):
+    # Channels are probed by a pool of workers; results stream out as each channel completes
+    history = None
+    if not args.no_history:
+        from dispatcharr_history import HistoryStore
+        history = HistoryStore()
+    # Channels viewers are watching right now are reported from the proxy's live stats
+    sessions = None if args.probe_live else ActiveSessions(url, api_key)
+    if args.adaptive:
+        # --workers / --per-host become ceilings; the level follows what the providers sustain
+        from dispatcharr_aimd import AdaptiveLimiter
+        limiter = AdaptiveLimiter(args.workers, args.per_host, sessions)
+    else:
+        limiter = HostLimiter(args.per_host, sessions)
+    catalogue = None
+    if args.source != 'api':
+        # One playlist download replaces a streams API call per channel
+        from dispatcharr_m3u import M3UCatalogue
+        catalogue = M3UCatalogue(url, api_key, direct=args.source == 'm3u')
+    done = queue.Queue()
+    snapshot = None
+    if not args.no_history or args.changes_only or args.on_change_webhook or args.on_change_script:
+        # Last measured record per channel, for the run-to-run change list
+        from dispatcharr_diff import Snapshot
+        snapshot = Snapshot()
+    changes = []
+    incremental = None
+    if args.incremental:
+        from dispatcharr_incremental import IncrementalState
+        incremental = IncrementalState(max_age=args.max_age * 3600)
+    plan = None
+    if args.deadline:
+        # Most valuable channels first; the tail degrades to cheaper tiers, then Stale
+        from dispatcharr_deadline import DeadlinePlan
+        plan = DeadlinePlan(args.deadline * 60, args.workers, history)
+        selected = plan.order(selected, number=lambda ch: ch.get('channel_number'))
+
+    def error_row(ch, message):
+        # An Error row, not a channel silently missing from the output and summary
+        return {'channel_id': ch.get('id'), 'channel_name': ch.get('name'), 'status': "Offline", 'error': message, 'ts': time.time()}
+
+    def task(ch):
+        try:
+            with span('channel', channel=ch.get('id')):
+                analyze_channel(ch.get('id'), ch.get('name'), ch, url, api_key, run, limiter, sessions, catalogue, plan, incremental,
+                                capture=CAPTURE_ALL if args.capture_images else None,
+                                on_result=lambda results, measured: done.put((ch, results)),
+                                on_error=lambda category, message, host: done.put((ch, [error_row(ch, message)])))
+        except Exception as e:
+            done.put((ch, [error_row(ch, str(e))]))
+
+    writer = ResultWriter(args.format, changes_only=args.changes_only)
+    run = AnalyzeRun(task, max_workers=args.workers, key_fn=lambda ch: str(ch.get('id')), on_done=lambda r: done.put(None))
+    run.add(selected)
+    if plan is not None:
+        plan.start(run)
+    started = time.monotonic()
+    counts = {"Online": 0, "Offline": 0, "Error": 0}
+    probe_times = []
+    streams = 0
+    unchanged = 0
+    run.start()
+    try:
+        while True:
+            item = done.get()
+            if item is None:
+                break
+            ch, results = item
+            channel_changes = snapshot.diff(ch.get('id'), ch.get('name'), results) if snapshot else []
+            changes.extend(channel_changes)
+            if args.changes_only:
+                writer.write_changes(channel_changes)
+            else:
+                writer.write_channel(ch, results)
+            if plan is not None:
+                plan.done(ch.get('id'))
+            if results and results[0].get('source') == 'unchanged':
+                # Skipped by --incremental: shown, but not counted or recorded as a new probe
+                unchanged += 1
+                continue
+            for r in results:
+                if r.get('error') == NO_STREAMS:
+                    counts["Offline"] += 1
+                    continue
+                if r.get('error'):
+                    counts["Error"] += 1
+                    continue
+                streams += 1
+                counts[r['status']] = counts.get(r['status'], 0) + 1
+                if r.get('probe_ms') is not None:
+                    probe_times.append(r['probe_ms'])
+            if history:
+                history.record([r for r in results if not r.get('error')])
+    except KeyboardInterrupt:
+        # Kills in-flight ffprobe/ffmpeg children too
+        run.cancel()
+        print("Cancelled.", file=sys.stderr)
+    finally:
+        if history:
+            history.close()
+        if incremental:
+            incremental.save()
+        if snapshot:
+            snapshot.save()
+    if plan is not None:
+        plan.stop()
+        # Channels the budget didn't reach
+        for ch in plan.pending(selected):
+            if not args.changes_only:
+                writer.write_channel(ch, [plan.stale_result(ch)])
+            counts["Stale"] = counts.get("Stale", 0) + 1
+    if changes and (args.on_change_webhook or args.on_change_script):
+        from dispatcharr_diff import notify
+        for error in notify(changes, args.on_change_webhook, args.on_change_script):
+            print(f"Change notification failed: {error}", file=sys.stderr)
+    elapsed = time.monotonic() - started
+    completed, total, _ = run.progress()
+    p95 = percentile(probe_times, 95)
+    # Machine-readable formats keep stdout clean; the summary goes to stderr
+    summary_out = sys.stdout if args.format in ('text', 'table') else sys.stderr
+    print(
+        f"\nSummary: {completed}/{total} channels, {streams} streams "
+        f"({counts.get('Online', 0)} online, {counts.get('Offline', 0)} offline, {counts['Error']} errors"
+        + (f", {counts['Busy']} busy" if counts.get('Busy') else "")
+        + (f", {counts['Stale']} stale" if counts.get('Stale') else "")
+        + f") in {elapsed:.1f}s, {streams / elapsed if elapsed > 0 else 0:.2f} streams/s, "
+        f"p95 probe {'--' if p95 is None else f'{p95:.0f} ms'}"
+        + (f", {unchanged} unchanged channels skipped" if incremental else "")
+        + (f", {len(changes)} changes since the last run" if snapshot else "")
+        + (f", concurrency {limiter.level()}/{args.workers}" if args.adaptive else "")
+        + (f", deadline tiers {' '.join(f'{k}={v}' for k, v in plan.tiers.items())}" if plan is not None else ""),
+        file=summary_out,
+    )
 
-def get_token(url, username, password):
-    resp = requests.post(f"{url}/api/accounts/token/", json={"username": username, "password": password}, timeout=10)
-    resp.raise_for_status()
-    data = resp.json()
-    return data.get("access")
 
 # --- CLI logic ---
 def main():
@@ -92,27 +318,81 @@ def main():
     parser.add_argument('--username', help='Username for login (to fetch token)')
     parser.add_argument('--password', help='Password for login (to fetch token)')
     parser.add_argument('--save-settings', action='store_true', help='Save current settings to config file')
+    parser.add_argument('--save-password', action='store_true', help='With --save-settings, also store --password in the config file (plaintext; by default only the refresh token is kept)')
     parser.add_argument('--list-channels', action='store_true', help='List all channels')
     parser.add_argument('--analyze', nargs='*', help='Analyze channels by ID or name (comma separated or multiple args)')
     parser.add_argument('--analyze-all', action='store_true', help='Analyze all channels')
     parser.add_argument('--show-image', help='Show captured image for channel (by name)')
     parser.add_argument('--capture-images', action='store_true', help='Capture images for analyzed streams')
+    parser.add_argument('--workers', type=int, default=4, help='Analyze: number of channels probed in parallel (default 4)')
+    parser.add_argument('--per-host', type=int, default=0, help="Analyze: max concurrent probes per stream host, live viewers included (default: the M3U account's max streams, else unlimited)")
+    parser.add_argument('--adaptive', action='store_true', help='Analyze: adapt concurrency to how the providers respond (AIMD); --workers and --per-host become ceilings')
+    parser.add_argument('--format', choices=['text', 'table', 'jsonl', 'csv'], default='text', help='Analyze: output format (default text)')
+    parser.add_argument('--incremental', action='store_true', help='Analyze: only probe channels whose streams changed or whose last result is stale/offline')
+    parser.add_argument('--max-age', type=float, default=24.0, help='Incremental: re-probe results older than this many hours (default 24)')
+    parser.add_argument('--stats-max-age', type=float, default=6.0, help='Trust Dispatcharr\'s stored stream stats younger than this many hours instead of probing (0 = always probe, default 6)')
+    parser.add_argument('--source', choices=['api', 'm3u', 'output'], default='api', help='Analyze: where stream URLs come from: per-channel API calls, the direct M3U playlist (upstream URLs) or the proxied M3U (probe what clients see) (default api)')
+    parser.add_argument('--deadline', type=float, metavar='MINUTES', help='Analyze: finish within this many minutes: most stale/important channels first, cheaper probes or last recorded results for the tail, unreached channels reported as Stale')
+    parser.add_argument('--changes-only', action='store_true', help='Analyze: print only what changed since the last run (went offline/online, resolution, fps, codec)')
+    parser.add_argument('--on-change-webhook', metavar='URL', help='Analyze: POST the change list as JSON to this URL when anything changed')
+    parser.add_argument('--on-change-script', metavar='CMD', help='Analyze: run this command with the change list as JSON on stdin when anything changed')
+    parser.add_argument('--probe-live', action='store_true', help='Analyze: probe channels even while viewers are watching them (opens a second upstream connection)')
+    parser.add_argument('--monitor', action='store_true', help='Continuously re-probe all channels (Ctrl+C to stop)')
+    parser.add_argument('--interval', type=float, default=300.0, help='Monitor: seconds between probes of a stable channel (default 300)')
+    parser.add_argument('--max-connections', type=int, default=4, help='Monitor: max concurrent probe connections (default 4)')
+    parser.add_argument('--pin', nargs='*', help='Monitor: channel IDs to check more often (comma separated or multiple args; "server/id" with --all-servers)')
+    parser.add_argument('--all-servers', action='store_true', help='Monitor: every server profile in the config\'s SERVERS list, in one process')
+    parser.add_argument('--report', action='store_true', help='Print uptime/MTBF/flap/latency report from probe history')
+    parser.add_argument('--window', type=float, default=168.0, help='Report window in hours (default 168 = 7 days)')
+    parser.add_argument('--no-history', action='store_true', help='Do not record results to the probe history database')
+    parser.add_argument('--find-duplicates', action='store_true', help='Cluster captured images that show the same feed')
+    parser.add_argument('--max-distance', type=int, default=6, help='Max perceptual-hash distance for duplicates (default 6)')
+    parser.add_argument('--max-skew', type=float, default=60.0, help='Max seconds between captures of duplicates (default 60)')
+    parser.add_argument('--trace', metavar='FILE', help='Write per-phase timings (API fetches, ffprobe, ffmpeg) as Chrome Trace Event JSON')
+    parser.add_argument('--record', metavar='FILE', help='Record every API response and ffprobe/ffmpeg run (with timings) to a fixture file')
+    parser.add_argument('--replay', metavar='FILE', help='Replay a recorded fixture instead of touching the network or running ffprobe/ffmpeg')
+    parser.add_argument('--replay-speed', type=float, default=1.0, help='Replay: scale recorded latencies (1 = as recorded, 0 = no delay)')
     args = parser.parse_args()
 
+    if args.trace:
+        tracer = enable_trace()
+        atexit.register(lambda: print(f"Trace written to {tracer.write(args.trace)}", file=sys.stderr))
+    # Record/replay wraps the whole run; the fixture is written at exit
+    if args.record:
+        from dispatcharr_replay import Recorder
+        atexit.register(Recorder(args.record).start().stop)
+    elif args.replay:
+        from dispatcharr_replay import Replayer
+        replayer = Replayer(args.replay, args.replay_speed).start()
+
+        def replay_done():
+            replayer.stop()
+            if replayer.misses:
+                print(f"Replay: {replayer.misses} calls had no recording", file=sys.stderr)
+        atexit.register(replay_done)
+
     config = load_config()
     url = args.url or config.get("DISPATCHARR_URL")
     api_key = args.api_key or config.get("API_KEY")
+    set_stream_stats_max_age(args.stats_max_age * 3600)
 
     # Token fetch
     if args.username and args.password:
         print("Requesting token...")
-        token = get_token(url, args.username, args.password)
+        token, refresh = login(url, args.username, args.password)
         if token:
             print("Token received.")
             api_key = token
             config["API_KEY"] = token
+            config["REFRESH_TOKEN"] = refresh
+            # The refresh token renews the session; the password is only
+            # written to the config file on request (and a stored one for
+            # another user is dropped)
+            if args.save_password:
+                config["PASSWORD"] = args.password
+            elif config.get("USERNAME") != args.username:
+                config.pop("PASSWORD", None)
             config["USERNAME"] = args.username
-            config["PASSWORD"] = args.password
             if args.save_settings:
                 save_config(config)
         else:
@@ -125,6 +405,26 @@ def main():
         save_config(config)
         print("Settings saved.")
 
+    # Refreshed before it expires (and on a 401) instead of failing the run;
+    # with --save-settings the renewed tokens are stored for the next run
+    def tokens_updated(access, refresh):
+        if args.save_settings:
+            config["API_KEY"] = access
+            config["REFRESH_TOKEN"] = refresh
+            save_config(config)
+    # (a --password not saved still serves this run's fallback login)
+    api_key = token_manager(url, dict(config, PASSWORD=args.password) if args.password else config, api_key, tokens_updated)
+
+    # Reliability report (history only, no server access needed)
+    if args.report:
+        from dispatcharr_analytics import reliability_report, format_report
+        rows = reliability_report(since=time.time() - args.window * 3600)
+        if not rows:
+            print("No probe history recorded yet.")
+        else:
+            print(format_report(rows))
+        return
+
     # List channels
     if args.list_channels:
         channels = fetch_channels(url, api_key)
@@ -133,6 +433,11 @@ def main():
             print(f"  ID: {ch.get('id')}, Name: {ch.get('name')}")
         return
 
+    # Continuous monitoring
+    if args.monitor:
+        run_monitor(url, api_key, args)
+        return
+
     # Analyze channels
     if args.analyze or args.analyze_all:
         channels = fetch_channels(url, api_key)
@@ -148,64 +453,15 @@ def main():
         if not selected:
             print("No channels selected.")
             return
-        for ch in selected:
-            channel_id = ch.get('id')
-            name = ch.get('name')
-            print(f"\nAnalyzing Channel: {name} (ID: {channel_id})")
-            try:
-                channel_streams_url = f"{url}/api/channels/channels/{channel_id}/streams/"
-                headers = {"Authorization": f"Bearer {api_key}"}
-                resp = requests.get(channel_streams_url, headers=headers)
-                resp.raise_for_status()
-                channel_streams = resp.json()
-                if isinstance(channel_streams, dict):
-                    if 'results' in channel_streams:
-                        channel_streams = channel_streams['results']
-                    else:
-                        for v in channel_streams.values():
-                            if isinstance(v, list):
-                                channel_streams = v
-                                break
-            except Exception as e:
-                print(f"  Error fetching streams: {e}")
-                continue
-            for stream in channel_streams:
-                stream_url = None
-                codec = None
-                resolution = None
-                fps = None
-                for key in ['url', 'stream_url', 'src']:
-                    if key in stream:
-                        stream_url = stream[key]
-                        break
-                if 'codec' in stream:
-                    codec = stream['codec']
-                elif 'codec_name' in stream:
-                    codec = stream['codec_name']
-                if 'resolution' in stream:
-                    resolution = stream['resolution']
-                elif 'width' in stream and 'height' in stream:
-                    resolution = f"{stream['width']}x{stream['height']}"
-                if 'fps' in stream:
-                    fps = stream['fps']
-                elif 'frame_rate' in stream:
-                    fps = stream['frame_rate']
-                if not codec or not resolution or not fps:
-                    ff_codec, ff_res, ff_fps = ffprobe_stream(stream_url) if stream_url else (None, None, None)
-                    if not codec:
-                        codec = ff_codec
-                    if not resolution:
-                        resolution = ff_res
-                    if not fps:
-                        fps = ff_fps
-                status = "Online" if codec and resolution and fps else "Offline"
-                print(f"    Status: {status}")
-                print(f"    Codec: {codec}")
-                print(f"    Resolution: {resolution}")
-                print(f"    FPS: {fps}")
-                if args.capture_images and stream_url:
-                    filename = capture_image_from_stream(stream_url, name)
-                    print(f"    Image captured: {filename}")
+        analyze_channels(url, api_key, selected, args)
+    # Duplicate feeds (same picture at the same moment)
+    if args.find_duplicates:
+        from dispatcharr_phash import index_captured_images
+        index = index_captured_images("captured")
+        clusters = index.clusters(args.max_distance, args.max_skew)
+        print(f"\nHashed {len(index)} captured images, {len(clusters)} duplicate clusters:")
+        for i, members in enumerate(clusters, 1):
+            print(f"  Cluster {i} ({len(members)} channels, probe '{members[0]}'): {', '.join(members)}")
     # Show image
     if args.show_image:
         from PIL import Image
@@ -0,0 +1,443 @@
+import argparse
+import json
+import os
+import queue
+import secrets
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import deque
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import requests
+
+from dispatcharr_auth import TokenManager, token_manager
+from dispatcharr_channel_status_cli import load_config, ResultWriter
+from dispatcharr_metrics import percentile
+from dispatcharr_probe import fetch_channels, analyze_channel, set_stream_stats_max_age, ActiveSessions, HostLimiter, NO_STREAMS
+from dispatcharr_runs import AnalyzeRun
+
+# Distributed analyze runs. A coordinator fetches the channel list once and
+# hands it out in batches ("leases") over a small JSON/HTTP protocol; workers
+# (other processes or hosts, each with its own bandwidth and provider IP)
+# lease a batch, heartbeat while probing it and post the results back. A lease
+# that isn't completed or heartbeated within its TTL (worker crashed, host
+# lost) goes back to the front of the queue.
+#
+#   POST /lease      {"worker": name, "max": n} -> {"lease", "ttl", "channels", "url", "api_key"}
+#                    | {"lease": null, "retry": s} (all leased) | {"done": true}
+#   POST /heartbeat  {"lease"} -> {"ok": bool}   (false: expired, results still accepted)
+#   POST /complete   {"lease", "results": {channel_id: [result, ...]}} -> {"accepted": n}
+#   GET  /status     progress counters
+#
+# Run `python dispatcharr_cluster.py coordinator --analyze-all --spawn 4` to
+# probe with four local worker processes, or start workers on other machines
+# with `python dispatcharr_cluster.py worker --coordinator http://host:9878 --token ...`.
+
+DEFAULT_PORT = 9878
+LEASE_TTL = 30.0
+LEASE_RETRIES = 5     # failed /lease calls in a row before a worker gives up
+TOKEN_HEADER = "X-Cluster-Token"
+
+
+class WorkQueue:
+    def __init__(self, items, lease_ttl=LEASE_TTL, key_fn=lambda ch: str(ch.get('id'))):
+        self.lease_ttl = lease_ttl
+        self.key_fn = key_fn
+        self.total = len(items)
+        self.requeued = 0
+        self._pending = deque(items)
+        self._leases = {}      # lease id -> {'worker', 'items', 'expires'}
+        self._done = set()
+        self._by_worker = {}
+        self._lock = threading.Lock()
+
+    def _expire(self, now):
+        for lease_id, lease in list(self._leases.items()):
+            if lease['expires'] < now:
+                del self._leases[lease_id]
+                items = [item for item in lease['items'] if self.key_fn(item) not in self._done]
+                # Back to the front: these channels have waited longest
+                self._pending.extendleft(reversed(items))
+                self.requeued += len(items)
+
+    def lease(self, worker, max_items):
+        # (lease id, items); (None, []) when everything is leased or done
+        with self._lock:
+            now = time.monotonic()
+            self._expire(now)
+            items = []
+            while self._pending and len(items) < max_items:
+                item = self._pending.popleft()
+                if self.key_fn(item) not in self._done:
+                    items.append(item)
+            if not items:
+                return None, []
+            lease_id = secrets.token_hex(8)
+            self._leases[lease_id] = {'worker': worker, 'items': items, 'expires': now + self.lease_ttl}
+            return lease_id, items
+
+    def heartbeat(self, lease_id):
+        with self._lock:
+            lease = self._leases.get(lease_id)
+            if lease is None:
+                return False
+            lease['expires'] = time.monotonic() + self.lease_ttl
+            return True
+
+    def complete(self, lease_id, results):
+        # results: {channel key: [result, ...]}; returns the newly completed (item, results)
+        with self._lock:
+            lease = self._leases.pop(lease_id, None)
+            items = lease['items'] if lease else []
+            known = {self.key_fn(item): item for item in items}
+            accepted = []
+            for key, channel_results in results.items():
+                if key in self._done:
+                    continue
+                item = known.get(key)
+                if item is None:
+                    # A lease that expired and was re-queued: take the results, drop the queued copy
+                    item = next((i for i in self._pending if self.key_fn(i) == key), None)
+                    if item is None:
+                        item = next((i for other in self._leases.values() for i in other['items'] if self.key_fn(i) == key), None)
+                    if item is None:
+                        continue
+                self._done.add(key)
+                accepted.append((item, channel_results))
+            # Channels the worker didn't return go back on the queue
+            missing = [item for item in items if self.key_fn(item) not in self._done]
+            self._pending.extendleft(reversed(missing))
+            self.requeued += len(missing)
+            if lease:
+                self._by_worker[lease['worker']] = self._by_worker.get(lease['worker'], 0) + len(accepted)
+            return accepted
+
+    def finished(self):
+        with self._lock:
+            return len(self._done) >= self.total
+
+    def status(self):
+        with self._lock:
+            return {
+                'total': self.total,
+                'done': len(self._done),
+                'pending': len(self._pending),
+                'leased': sum(len(lease['items']) for lease in self._leases.values()),
+                'leases': len(self._leases),
+                'requeued': self.requeued,
+                'by_worker': dict(self._by_worker),
+            }
+
+    def reap(self):
+        with self._lock:
+            self._expire(time.monotonic())
+
+
+class CoordinatorHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, code, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _authorized(self):
+        token = self.server.token
+        if token and not secrets.compare_digest(self.headers.get(TOKEN_HEADER, ''), token):
+            self._reply(403, {'error': 'bad token'})
+            return False
+        return True
+
+    def do_GET(self):
+        if not self._authorized():
+            return
+        if self.path.split('?')[0] == '/status':
+            self._reply(200, self.server.work.status())
+        else:
+            self.send_error(404)
+
+    def do_POST(self):
+        if not self._authorized():
+            return
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._reply(400, {'error': 'bad json'})
+            return
+        work = self.server.work
+        path = self.path.split('?')[0]
+        if path == '/lease':
+            if work.finished():
+                self._reply(200, {'done': True})
+                return
+            lease_id, items = work.lease(str(body.get('worker', '?')), max(1, int(body.get('max', 1))))
+            if lease_id is None:
+                self._reply(200, {'lease': None, 'retry': 1.0})
+                return
+            self._reply(200, {'lease': lease_id, 'ttl': work.lease_ttl, 'channels': items,
+                              'url': self.server.dispatcharr_url, 'api_key': str(self.server.api_key)})
+        elif path == '/heartbeat':
+            self._reply(200, {'ok': work.heartbeat(body.get('lease'))})
+        elif path == '/complete':
+            accepted = work.complete(body.get('lease'), body.get('results') or {})
+            for item, results in accepted:
+                self.server.completed.put((item, results))
+            self._reply(200, {'accepted': len(accepted)})
+        else:
+            self.send_error(404)
+
+
+def start_coordinator(items, dispatcharr_url, api_key, listen='127.0.0.1', port=DEFAULT_PORT, token=None, lease_ttl=LEASE_TTL):
+    # Returns the server; finished channels arrive on server.completed as (channel, results)
+    server = ThreadingHTTPServer((listen, port), CoordinatorHandler)
+    server.daemon_threads = True
+    server.work = WorkQueue(items, lease_ttl)
+    server.completed = queue.Queue()
+    server.token = token
+    server.dispatcharr_url = dispatcharr_url
+    server.api_key = api_key
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class _Heartbeat:
+    def __init__(self, post, lease_id, interval):
+        self._post = post
+        self._lease = lease_id
+        self._interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def _loop(self):
+        while not self._stop.wait(self._interval):
+            try:
+                self._post('/heartbeat', {'lease': self._lease})
+            except requests.RequestException:
+                # The coordinator may be briefly unreachable; the lease TTL decides
+                pass
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+
+def run_worker(coordinator, token=None, name=None, batch=8, threads=4, url=None, api_key=None, probe_live=False, per_host=0):
+    # Lease, probe, report, until the coordinator says the run is done
+    name = name or f"{socket.gethostname()}:{os.getpid()}"
+    http = requests.Session()
+    if token:
+        http.headers[TOKEN_HEADER] = token
+
+    def post(path, body):
+        resp = http.post(f"{coordinator.rstrip('/')}{path}", json=body, timeout=30)
+        resp.raise_for_status()
+        return resp.json()
+
+    sessions = {}
+    limiters = {}   # dispatcharr url -> per-host slots, shared by every lease
+    tokens = {}     # dispatcharr url -> TokenManager holding the latest leased token
+    probed = 0
+    failures = 0
+    while True:
+        try:
+            lease = post('/lease', {'worker': name, 'max': batch})
+        except requests.ConnectionError:
+            # Coordinator gone: its run is over
+            break
+        except requests.RequestException as e:
+            # Refused (wrong token) is final; anything else (5xx, timeouts) is retried with backoff
+            failures += 1
+            status = getattr(e.response, 'status_code', None)
+            if status in (401, 403) or failures >= LEASE_RETRIES:
+                print(f"Worker {name}: giving up on the coordinator: {e}", file=sys.stderr)
+                break
+            time.sleep(min(30.0, 2 ** failures))
+            continue
+        failures = 0
+        if lease.get('done'):
+            break
+        if not lease.get('lease'):
+            time.sleep(lease.get('retry', 1.0))
+            continue
+        dispatcharr_url = url or lease.get('url')
+        # The coordinator renews the token; each lease carries the current one
+        key = tokens.get(dispatcharr_url)
+        if key is None:
+            key = tokens[dispatcharr_url] = TokenManager(dispatcharr_url, api_key or lease.get('api_key'))
+        elif not api_key and lease.get('api_key') not in key.issued:
+            key.set_token(lease.get('api_key'))
+        if not probe_live and dispatcharr_url not in sessions:
+            sessions[dispatcharr_url] = ActiveSessions(dispatcharr_url, key)
+        if dispatcharr_url not in limiters:
+            limiters[dispatcharr_url] = HostLimiter(per_host, sessions.get(dispatcharr_url))
+        results = {}
+        lock = threading.Lock()
+
+        def report(ch, channel_results):
+            for r in channel_results:
+                r['worker'] = name
+            with lock:
+                results[str(ch.get('id'))] = channel_results
+
+        def error_row(ch, message):
+            return {'channel_id': ch.get('id'), 'channel_name': ch.get('name'), 'status': "Offline", 'error': message, 'ts': time.time()}
+
+        def task(ch):
+            # The same per-channel pipeline as the CLI and GUI: viewers, per-host slots, probe
+            try:
+                analyze_channel(ch.get('id'), ch.get('name'), ch, dispatcharr_url, key, run,
+                                limiter=limiters[dispatcharr_url], sessions=sessions.get(dispatcharr_url),
+                                on_result=lambda channel_results, measured: report(ch, channel_results),
+                                on_error=lambda category, message, host: report(ch, [error_row(ch, message)]))
+            except Exception as e:
+                report(ch, [error_row(ch, str(e))])
+
+        heartbeat = _Heartbeat(post, lease['lease'], max(1.0, lease.get('ttl', LEASE_TTL) / 3))
+        finished = threading.Event()
+        try:
+            run = AnalyzeRun(task, max_workers=threads, key_fn=lambda ch: str(ch.get('id')), on_done=lambda r: finished.set())
+            run.add(lease['channels'])
+            run.start()
+            finished.wait()
+        finally:
+            heartbeat.stop()
+        try:
+            post('/complete', {'lease': lease['lease'], 'results': results})
+        except requests.RequestException as e:
+            print(f"Worker {name}: could not report {len(results)} channels: {e}", file=sys.stderr)
+            continue
+        probed += len(results)
+    return probed
+
+
+def spawn_workers(count, coordinator, token, args):
+    # Local worker processes, for one-box runs and testing
+    cmd = [sys.executable, os.path.abspath(__file__), "worker", "--coordinator", coordinator,
+           "--batch", str(args.batch), "--threads", str(args.threads)]
+    if token:
+        cmd += ["--token", token]
+    if args.probe_live:
+        cmd.append("--probe-live")
+    if args.per_host:
+        cmd += ["--per-host", str(args.per_host)]
+    return [subprocess.Popen(cmd + ["--name", f"local-{i + 1}"]) for i in range(count)]
+
+
+def coordinate(args):
+    config = load_config()
+    url = args.url or config.get("DISPATCHARR_URL")
+    # Renewed here as it nears expiry; workers get the current token with each lease
+    api_key = token_manager(url, config, args.api_key)
+    channels = fetch_channels(url, api_key)
+    if not args.analyze_all:
+        wanted = {s.strip() for arg in (args.analyze or []) for s in arg.split(',') if s.strip()}
+        channels = [ch for ch in channels if str(ch.get('id')) in wanted or (ch.get('name') and ch.get('name') in wanted)]
+    if not channels:
+        print("No channels selected.")
+        return
+    # Anything beyond loopback needs a shared token: leases carry the API key
+    token = args.token or (None if args.listen in ('127.0.0.1', 'localhost') and not args.spawn else secrets.token_hex(16))
+    server = start_coordinator(channels, url, api_key, args.listen, args.port, token, args.lease_ttl)
+    address = f"http://{'127.0.0.1' if args.listen in ('0.0.0.0', '') else args.listen}:{server.server_address[1]}"
+    print(f"Coordinating {len(channels)} channels on {address}" + (f" (token {token})" if token and not args.spawn else ""), file=sys.stderr)
+    workers = spawn_workers(args.spawn, address, token, args) if args.spawn else []
+    history = None
+    if not args.no_history:
+        from dispatcharr_history import HistoryStore
+        history = HistoryStore()
+    writer = ResultWriter(args.format)
+    counts = {}
+    probe_times = []
+    started = time.monotonic()
+    try:
+        while not server.work.finished() or not server.completed.empty():
+            try:
+                ch, results = server.completed.get(timeout=1.0)
+            except queue.Empty:
+                server.work.reap()
+                if workers and all(w.poll() is not None for w in workers):
+                    print("All local workers exited before the run finished.", file=sys.stderr)
+                    break
+                continue
+            writer.write_channel(ch, results)
+            for r in results:
+                status = "Error" if r.get('error') and r.get('error') != NO_STREAMS else r.get('status')
+                counts[status] = counts.get(status, 0) + 1
+                if r.get('probe_ms') is not None:
+                    probe_times.append(r['probe_ms'])
+            if history:
+                history.record([r for r in results if not r.get('error')])
+    except KeyboardInterrupt:
+        print("Cancelled.", file=sys.stderr)
+    finally:
+        # Workers see the run is done (or the coordinator gone) and exit
+        for w in workers:
+            try:
+                w.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                w.kill()
+        server.shutdown()
+        if history:
+            history.close()
+    elapsed = time.monotonic() - started
+    status = server.work.status()
+    p95 = percentile(probe_times, 95)
+    summary_out = sys.stdout if args.format in ('text', 'table') else sys.stderr
+    print(
+        f"\nSummary: {status['done']}/{status['total']} channels "
+        f"({', '.join(f'{n} {s.lower()}' for s, n in sorted(counts.items()))}) in {elapsed:.1f}s, "
+        f"{status['done'] / elapsed if elapsed > 0 else 0:.2f} channels/s, p95 probe {'--' if p95 is None else f'{p95:.0f} ms'}, "
+        f"{len(status['by_worker'])} worker(s), {status['requeued']} channels re-queued",
+        file=summary_out,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dispatcharr Channel Status distributed probing")
+    sub = parser.add_subparsers(dest='mode', required=True)
+    coord = sub.add_parser('coordinator', help='Fetch the channel list and hand it out to workers')
+    coord.add_argument('--url', help='Dispatcharr server URL')
+    coord.add_argument('--api-key', help='API key/token')
+    coord.add_argument('--analyze', nargs='*', help='Channels by ID or name (comma separated or multiple args)')
+    coord.add_argument('--analyze-all', action='store_true', help='Analyze all channels')
+    coord.add_argument('--listen', default='127.0.0.1', help='Coordinator listen address (default 127.0.0.1)')
+    coord.add_argument('--port', type=int, default=DEFAULT_PORT, help=f'Coordinator port (default {DEFAULT_PORT}, 0 = any free port)')
+    coord.add_argument('--token', help='Shared secret workers must send (generated when not listening on loopback)')
+    coord.add_argument('--lease-ttl', type=float, default=LEASE_TTL, help=f'Seconds without a heartbeat before a batch is re-queued (default {LEASE_TTL:.0f})')
+    coord.add_argument('--spawn', type=int, default=0, help='Start this many local worker processes')
+    coord.add_argument('--format', choices=['text', 'table', 'jsonl', 'csv'], default='table', help='Output format (default table)')
+    coord.add_argument('--no-history', action='store_true', help='Do not record results to the probe history database')
+    for p in (coord, sub.add_parser('worker', help='Lease channels from a coordinator and probe them')):
+        p.add_argument('--batch', type=int, default=8, help='Channels per lease (default 8)')
+        p.add_argument('--threads', type=int, default=4, help='Channels probed in parallel per worker (default 4)')
+        p.add_argument('--stats-max-age', type=float, default=6.0, help='Trust Dispatcharr\'s stored stream stats younger than this many hours instead of probing (0 = always probe, default 6)')
+        p.add_argument('--probe-live', action='store_true', help='Probe channels even while viewers are watching them')
+        p.add_argument('--per-host', type=int, default=0, help="Max concurrent probes per stream host in each worker, live viewers included (default: the M3U account's max streams, else unlimited)")
+    worker = sub.choices['worker']
+    worker.add_argument('--coordinator', required=True, help='Coordinator URL, e.g. http://10.0.0.5:9878')
+    worker.add_argument('--token', help='Shared secret printed by the coordinator')
+    worker.add_argument('--name', help='Worker name in results and stats (default host:pid)')
+    worker.add_argument('--url', help='Dispatcharr URL as seen from this worker (default: the coordinator\'s)')
+    worker.add_argument('--api-key', help='API key for this worker (default: the coordinator\'s)')
+    args = parser.parse_args()
+
+    set_stream_stats_max_age(args.stats_max_age * 3600)
+    if args.mode == 'coordinator':
+        coordinate(args)
+    else:
+        probed = run_worker(args.coordinator, args.token, args.name, args.batch, args.threads, args.url, args.api_key,
+                            args.probe_live, args.per_host)
+        print(f"Worker {args.name or os.getpid()}: probed {probed} channels", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
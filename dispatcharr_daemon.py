@@ -0,0 +1,220 @@
+import argparse
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from dispatcharr_auth import token_manager
+from dispatcharr_channel_status_cli import load_config
+from dispatcharr_metrics import METRICS
+from dispatcharr_monitor import MonitorScheduler
+from dispatcharr_probe import fetch_channels, probe_channel, split_resolution, ProbeCache, set_probe_cache, set_stream_stats_max_age, ActiveSessions
+
+# Headless daemon: probes channels on a schedule (MonitorScheduler) and serves
+# Prometheus/OpenMetrics on /metrics. Scrapes never touch the probe pipeline:
+# a render thread rebuilds the exposition text from the latest results every
+# few seconds and the HTTP handler just writes those bytes.
+
+RENDER_EVERY = 5.0
+PROMETHEUS_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+OPENMETRICS_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items() if v is not None) + "}"
+
+
+def _number(value):
+    if value is None:
+        return "NaN"
+    return repr(float(value))
+
+
+class StatusSnapshot:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._channels = {}   # channel_id -> (channel, results, probed_at)
+        self._texts = {False: b"", True: b"# EOF\n"}
+
+    def update(self, channel, results):
+        with self._lock:
+            self._channels[str(channel.get('id'))] = (channel, results, time.time())
+
+    def retain(self, channel_ids):
+        with self._lock:
+            for cid in list(self._channels):
+                if cid not in channel_ids:
+                    del self._channels[cid]
+
+    def text(self, openmetrics=False):
+        return self._texts[openmetrics]
+
+    def render(self):
+        # Always re-rendered: process counters move even when no channel did
+        with self._lock:
+            channels = list(self._channels.values())
+        self._texts = {False: self._render(channels, False), True: self._render(channels, True)}
+
+    def _render(self, channels, openmetrics):
+        lines = []
+
+        def header(name, kind, help_text):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        header("dispatcharr_channel_up", "gauge", "1 if any stream of the channel probed online")
+        for ch, results, _ in channels:
+            up = any(r['status'] == "Online" for r in results)
+            lines.append(f"dispatcharr_channel_up{_labels(channel_id=ch.get('id'), channel_name=ch.get('name'))} {1 if up else 0}")
+
+        header("dispatcharr_stream_info", "gauge", "Stream codec and resolution (value is always 1)")
+        for ch, results, _ in channels:
+            for r in results:
+                lines.append("dispatcharr_stream_info" + _labels(
+                    channel_id=ch.get('id'), channel_name=ch.get('name'), stream_url=r.get('stream_url'),
+                    status=r['status'], codec=r.get('codec') or "", resolution=r.get('resolution') or "") + " 1")
+
+        for metric, help_text in (("fps", "Stream frames per second"), ("width", "Stream width in pixels"), ("height", "Stream height in pixels")):
+            header(f"dispatcharr_stream_{metric}", "gauge", help_text)
+            for ch, results, _ in channels:
+                for r in results:
+                    width, height = split_resolution(r.get('resolution'))
+                    value = {"fps": r.get('fps'), "width": width, "height": height}[metric]
+                    try:
+                        value = float(value) if value is not None else None
+                    except (TypeError, ValueError):
+                        value = None
+                    if value is None:
+                        continue
+                    lines.append(f"dispatcharr_stream_{metric}{_labels(channel_id=ch.get('id'), stream_url=r.get('stream_url'))} {_number(value)}")
+
+        header("dispatcharr_channel_last_probe_timestamp_seconds", "gauge", "Unix time of the channel's last probe")
+        for ch, _, probed_at in channels:
+            lines.append(f"dispatcharr_channel_last_probe_timestamp_seconds{_labels(channel_id=ch.get('id'))} {_number(probed_at)}")
+
+        header("dispatcharr_probes_in_flight", "gauge", "ffprobe runs in progress per stream host")
+        for labels, value in METRICS.gauges('probes_in_flight').items():
+            lines.append(f"dispatcharr_probes_in_flight{_labels(**dict(labels))} {value}")
+
+        counters, histograms = METRICS.snapshot()
+        for name, help_text in (
+            ("api_calls_total", "Dispatcharr API requests made"),
+            ("probes_total", "ffprobe runs"),
+            ("probe_failures_total", "Streams that probed offline"),
+            ("probe_cache_hits_total", "Probes answered from the probe cache"),
+            ("stream_stats_hits_total", "Probes skipped thanks to fresh Dispatcharr stream stats"),
+            ("live_sessions_total", "Channels reported from live proxy stats because viewers were watching"),
+        ):
+            base = name[:-len("_total")]
+            header(f"dispatcharr_{base if openmetrics else name}", "counter", help_text)
+            series = [(dict(labels), v) for (n, labels), v in counters.items() if n == name] or [({}, 0)]
+            for labels, value in series:
+                lines.append(f"dispatcharr_{name}{_labels(**labels)} {value}")
+
+        h = histograms.get('probe_duration_seconds')
+        header("dispatcharr_probe_duration_seconds", "histogram", "ffprobe wall time per stream")
+        if h is not None:
+            cumulative = 0
+            for bound, count in zip(list(h.buckets) + ["+Inf"], h.counts):
+                cumulative += count
+                le = bound if bound == "+Inf" else _number(bound)
+                lines.append(f'dispatcharr_probe_duration_seconds_bucket{{le="{le}"}} {cumulative}')
+            lines.append(f"dispatcharr_probe_duration_seconds_sum {_number(h.sum)}")
+            lines.append(f"dispatcharr_probe_duration_seconds_count {h.count}")
+
+        if openmetrics:
+            lines.append("# EOF")
+        return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/metrics', '/'):
+            self.send_error(404)
+            return
+        openmetrics = 'application/openmetrics-text' in self.headers.get('Accept', '')
+        body = self.server.snapshot.text(openmetrics)
+        self.send_response(200)
+        self.send_header("Content-Type", OPENMETRICS_TYPE if openmetrics else PROMETHEUS_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dispatcharr Channel Status daemon (Prometheus /metrics)")
+    parser.add_argument('--url', help='Dispatcharr server URL')
+    parser.add_argument('--api-key', help='API key/token')
+    parser.add_argument('--interval', type=float, default=300.0, help='Seconds between probes of a stable channel (default 300)')
+    parser.add_argument('--max-connections', type=int, default=4, help='Max concurrent probe connections (default 4)')
+    parser.add_argument('--listen', default='127.0.0.1', help='Metrics listen address (default 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=9877, help='Metrics port (default 9877)')
+    parser.add_argument('--cache-ttl', type=float, default=None, help='Reuse a URL\'s probe result for this many seconds (default interval/2)')
+    parser.add_argument('--stats-max-age', type=float, default=6.0, help='Trust Dispatcharr\'s stored stream stats younger than this many hours instead of probing (0 = always probe, default 6)')
+    parser.add_argument('--probe-live', action='store_true', help='Probe channels even while viewers are watching them (opens a second upstream connection)')
+    parser.add_argument('--no-history', action='store_true', help='Do not record results to the probe history database')
+    args = parser.parse_args()
+
+    config = load_config()
+    url = args.url or config.get("DISPATCHARR_URL")
+    # A long-running daemon outlives any access token: renew it instead of failing with 401s
+    api_key = token_manager(url, config, args.api_key)
+
+    set_stream_stats_max_age(args.stats_max_age * 3600)
+    set_probe_cache(ProbeCache(args.cache_ttl if args.cache_ttl is not None else args.interval / 2))
+    history = None
+    if not args.no_history:
+        from dispatcharr_history import HistoryStore
+        history = HistoryStore()
+    snapshot = StatusSnapshot()
+    sessions = None if args.probe_live else ActiveSessions(url, api_key)
+
+    def probe(ch):
+        results = probe_channel(url, api_key, ch, sessions)
+        snapshot.update(ch, results)
+        if history:
+            history.record(results)
+        return any(r['status'] == "Online" for r in results)
+
+    scheduler = MonitorScheduler(probe, interval=args.interval, max_connections=args.max_connections)
+    server = ThreadingHTTPServer((args.listen, args.port), MetricsHandler)
+    server.daemon_threads = True
+    server.snapshot = snapshot
+    snapshot.render()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Serving metrics on http://{args.listen}:{args.port}/metrics", flush=True)
+
+    next_reload = 0
+    try:
+        while True:
+            # Pick up added/removed channels once per interval
+            if time.time() >= next_reload:
+                try:
+                    channels = fetch_channels(url, api_key)
+                    scheduler.set_channels(channels)
+                    snapshot.retain({str(ch.get('id')) for ch in channels})
+                    scheduler.start()
+                except Exception as e:
+                    print(f"Error fetching channels: {e}", flush=True)
+                next_reload = time.time() + args.interval
+            snapshot.render()
+            time.sleep(RENDER_EVERY)
+    except KeyboardInterrupt:
+        print("Stopping...")
+    finally:
+        scheduler.stop()
+        server.shutdown()
+        if history:
+            history.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+import threading
+import time
+
+from dispatcharr_probe import stream_host, stream_url_of, server_stream_stats
+
+# Analyze runs bounded by a time budget ("the best picture you can get in 5
+# minutes"). The plan orders channels so the most valuable probes happen
+# first, estimates what the rest will cost from per-host probe times (history,
+# then this run's timings) and, when the backlog no longer fits, degrades:
+#   full    probe + capture, as without a deadline
+#   fast    no capture, and Dispatcharr's stored stats of any age are used
+#           before opening a connection
+#   cached  never connect: last recorded result (a stream with none is Stale)
+# Until some probe time is known (no history, e.g. --no-history) the first
+# probes run at full tier to measure one, rather than planning everything
+# from DEFAULT_PROBE_COST.
+# At the deadline the run is cancelled (in-flight probes killed) and every
+# channel that didn't get a result is reported "Stale", not "Offline".
+
+DEFAULT_PROBE_COST = 3.0        # seconds per probe before any timing is known
+FAST_STATS_MAX_AGE = 7 * 86400  # fast tier trusts stored stream stats up to a week old
+HISTORY_WINDOW = 7 * 86400      # probe timings/results considered for the plan
+MAX_STALENESS = 7 * 86400       # never-probed channels rank as this stale
+COST_SMOOTHING = 0.3
+
+
+class DeadlinePlan:
+    def __init__(self, budget, workers, history=None):
+        self.budget = budget
+        self.workers = max(1, int(workers))
+        self.started = time.monotonic()
+        self.deadline = self.started + budget
+        self._lock = threading.Lock()
+        self._host_cost = {}     # host -> seconds per probe
+        self._last_seen = {}     # channel_id -> (ts, online)
+        self._cached = {}        # stream_url -> last recorded result
+        self._done = set()
+        self._timer = None
+        self._seeding = 0        # full-tier probes handed out before any cost was known
+        self._streams_per_channel = None
+        self.tiers = {'full': 0, 'fast': 0, 'cached': 0, 'stale': 0}
+        if history is not None:
+            self._load(history)
+
+    def _load(self, history):
+        since = time.time() - HISTORY_WINDOW
+        try:
+            rows = history.latest_results(since)
+            costs = history.probe_costs(since)
+        except Exception:
+            # A plan without history still works, just with default costs
+            return
+        for ts, channel_id, url, status, codec, width, height, fps in rows:
+            # A channel counts as online if its most recent probe of any stream was
+            seen = self._last_seen.get(channel_id)
+            if seen is None or ts > seen[0]:
+                self._last_seen[channel_id] = (ts, bool(status))
+            elif ts == seen[0] and status:
+                self._last_seen[channel_id] = (ts, True)
+            if url:
+                self._cached[url] = {
+                    'ts': ts, 'stream_url': url, 'status': "Online" if status else "Offline", 'codec': codec,
+                    'resolution': f"{width}x{height}" if width and height else None, 'fps': fps,
+                }
+        per_host = {}
+        for url, (avg_ms, n) in costs.items():
+            total, count = per_host.get(stream_host(url), (0.0, 0))
+            per_host[stream_host(url)] = (total + avg_ms * n, count + n)
+        self._host_cost = {host: total / count / 1000 for host, (total, count) in per_host.items() if count}
+
+    # --- ordering ---
+    def order(self, items, channel_id=lambda item: item.get('id'), number=None):
+        # Stalest first, weighted by importance: a channel that was Online last
+        # time counts double (it is what viewers use), one last seen Offline
+        # half. Channel number breaks ties, so the main lineup goes first.
+        now = time.time()
+
+        def key(item):
+            seen = self._last_seen.get(str(channel_id(item)))
+            if seen is None:
+                score = MAX_STALENESS
+            else:
+                score = min(MAX_STALENESS, now - seen[0]) * (2.0 if seen[1] else 0.5)
+            try:
+                n = float(number(item)) if number else 0.0
+            except (TypeError, ValueError):
+                n = float('inf')
+            return -score, n
+
+        return sorted(items, key=key)
+
+    # --- budget ---
+    def remaining(self):
+        return self.deadline - time.monotonic()
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    def cost(self, host):
+        with self._lock:
+            return self._host_cost.get(host, self._mean_cost())
+
+    def _mean_cost(self):
+        if not self._host_cost:
+            return DEFAULT_PROBE_COST
+        return sum(self._host_cost.values()) / len(self._host_cost)
+
+    def observe(self, url, result):
+        # This run's probe times refine the history-based estimate
+        if not url or result.get('probe_ms') is None:
+            return
+        host = stream_host(url)
+        seconds = result['probe_ms'] / 1000
+        with self._lock:
+            previous = self._host_cost.get(host)
+            self._host_cost[host] = seconds if previous is None else previous + COST_SMOOTHING * (seconds - previous)
+
+    def note_channel(self, stream_count):
+        with self._lock:
+            previous = self._streams_per_channel
+            self._streams_per_channel = stream_count if previous is None else previous + COST_SMOOTHING * (stream_count - previous)
+
+    def tier(self, url, run):
+        # run: the AnalyzeRun, whose queue is the backlog still to fit in the budget
+        remaining = self.remaining()
+        with self._lock:
+            seed = url and not self._host_cost and self._seeding < self.workers
+            if seed and remaining > 0:
+                self._seeding += 1
+        if remaining <= 0:
+            tier = 'stale'
+        elif seed:
+            # Nothing measured yet: probe to learn what a probe costs
+            tier = 'full'
+        elif url and self.cost(stream_host(url)) > remaining:
+            # This probe would end after the deadline
+            tier = 'cached' if url in self._cached else 'stale'
+        else:
+            completed, total, active = run.progress()
+            with self._lock:
+                backlog = (total - completed) * (self._streams_per_channel or 1.0) * self._mean_cost()
+            tier = 'fast' if backlog / self.workers > remaining else 'full'
+        with self._lock:
+            self.tiers[tier] += 1
+        return tier
+
+    def quick_result(self, stream, tier):
+        # Result for a degraded tier without connecting, or None if the stream must be probed
+        if tier == 'full':
+            return None
+        url = stream_url_of(stream)
+        if tier == 'fast':
+            codec, resolution, fps = server_stream_stats(stream, max_age=FAST_STATS_MAX_AGE)
+            if codec and resolution and fps:
+                return {'ts': time.time(), 'stream_url': url, 'status': "Online", 'codec': codec,
+                        'resolution': resolution, 'fps': fps, 'probe_ms': None, 'source': 'stats'}
+            return None
+        if tier == 'stale':
+            return self.stale_result(stream=stream)
+        cached = self._cached.get(url)
+        if cached is not None:
+            return dict(cached, probe_ms=None, source='cached')
+        return self.stale_result(stream=stream)
+
+    def stale_result(self, channel=None, stream=None):
+        # Not measured in time: last known values, status Stale
+        url = stream_url_of(stream) if stream else None
+        cached = self._cached.get(url) or {}
+        result = {
+            'ts': time.time(), 'stream_url': url, 'status': "Stale", 'codec': cached.get('codec'),
+            'resolution': cached.get('resolution'), 'fps': cached.get('fps'), 'probe_ms': None, 'source': 'deadline',
+        }
+        if channel is not None:
+            result['channel_id'] = channel.get('id')
+            result['channel_name'] = channel.get('name')
+        return result
+
+    # --- run control ---
+    def start(self, run):
+        # Cancel the run (killing in-flight probes) when the budget is spent
+        self._timer = threading.Timer(max(0.0, self.remaining()), run.cancel)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def stop(self):
+        if self._timer is not None:
+            self._timer.cancel()
+
+    def done(self, channel_id):
+        with self._lock:
+            self._done.add(str(channel_id))
+
+    def pending(self, items, channel_id=lambda item: item.get('id')):
+        # Items that never got a result
+        with self._lock:
+            return [item for item in items if str(channel_id(item)) not in self._done]
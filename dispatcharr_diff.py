@@ -0,0 +1,131 @@
+import hashlib
+import json
+import os
+import subprocess
+import threading
+import time
+
+import requests
+
+from dispatcharr_probe import split_resolution
+
+# Run-to-run diff. Each channel's outcome is reduced to a small record
+# (status, codec, resolution, fps of its best stream) and a hash of it; the
+# snapshot keeps the last record per channel. Diffing a channel is one dict
+# lookup and a hash compare, so a run costs O(n) and only channels whose hash
+# moved are looked at field by field. The change list can be printed
+# (--changes-only), highlighted in the GUI and sent to a webhook or script.
+
+SNAPSHOT_FILE = "dispatcharr_snapshot.json"
+# Not a measurement of the channel: never diffed, never stored. This is the
+# one filter for the CLI, the GUI and the probe service: proxy stats of a
+# watched channel ('live') and --incremental reuse ('unchanged') included.
+UNMEASURED_SOURCES = ('unchanged', 'cached', 'deadline', 'skipped', 'live')
+
+
+def channel_record(results):
+    # The channel's best stream, as the GUI row shows it; None if nothing was measured
+    measured = [r for r in results if r.get('status') in ("Online", "Offline")
+                and r.get('source') not in UNMEASURED_SOURCES and not r.get('error')]
+    if not measured:
+        return None
+    best = next((r for r in measured if r['status'] == "Online"), measured[0])
+    fps = best.get('fps')
+    try:
+        fps = round(float(fps), 2) if fps else None
+    except (TypeError, ValueError):
+        fps = None
+    return {'status': best['status'], 'codec': best.get('codec'), 'resolution': best.get('resolution'), 'fps': fps}
+
+
+def record_hash(record):
+    return hashlib.sha1(json.dumps(record, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+
+def compare(old, new):
+    # [(kind, old value, new value)] between two records of one channel
+    if old['status'] != new['status']:
+        return [('offline' if new['status'] == "Offline" else 'online', old['status'], new['status'])]
+    if new['status'] != "Online":
+        return []
+    changes = []
+    if old['resolution'] != new['resolution']:
+        old_height, new_height = split_resolution(old['resolution'])[1], split_resolution(new['resolution'])[1]
+        drop = old_height is not None and new_height is not None and new_height < old_height
+        changes.append(('resolution_drop' if drop else 'resolution', old['resolution'], new['resolution']))
+    if old['fps'] != new['fps']:
+        changes.append(('fps', old['fps'], new['fps']))
+    if old['codec'] != new['codec']:
+        changes.append(('codec', old['codec'], new['codec']))
+    return changes
+
+
+class Snapshot:
+    def __init__(self, path=SNAPSHOT_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._channels = {}
+        if os.path.exists(path):
+            try:
+                with open(path, "r") as f:
+                    self._channels = json.load(f).get('channels', {})
+            except Exception:
+                self._channels = {}
+
+    def diff(self, channel_id, channel_name, results):
+        # Changes of this channel since its last measured result; updates the snapshot
+        record = channel_record(results)
+        if record is None:
+            return []
+        digest = record_hash(record)
+        key = str(channel_id)
+        with self._lock:
+            previous = self._channels.get(key)
+            self._channels[key] = {'hash': digest, 'record': record, 'ts': time.time()}
+        # First sighting is a baseline, not a change
+        if previous is None or previous.get('hash') == digest:
+            return []
+        now = time.time()
+        return [{'channel_id': channel_id, 'channel_name': channel_name, 'kind': kind, 'old': old, 'new': new, 'ts': now}
+                for kind, old, new in compare(previous['record'], record)]
+
+    def save(self):
+        with self._lock:
+            data = json.dumps({'channels': self._channels})
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(data)
+        os.replace(tmp, self.path)
+
+
+def format_change(change):
+    name = f"{change.get('channel_name') or ''} ({change['channel_id']})"
+    kind, old, new = change['kind'], change['old'], change['new']
+    if kind == 'offline':
+        return f"{name}: went offline"
+    if kind == 'online':
+        return f"{name}: back online"
+    if kind == 'resolution_drop':
+        return f"{name}: resolution dropped {old} -> {new}"
+    return f"{name}: {kind} changed {old} -> {new}"
+
+
+def notify(changes, webhook=None, script=None):
+    # Sends the run's change list (JSON) to a webhook (POST) and/or a script
+    # (on stdin). Returns the errors, so a broken hook never fails the run.
+    errors = []
+    if not changes:
+        return errors
+    payload = json.dumps({'changes': changes, 'count': len(changes), 'ts': time.time()})
+    if webhook:
+        try:
+            resp = requests.post(webhook, data=payload, headers={'Content-Type': 'application/json'}, timeout=10)
+            resp.raise_for_status()
+        except requests.RequestException as e:
+            errors.append(f"webhook: {e}")
+    if script:
+        try:
+            subprocess.run(script, input=payload, text=True, shell=True, timeout=60, check=True)
+        except (OSError, subprocess.SubprocessError) as e:
+            errors.append(f"script: {e}")
+    return errors
@@ -0,0 +1,82 @@
+import threading
+import time
+from collections import deque
+from urllib.parse import urlparse
+
+import requests
+
+# Failures of a run, aggregated instead of reported one by one. Workers call
+# record() (a dict update and a deque append under a lock) and carry on; the
+# GUI polls version to redraw its error panel when something new came in, so
+# a provider that is down costs one growing "connection / host" line rather
+# than a modal dialog per channel stalling every worker.
+
+MAX_DETAILS = 500           # most recent failures kept with their messages
+DETAILS_PER_GROUP = 20      # of those, shown under each category/host
+
+
+def classify(error):
+    # (category, host) of an exception from the API or a probe
+    response = getattr(error, 'response', None)
+    request = getattr(error, 'request', None) or getattr(response, 'request', None)
+    url = getattr(request, 'url', None)
+    host = urlparse(url).netloc.lower() if url else ""
+    status = getattr(response, 'status_code', None)
+    if status in (401, 403):
+        return 'auth', host
+    if status:
+        return f'http {status}', host
+    if isinstance(error, requests.Timeout):
+        return 'timeout', host
+    if isinstance(error, requests.ConnectionError):
+        return 'connection', host
+    return 'error', host
+
+
+class ErrorLog:
+    def __init__(self, max_details=MAX_DETAILS):
+        self._lock = threading.Lock()
+        self._groups = {}                   # (category, host) -> {'count', 'first', 'last', 'message'}
+        self._details = deque(maxlen=max_details)
+        self.version = 0                    # bumped on every change, for cheap polling
+
+    def record(self, category, message, host="", channel_id=None, channel_name=None):
+        now = time.time()
+        entry = {'ts': now, 'category': category, 'host': host or "", 'message': str(message),
+                 'channel_id': channel_id, 'channel_name': channel_name}
+        with self._lock:
+            group = self._groups.get((category, entry['host']))
+            if group is None:
+                group = self._groups[(category, entry['host'])] = {'count': 0, 'first': now}
+            group['count'] += 1
+            group['last'] = now
+            group['message'] = entry['message']
+            self._details.append(entry)
+            self.version += 1
+
+    def record_exception(self, error, context, host="", channel_id=None, channel_name=None):
+        category, error_host = classify(error)
+        self.record(category, f"{context}: {error}", error_host or host, channel_id, channel_name)
+
+    def total(self):
+        with self._lock:
+            return sum(group['count'] for group in self._groups.values())
+
+    def groups(self, details=DETAILS_PER_GROUP):
+        # Category/host groups, most frequent first, each with its latest failures
+        with self._lock:
+            groups = [dict(group, category=category, host=host, details=[])
+                      for (category, host), group in self._groups.items()]
+            entries = list(self._details)
+        by_key = {(g['category'], g['host']): g for g in groups}
+        for entry in reversed(entries):
+            group = by_key.get((entry['category'], entry['host']))
+            if group is not None and len(group['details']) < details:
+                group['details'].append(entry)
+        return sorted(groups, key=lambda g: (-g['count'], g['category'], g['host']))
+
+    def clear(self):
+        with self._lock:
+            self._groups = {}
+            self._details.clear()
+            self.version += 1
@@ -0,0 +1,265 @@
+import queue
+import sqlite3
+import threading
+import time
+
+from dispatcharr_probe import split_resolution
+
+# Probe history in SQLite (WAL). Writes go through a single background
+# writer thread that batches whatever is queued into one transaction, so
+# callers (the Tk thread, probe workers) never wait on disk.
+
+HISTORY_DB = "dispatcharr_history.db"
+RAW_RETENTION_DAYS = 7        # keep every probe this long, then roll up to hourly rows
+ROLLUP_RETENTION_DAYS = 365   # drop hourly rollups after this
+COMPACT_EVERY = 3600          # seconds between retention passes
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS probes (
+    ts REAL NOT NULL,
+    channel_id TEXT,
+    channel_name TEXT,
+    stream_url TEXT,
+    status INTEGER NOT NULL,
+    codec TEXT,
+    width INTEGER,
+    height INTEGER,
+    fps REAL,
+    probe_ms REAL,
+    series_id INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_probes_channel_ts ON probes (channel_id, ts);
+CREATE TABLE IF NOT EXISTS series (
+    id INTEGER PRIMARY KEY,
+    channel_id TEXT NOT NULL,
+    stream_url TEXT NOT NULL,
+    UNIQUE (channel_id, stream_url)
+);
+CREATE INDEX IF NOT EXISTS idx_probes_url_ts ON probes (stream_url, ts);
+CREATE TABLE IF NOT EXISTS probes_hourly (
+    hour INTEGER NOT NULL,
+    channel_id TEXT NOT NULL DEFAULT '',
+    channel_name TEXT,
+    stream_url TEXT NOT NULL DEFAULT '',
+    samples INTEGER NOT NULL,
+    online INTEGER NOT NULL,
+    avg_probe_ms REAL,
+    max_probe_ms REAL,
+    codec TEXT,
+    width INTEGER,
+    height INTEGER,
+    fps REAL,
+    PRIMARY KEY (channel_id, stream_url, hour)
+);
+CREATE INDEX IF NOT EXISTS idx_hourly_url_hour ON probes_hourly (stream_url, hour);
+"""
+
+# Every (channel, stream) pair gets an integer series id, so analytics can
+# load probes as plain numeric columns instead of string keys
+SERIES_SQL = "INSERT OR IGNORE INTO series (channel_id, stream_url) VALUES (IFNULL(?, ''), IFNULL(?, ''))"
+INSERT_SQL = (
+    "INSERT INTO probes (ts, channel_id, channel_name, stream_url, status, codec, width, height, fps, probe_ms, series_id) "
+    "VALUES (?1, ?2, ?3, ?4, ?5, ?6, ?7, ?8, ?9, ?10, "
+    "(SELECT id FROM series WHERE channel_id = IFNULL(?2, '') AND stream_url = IFNULL(?4, '')))"
+)
+BACKFILL_SERIES_SQL = """
+INSERT OR IGNORE INTO series (channel_id, stream_url)
+SELECT DISTINCT IFNULL(channel_id, ''), IFNULL(stream_url, '') FROM probes WHERE series_id IS NULL
+"""
+BACKFILL_PROBES_SQL = """
+UPDATE probes SET series_id = (SELECT id FROM series WHERE series.channel_id = IFNULL(probes.channel_id, '')
+                                                        AND series.stream_url = IFNULL(probes.stream_url, ''))
+WHERE series_id IS NULL
+"""
+
+# Missing key parts are stored as '' (SQLite treats NULLs in a primary key
+# as distinct, so they would never hit the ON CONFLICT merge)
+ROLLUP_MERGE = """
+ON CONFLICT (channel_id, stream_url, hour) DO UPDATE SET
+    avg_probe_ms = COALESCE((avg_probe_ms * samples + excluded.avg_probe_ms * excluded.samples)
+                            / (samples + excluded.samples), avg_probe_ms, excluded.avg_probe_ms),
+    max_probe_ms = MAX(COALESCE(max_probe_ms, 0), COALESCE(excluded.max_probe_ms, 0)),
+    samples = samples + excluded.samples,
+    online = online + excluded.online
+"""
+
+ROLLUP_SQL = """
+INSERT INTO probes_hourly (hour, channel_id, channel_name, stream_url, samples, online,
+                           avg_probe_ms, max_probe_ms, codec, width, height, fps)
+SELECT CAST(ts / 3600 AS INTEGER) * 3600, IFNULL(channel_id, ''), MAX(channel_name), IFNULL(stream_url, ''),
+       COUNT(*), SUM(status), AVG(probe_ms), MAX(probe_ms),
+       MAX(codec), MAX(width), MAX(height), AVG(fps)
+FROM probes WHERE ts < ?
+GROUP BY IFNULL(channel_id, ''), IFNULL(stream_url, ''), CAST(ts / 3600 AS INTEGER)
+""" + ROLLUP_MERGE
+
+# Databases created before the NOT NULL key columns: fold the NULL-keyed
+# duplicate rollups into one '' row each
+NULL_KEYS_SQL = """
+INSERT INTO probes_hourly (hour, channel_id, channel_name, stream_url, samples, online,
+                           avg_probe_ms, max_probe_ms, codec, width, height, fps)
+SELECT hour, IFNULL(channel_id, ''), MAX(channel_name), IFNULL(stream_url, ''),
+       SUM(samples), SUM(online), SUM(avg_probe_ms * samples) / SUM(CASE WHEN avg_probe_ms IS NOT NULL THEN samples END),
+       MAX(max_probe_ms), MAX(codec), MAX(width), MAX(height), AVG(fps)
+FROM probes_hourly WHERE channel_id IS NULL OR stream_url IS NULL
+GROUP BY hour, IFNULL(channel_id, ''), IFNULL(stream_url, '')
+""" + ROLLUP_MERGE
+
+
+def connect(path=HISTORY_DB):
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def ensure_schema(conn):
+    # Create the tables, or bring a database from an older version up to date
+    conn.executescript(SCHEMA)
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(probes)")]
+    with conn:
+        if 'series_id' not in columns:
+            conn.execute("ALTER TABLE probes ADD COLUMN series_id INTEGER")
+            conn.execute(BACKFILL_SERIES_SQL)
+            conn.execute(BACKFILL_PROBES_SQL)
+        conn.execute(NULL_KEYS_SQL)
+        conn.execute("DELETE FROM probes_hourly WHERE channel_id IS NULL OR stream_url IS NULL")
+
+
+def result_row(result):
+    width, height = split_resolution(result.get('resolution'))
+    fps = result.get('fps')
+    try:
+        fps = float(fps) if fps is not None else None
+    except (TypeError, ValueError):
+        fps = None
+    return (
+        result.get('ts') or time.time(),
+        str(result.get('channel_id')) if result.get('channel_id') is not None else None,
+        result.get('channel_name'),
+        result.get('stream_url'),
+        1 if result.get('status') == "Online" else 0,
+        result.get('codec'),
+        width,
+        height,
+        fps,
+        result.get('probe_ms'),
+    )
+
+
+class HistoryStore:
+    def __init__(self, path=HISTORY_DB, raw_days=RAW_RETENTION_DAYS, rollup_days=ROLLUP_RETENTION_DAYS):
+        self.path = path
+        self.raw_days = raw_days
+        self.rollup_days = rollup_days
+        self._queue = queue.Queue()
+        conn = connect(path)
+        ensure_schema(conn)
+        conn.close()
+        self._writer = threading.Thread(target=self._write_loop, daemon=True)
+        self._writer.start()
+
+    def record(self, results):
+        # Non-blocking: rows are converted here, written by the writer thread
+        # Only measured outcomes: a stream skipped as Busy says nothing about its health,
+        # and a cached result (deadline runs) is already in the history
+        rows = [result_row(r) for r in results if r.get('status') in ("Online", "Offline") and r.get('source') != 'cached']
+        if rows:
+            self._queue.put(rows)
+
+    def flush(self):
+        self._queue.join()
+
+    def close(self):
+        self._queue.put(None)
+        self._writer.join()
+
+    def _write_loop(self):
+        conn = connect(self.path)
+        next_compact = 0
+        while True:
+            try:
+                item = self._queue.get(timeout=60)
+            except queue.Empty:
+                item = ()
+            batch = [item]
+            # Coalesce everything already queued into the same transaction
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = any(rows is None for rows in batch)
+            rows = [row for rows in batch if rows for row in rows]
+            try:
+                if rows:
+                    with conn:
+                        conn.executemany(SERIES_SQL, {(row[1], row[3]) for row in rows})
+                        conn.executemany(INSERT_SQL, rows)
+                if time.time() >= next_compact:
+                    self._compact(conn)
+                    next_compact = time.time() + COMPACT_EVERY
+            except sqlite3.Error:
+                # History is best-effort; never take the probe pipeline down with it
+                pass
+            for rows in batch:
+                if rows != ():
+                    self._queue.task_done()
+            if stop:
+                conn.close()
+                return
+
+    def _compact(self, conn):
+        now = time.time()
+        # Roll up whole hours only, so an hour is never split across passes
+        raw_cutoff = int((now - self.raw_days * 86400) // 3600) * 3600
+        rollup_cutoff = now - self.rollup_days * 86400
+        with conn:
+            conn.execute(ROLLUP_SQL, (raw_cutoff,))
+            conn.execute("DELETE FROM probes WHERE ts < ?", (raw_cutoff,))
+            conn.execute("DELETE FROM probes_hourly WHERE hour < ?", (rollup_cutoff,))
+
+    def compact(self):
+        conn = connect(self.path)
+        try:
+            self._compact(conn)
+        finally:
+            conn.close()
+
+    def channel_history(self, channel_id, since=None, limit=500):
+        conn = connect(self.path)
+        try:
+            cur = conn.execute(
+                "SELECT ts, stream_url, status, codec, width, height, fps, probe_ms FROM probes "
+                "WHERE channel_id = ? AND ts >= ? ORDER BY ts DESC LIMIT ?",
+                (str(channel_id), since or 0, limit),
+            )
+            return cur.fetchall()
+        finally:
+            conn.close()
+
+    def latest_results(self, since=None):
+        # Last recorded probe of every stream: (ts, channel_id, stream_url, status, codec, width, height, fps)
+        conn = connect(self.path)
+        try:
+            cur = conn.execute(
+                "SELECT MAX(ts), channel_id, stream_url, status, codec, width, height, fps FROM probes "
+                "WHERE ts >= ? GROUP BY channel_id, stream_url",
+                (since or 0,),
+            )
+            return cur.fetchall()
+        finally:
+            conn.close()
+
+    def probe_costs(self, since=None):
+        # Mean probe time (ms) per stream URL, for planning runs against a time budget
+        conn = connect(self.path)
+        try:
+            cur = conn.execute(
+                "SELECT stream_url, AVG(probe_ms), COUNT(probe_ms) FROM probes "
+                "WHERE probe_ms IS NOT NULL AND ts >= ? GROUP BY stream_url",
+                (since or 0,),
+            )
+            return {url: (avg, n) for url, avg, n in cur.fetchall()}
+        finally:
+            conn.close()
@@ -0,0 +1,64 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+from dispatcharr_probe import stream_url_of
+
+# Changed-only analysis. After each probe the channel's stream list is
+# fingerprinted (stream IDs + URLs, in order) and stored with its results.
+# On the next run a channel is only probed again if its fingerprint changed,
+# its last result is older than max_age, or any of its streams was offline;
+# otherwise the stored results are reused.
+
+STATE_FILE = "dispatcharr_incremental.json"
+DEFAULT_MAX_AGE = 24 * 3600
+
+
+def stream_fingerprint(streams):
+    key = json.dumps([[s.get('id'), stream_url_of(s)] for s in streams or []], separators=(',', ':'))
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+class IncrementalState:
+    def __init__(self, path=STATE_FILE, max_age=DEFAULT_MAX_AGE):
+        self.path = path
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._channels = {}
+        if os.path.exists(path):
+            try:
+                with open(path, "r") as f:
+                    self._channels = json.load(f).get('channels', {})
+            except Exception:
+                self._channels = {}
+
+    def reuse(self, channel_id, fingerprint):
+        # Previous results if the channel can be skipped, else None
+        with self._lock:
+            entry = self._channels.get(str(channel_id))
+        if not entry or entry.get('fingerprint') != fingerprint:
+            return None
+        results = entry.get('results') or []
+        if not results or time.time() - entry.get('ts', 0) > self.max_age:
+            return None
+        if any(r.get('status') != "Online" for r in results):
+            return None
+        return [dict(r, source='unchanged') for r in results]
+
+    def update(self, channel_id, fingerprint, results):
+        with self._lock:
+            self._channels[str(channel_id)] = {
+                'fingerprint': fingerprint,
+                'ts': time.time(),
+                'results': [{k: v for k, v in r.items() if k != 'image'} for r in results],
+            }
+
+    def save(self):
+        with self._lock:
+            data = json.dumps({'channels': self._channels})
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(data)
+        os.replace(tmp, self.path)
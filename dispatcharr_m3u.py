@@ -0,0 +1,122 @@
+import re
+import threading
+
+from dispatcharr_auth import api_get
+from dispatcharr_metrics import METRICS
+from dispatcharr_trace import span
+
+# Bulk catalogue from Dispatcharr's /output/m3u playlist: one streamed request
+# instead of a /api/channels/channels/{id}/streams/ call per channel.
+#   direct=True  -> each channel's upstream (provider) URL
+#   direct=False -> Dispatcharr's own proxy URL, i.e. exactly what clients play
+# The playlist carries one URL per channel (its first stream), not failovers.
+
+_ATTR_RE = re.compile(r'([\w-]+)="([^"]*)"')
+
+
+def parse_extinf(line):
+    # '#EXTINF:-1 tvg-id="x" group-title="News",Title' -> (attrs, title)
+    body = line[len("#EXTINF:"):]
+    last_quote = body.rfind('"')
+    comma = body.find(',', last_quote + 1 if last_quote >= 0 else 0)
+    title = body[comma + 1:].strip() if comma >= 0 else ""
+    attrs = dict(_ATTR_RE.findall(body[:comma] if comma >= 0 else body))
+    return attrs, title
+
+
+def iter_m3u(lines):
+    # Streaming parser: yields one entry per playable URL, never holds the playlist
+    pending = None
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode('utf-8', 'replace')
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith("#EXTINF:"):
+            pending = parse_extinf(line)
+        elif line.startswith('#'):
+            continue
+        elif pending is not None:
+            attrs, title = pending
+            pending = None
+            yield {
+                'name': attrs.get('tvg-name') or title,
+                'title': title,
+                'tvg_id': attrs.get('tvg-id'),
+                'channel_number': attrs.get('tvg-chno'),
+                'group': attrs.get('group-title'),
+                'logo': attrs.get('tvg-logo'),
+                'url': line,
+                'uuid': line.rstrip('/').rsplit('/', 1)[-1],
+            }
+
+
+def fetch_m3u(dispatcharr_url, api_key, direct=False, timeout=30):
+    params = {'direct': 'true'} if direct else None
+    METRICS.inc('api_calls_total', endpoint='output_m3u')
+    with api_get(f"{dispatcharr_url}/output/m3u", api_key, params=params, timeout=timeout, stream=True) as resp:
+        resp.raise_for_status()
+        yield from iter_m3u(resp.iter_lines(chunk_size=65536))
+
+
+def _number_key(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class M3UCatalogue:
+    # Channel -> [stream] lookups backed by one playlist download, made on first
+    # use by whichever worker gets there first (the others wait for it).
+    def __init__(self, dispatcharr_url, api_key, direct=True):
+        self.dispatcharr_url = dispatcharr_url
+        self.api_key = api_key
+        self.direct = direct
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._error = None
+        self._by_uuid = {}
+        self._by_number = {}
+        self._by_name = {}
+
+    def load(self):
+        with self._lock:
+            if self._loaded:
+                if self._error:
+                    raise self._error
+                return
+            self._loaded = True
+            try:
+                with span('fetch_m3u', cat='api', direct=self.direct):
+                    for entry in fetch_m3u(self.dispatcharr_url, self.api_key, direct=self.direct):
+                        self._by_uuid.setdefault(entry['uuid'], entry)
+                        number = _number_key(entry['channel_number'])
+                        if number is not None:
+                            self._by_number.setdefault(number, entry)
+                        self._by_name.setdefault((entry['name'] or "").strip().lower(), entry)
+            except Exception as e:
+                self._error = e
+                raise
+
+    def __len__(self):
+        return len(self._by_name)
+
+    def entry_for(self, channel):
+        # Proxy URLs end in the channel uuid; direct URLs don't, so fall back to number, then name
+        self.load()
+        entry = self._by_uuid.get(str(channel.get('uuid')))
+        if entry is None:
+            number = _number_key(channel.get('channel_number'))
+            entry = self._by_number.get(number) if number is not None else None
+        if entry is None:
+            entry = self._by_name.get((channel.get('name') or "").strip().lower())
+        return entry
+
+    def streams_for(self, channel):
+        # Same shape as fetch_channel_streams(): a list of stream dicts
+        entry = self.entry_for(channel)
+        if entry is None:
+            return []
+        return [{'name': entry['name'], 'url': entry['url']}]
@@ -0,0 +1,94 @@
+import bisect
+import threading
+from collections import deque
+
+# Process-wide, thread-safe counters and histograms. The probe pipeline
+# updates them; the daemon's /metrics endpoint (and anything else) reads
+# consistent snapshots.
+
+PROBE_BUCKETS = (0.25, 0.5, 1.0, 2.0, 3.0, 5.0, 7.5, 10.0, 15.0, 30.0)
+RECENT_SAMPLES = 512  # per histogram, for live percentiles over the latest observations
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    pos = (len(values) - 1) * q / 100.0
+    lo = int(pos)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (pos - lo)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def copy(self):
+        h = Histogram(self.buckets)
+        h.counts = list(self.counts)
+        h.sum = self.sum
+        h.count = self.count
+        return h
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+        self._recent = {}
+
+    def inc(self, name, n=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + n
+
+    def observe(self, name, value, buckets=PROBE_BUCKETS):
+        with self._lock:
+            h = self._histograms.get(name)
+            if h is None:
+                h = self._histograms[name] = Histogram(buckets)
+            h.observe(value)
+            recent = self._recent.get(name)
+            if recent is None:
+                recent = self._recent[name] = deque(maxlen=RECENT_SAMPLES)
+            recent.append(value)
+
+    def add(self, name, delta, **labels):
+        # Gauges (e.g. probes in flight per host) go up and down
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._gauges[key] = self._gauges.get(key, 0) + delta
+
+    def gauges(self, name):
+        with self._lock:
+            return {labels: v for (n, labels), v in self._gauges.items() if n == name}
+
+    def recent(self, name):
+        with self._lock:
+            return list(self._recent.get(name, ()))
+
+    def counter(self, name, **labels):
+        with self._lock:
+            if labels:
+                return self._counters.get((name, tuple(sorted(labels.items()))), 0)
+            return sum(v for (n, _), v in self._counters.items() if n == name)
+
+    def snapshot(self):
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {name: h.copy() for name, h in self._histograms.items()}
+        return counters, histograms
+
+
+METRICS = Metrics()
@@ -0,0 +1,238 @@
+import heapq
+import random
+import threading
+import time
+import concurrent.futures
+
+# Continuous re-probing. Channels sit in a heap keyed by when they are next
+# due (minus a bonus for pinned / failing channels). A single dispatcher pops
+# them at a paced rate, so a full pass is spread over the interval instead of
+# bursting, and never runs more than max_connections probes at once.
+
+DEFAULT_INTERVAL = 300       # seconds between probes of an ordinary channel
+FAST_FACTOR = 0.25           # failed / flapping channels: interval * 0.25
+PINNED_FACTOR = 0.5          # operator-pinned channels: interval * 0.5
+MAX_STABLE_FACTOR = 2.0      # long-stable channels back off up to interval * 2
+FLAP_WINDOW = 3600           # status changes within this many seconds count as flapping
+FLAP_THRESHOLD = 2
+
+
+class ChannelState:
+    __slots__ = ('channel', 'pinned', 'due', 'online', 'last_probe', 'stable_streak', 'flaps', 'version', 'running', 'rate')
+
+    def __init__(self, channel, pinned=False):
+        self.channel = channel
+        self.pinned = pinned
+        self.due = 0.0
+        self.online = None
+        self.last_probe = None
+        self.stable_streak = 0
+        self.flaps = []
+        self.version = 0
+        self.running = False
+        self.rate = 0.0         # this channel's share of the scheduler's probe rate
+
+    def flapping(self, now):
+        self.flaps = [t for t in self.flaps if now - t <= FLAP_WINDOW]
+        return len(self.flaps) >= FLAP_THRESHOLD
+
+
+class MonitorScheduler:
+    def __init__(self, probe_fn, interval=DEFAULT_INTERVAL, max_connections=4, jitter=0.2, max_rate=None, on_result=None, key_fn=None):
+        # probe_fn(channel) -> True if online; on_result(channel, online, error) is optional;
+        # key_fn(channel) identifies a channel (default its id; "server/id" across servers)
+        self.probe_fn = probe_fn
+        self.key_fn = key_fn or (lambda ch: str(ch.get('id')))
+        self.interval = float(interval)
+        self.max_connections = max(1, int(max_connections))
+        self.jitter = jitter
+        self.max_rate = max_rate
+        self.on_result = on_result
+        self._states = {}
+        self._rate = 0.0        # sum of every channel's rate, kept current by _set_rate
+        self._heap = []
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._slots = threading.BoundedSemaphore(self.max_connections)
+        self._stop = threading.Event()
+        self._thread = None
+        self._executor = None
+        self.probes_done = 0
+        self.started_at = None
+
+    # --- channel set ---
+    def set_channels(self, channels, pinned_ids=()):
+        pinned_ids = {str(i) for i in pinned_ids}
+        now = time.time()
+        with self._lock:
+            wanted = {self.key_fn(ch): ch for ch in channels}
+            for cid in list(self._states):
+                if cid not in wanted:
+                    del self._states[cid]
+            new = [cid for cid in wanted if cid not in self._states]
+            # Pinned first, then spread never-probed channels across one interval
+            new.sort(key=lambda cid: cid not in pinned_ids)
+            for i, cid in enumerate(new):
+                state = ChannelState(wanted[cid], cid in pinned_ids)
+                self._states[cid] = state
+                self._push(state, now + self.interval * i / max(1, len(new)))
+            for cid, ch in wanted.items():
+                self._states[cid].channel = ch
+                if cid in pinned_ids:
+                    self._states[cid].pinned = True
+            # Full recount: the channel set changed anyway, and it clears float drift
+            self._rate = 0.0
+            for state in self._states.values():
+                self._set_rate(state, now)
+            self._wake.notify()
+
+    def pin(self, channel, pinned=True):
+        # channel: the channel dict, found by key_fn as in set_channels
+        with self._lock:
+            state = self._states.get(self.key_fn(channel))
+            if state:
+                state.pinned = pinned
+                self._set_rate(state, time.time())
+                if pinned and not state.running:
+                    self._push(state, min(state.due, time.time()))
+                self._wake.notify()
+
+    def _priority_bonus(self, state):
+        bonus = 0.0
+        if state.pinned:
+            bonus += 0.25 * self.interval
+        if state.online is False:
+            bonus += 0.1 * self.interval
+        return bonus
+
+    def _push(self, state, due):
+        # Lazy deletion: older heap entries for this channel are skipped by version
+        state.version += 1
+        state.due = due
+        self._seq += 1
+        heapq.heappush(self._heap, (due - self._priority_bonus(state), self._seq, state.version, self.key_fn(state.channel)))
+
+    def _factor(self, state, now):
+        if state.online is False or state.flapping(now):
+            return FAST_FACTOR
+        if state.pinned:
+            return PINNED_FACTOR
+        return min(MAX_STABLE_FACTOR, 1.0 + 0.1 * state.stable_streak)
+
+    def _set_rate(self, state, now):
+        # Called whenever a channel's factor may have changed (probe result,
+        # pin, channel set), so _pace() is O(1) instead of a pass over every
+        # channel per dispatch. Flaps ageing out of FLAP_WINDOW are picked up
+        # at the channel's next probe, a quarter interval away at most.
+        factor = self._factor(state, now)
+        rate = 1.0 / (self.interval * factor)
+        self._rate += rate - state.rate
+        state.rate = rate
+        return factor
+
+    def _pace(self):
+        # Probe rate that completes every channel once per its own interval
+        rate = self._rate
+        if self.max_rate:
+            rate = min(rate, self.max_rate)
+        return 1.0 / rate if rate > 0 else self.interval
+
+    # --- run loop ---
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self.started_at = time.time()
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_connections)
+        self._thread = threading.Thread(target=self._dispatch_loop, daemon=True)
+        self._thread.start()
+
+    def stop(self, wait=False):
+        self._stop.set()
+        with self._lock:
+            self._wake.notify_all()
+        if self._executor:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+
+    def running(self):
+        return bool(self._thread and self._thread.is_alive() and not self._stop.is_set())
+
+    def _dispatch_loop(self):
+        next_slot = time.time()
+        while not self._stop.is_set():
+            with self._lock:
+                state = None
+                while self._heap and not self._stop.is_set():
+                    key, _, version, cid = self._heap[0]
+                    candidate = self._states.get(cid)
+                    if candidate is None or candidate.version != version or candidate.running:
+                        heapq.heappop(self._heap)
+                        continue
+                    wait = max(key, next_slot) - time.time()
+                    if wait > 0:
+                        self._wake.wait(timeout=min(wait, 1.0))
+                        continue
+                    heapq.heappop(self._heap)
+                    state = candidate
+                    state.running = True
+                    break
+                if state is None:
+                    self._wake.wait(timeout=1.0)
+                    continue
+                gap = self._pace()
+            # Jittered gap keeps probes evenly spread without lock-step bursts
+            next_slot = max(next_slot, time.time()) + gap * random.uniform(1 - self.jitter, 1 + self.jitter)
+            # Global connection budget: wait for a free slot before dispatching
+            while not self._slots.acquire(timeout=0.5):
+                if self._stop.is_set():
+                    return
+            try:
+                self._executor.submit(self._run_probe, state)
+            except RuntimeError:
+                self._slots.release()
+                return
+
+    def _run_probe(self, state):
+        online, error = False, None
+        try:
+            online = bool(self.probe_fn(state.channel))
+        except Exception as e:
+            error = e
+        finally:
+            self._slots.release()
+        now = time.time()
+        with self._lock:
+            if state.online is not None and online != state.online:
+                state.flaps.append(now)
+                state.stable_streak = 0
+            elif online:
+                state.stable_streak += 1
+            state.online = online
+            state.last_probe = now
+            state.running = False
+            self.probes_done += 1
+            if self.key_fn(state.channel) in self._states:
+                delay = self.interval * self._set_rate(state, now) * random.uniform(1 - self.jitter, 1 + self.jitter)
+                self._push(state, now + delay)
+            self._wake.notify()
+        if self.on_result:
+            try:
+                self.on_result(state.channel, online, error)
+            except Exception:
+                pass
+
+    def stats(self):
+        now = time.time()
+        with self._lock:
+            overdue = sum(1 for s in self._states.values() if not s.running and s.due < now - 1)
+            running = sum(1 for s in self._states.values() if s.running)
+            elapsed = now - self.started_at if self.started_at else 0
+            return {
+                'channels': len(self._states),
+                'probes_done': self.probes_done,
+                'running': running,
+                'overdue': overdue,
+                'rate': self.probes_done / elapsed if elapsed > 0 else 0.0,
+                'target_rate': 1.0 / self._pace() if self._states else 0.0,
+            }
@@ -0,0 +1,77 @@
+import time
+
+from dispatcharr_metrics import METRICS, percentile
+
+# Live pipeline figures for the GUI's performance panel, computed from
+# successive METRICS snapshots. Rates are smoothed (EWMA) so a panel updated
+# once a second doesn't jump around between bursts of completions.
+
+SMOOTHING = 0.3
+
+
+class PerfSampler:
+    def __init__(self, metrics=METRICS):
+        self.metrics = metrics
+        self._last = None
+        self._rates = {}
+
+    def _smooth(self, key, value):
+        previous = self._rates.get(key)
+        self._rates[key] = value if previous is None else previous + SMOOTHING * (value - previous)
+        return self._rates[key]
+
+    def sample(self, completed=None, total=None):
+        # completed/total: channels of the active run, for the ETA
+        now = time.monotonic()
+        totals = {
+            'probes': self.metrics.counter('probes_total'),
+            'hits': self.metrics.counter('probe_cache_hits_total'),
+            'api': self.metrics.counter('api_calls_total'),
+            'completed': completed or 0,
+        }
+        last, self._last = self._last, (now, totals)
+        rates = {}
+        if last is not None and now > last[0]:
+            dt = now - last[0]
+            for key in totals:
+                rates[key] = self._smooth(key, max(0, totals[key] - last[1][key]) / dt)
+        lookups = totals['probes'] + totals['hits']
+        recent_ms = [v * 1000 for v in self.metrics.recent('probe_duration_seconds')]
+        in_flight = {dict(labels).get('host', ''): n for labels, n in self.metrics.gauges('probes_in_flight').items() if n > 0}
+        eta = None
+        if total and completed is not None and completed < total and rates.get('completed'):
+            eta = (total - completed) / rates['completed']
+        return {
+            'probes_per_s': rates.get('probes'),
+            'api_per_s': rates.get('api'),
+            'cache_hit_rate': totals['hits'] / lookups if lookups else None,
+            'p50_ms': percentile(recent_ms, 50),
+            'p95_ms': percentile(recent_ms, 95),
+            'in_flight': in_flight,
+            'eta_s': eta,
+        }
+
+
+def format_sample(sample, tk_lag_ms=None):
+    def num(value, fmt):
+        return "--" if value is None else format(value, fmt)
+
+    hosts = sorted(sample['in_flight'].items(), key=lambda kv: -kv[1])
+    in_flight = ", ".join(f"{host}:{n}" for host, n in hosts[:3]) or "none"
+    if len(hosts) > 3:
+        in_flight += f" +{len(hosts) - 3}"
+    eta = sample['eta_s']
+    if eta is None:
+        eta_text = "--"
+    else:
+        # Round once, then split, so the seconds never read 60
+        minutes, seconds = divmod(int(round(eta)), 60)
+        eta_text = f"{minutes}m{seconds:02d}s" if minutes else f"{seconds}s"
+    hit_rate = sample['cache_hit_rate']
+    return (
+        f"Probes/s {num(sample['probes_per_s'], '.1f')} | ETA {eta_text} | "
+        f"p50 {num(sample['p50_ms'], '.0f')} ms p95 {num(sample['p95_ms'], '.0f')} ms | "
+        f"Cache hits {num(hit_rate * 100 if hit_rate is not None else None, '.0f')}% | "
+        f"API {num(sample['api_per_s'], '.1f')}/s | In flight {in_flight} | "
+        f"Tk lag {num(tk_lag_ms, '.0f')} ms"
+    )
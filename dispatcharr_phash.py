@@ -0,0 +1,218 @@
+import os
+import numpy as np
+
+# Perceptual-hash index used to spot channels that carry the same feed.
+# Hashes are 64-bit dHashes packed into a uint64 array so distance checks
+# are plain vectorized XOR + popcount instead of Python loops.
+
+HASH_SIZE = 8
+DEFAULT_MAX_DISTANCE = 6
+DEFAULT_MAX_SKEW = 60.0  # seconds between captures still considered "same moment"
+
+
+def dhash_image(path):
+    # Difference hash: shrink to 9x8 greyscale and compare neighbouring pixels
+    from PIL import Image
+    with Image.open(path) as img:
+        img = img.convert("L")
+        resample = Image.Resampling.LANCZOS if hasattr(Image, 'Resampling') else Image.LANCZOS
+        img = img.resize((HASH_SIZE + 1, HASH_SIZE), resample)
+        pixels = np.asarray(img, dtype=np.int16)
+    bits = pixels[:, 1:] > pixels[:, :-1]
+    return int(np.packbits(bits.ravel()).view('>u8')[0])
+
+
+def _popcount64(values):
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(values).astype(np.int64)
+    # SWAR popcount for numpy < 2.0
+    v = values.astype(np.uint64)
+    v = v - ((v >> np.uint64(1)) & np.uint64(0x5555555555555555))
+    v = (v & np.uint64(0x3333333333333333)) + ((v >> np.uint64(2)) & np.uint64(0x3333333333333333))
+    v = (v + (v >> np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+    return ((v * np.uint64(0x0101010101010101)) >> np.uint64(56)).astype(np.int64)
+
+
+def hamming(a, b):
+    return int(_popcount64(np.array([a ^ b], dtype=np.uint64))[0])
+
+
+def _chunk_widths(chunks):
+    base, extra = divmod(64, chunks)
+    return [base + 1 if i < extra else base for i in range(chunks)]
+
+
+def _bucket_pairs(keys):
+    # All (i, j) pairs that share a key, found by scanning the sorted keys at
+    # growing offsets; stops as soon as no bucket is that large.
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+    found = []
+    offset = 1
+    while offset < len(keys):
+        same = np.flatnonzero(sorted_keys[offset:] == sorted_keys[:-offset])
+        if not len(same):
+            break
+        found.append(np.stack([order[same], order[same + offset]], axis=1))
+        offset += 1
+    return found
+
+
+def _multi_index_pairs(hashes, max_distance, distinct=True):
+    # Pigeonhole: split the 64 bits into max_distance + 1 chunks; any pair
+    # within max_distance must match exactly on at least one chunk.
+    found = []
+    shift = 0
+    for width in _chunk_widths(max_distance + 1):
+        mask = np.uint64((1 << width) - 1)
+        keys = (hashes >> np.uint64(shift)) & mask
+        found.extend(_bucket_pairs(keys))
+        shift += width
+    if not found:
+        return np.empty((0, 2), dtype=np.int64)
+    pairs = np.concatenate(found).astype(np.int64)
+    # Verify before de-duplicating: far fewer survivors than candidates
+    dist = _popcount64(hashes[pairs[:, 0]] ^ hashes[pairs[:, 1]])
+    pairs = pairs[dist <= max_distance]
+    if not distinct:
+        # Pairs matching on several chunks repeat; harmless for clustering
+        return pairs
+    pairs.sort(axis=1)
+    codes = np.unique(pairs[:, 0] * len(hashes) + pairs[:, 1])
+    return np.stack([codes // len(hashes), codes % len(hashes)], axis=1)
+
+
+def _components(n, pairs):
+    # Smallest member of each node's connected component: min-label
+    # propagation with pointer jumping, vectorized over all edges at once
+    labels = np.arange(n)
+    if not len(pairs):
+        return labels
+    a, b = pairs[:, 0], pairs[:, 1]
+    while True:
+        low = np.minimum(labels[a], labels[b])
+        hooked = labels.copy()
+        for side in (a, b, labels[a], labels[b]):
+            np.minimum.at(hooked, side, low)
+        while True:
+            jumped = hooked[hooked]
+            if np.array_equal(jumped, hooked):
+                break
+            hooked = jumped
+        if np.array_equal(hooked, labels):
+            return labels
+        labels = hooked
+
+
+def _brute_force_pairs(hashes, max_distance, block=1024):
+    found = []
+    n = len(hashes)
+    for start in range(0, n, block):
+        rows = hashes[start:start + block]
+        dist = _popcount64(rows[:, None] ^ hashes[None, :])
+        i, j = np.nonzero(dist <= max_distance)
+        i = i + start
+        keep = j > i
+        found.append(np.stack([i[keep], j[keep]], axis=1))
+    if not found:
+        return np.empty((0, 2), dtype=np.int64)
+    return np.concatenate(found).astype(np.int64)
+
+
+class FrameHashIndex:
+    def __init__(self):
+        self.labels = []
+        self._hashes = []
+        self._times = []
+
+    def __len__(self):
+        return len(self.labels)
+
+    def add(self, label, frame_hash, captured_at=0.0):
+        self.labels.append(label)
+        self._hashes.append(frame_hash)
+        self._times.append(captured_at)
+
+    def add_image(self, label, path, captured_at=None):
+        if captured_at is None:
+            captured_at = os.path.getmtime(path)
+        self.add(label, dhash_image(path), captured_at)
+
+    def hashes(self):
+        return np.array(self._hashes, dtype=np.uint64)
+
+    def matching_pairs(self, max_distance=DEFAULT_MAX_DISTANCE, max_skew=DEFAULT_MAX_SKEW):
+        hashes = self.hashes()
+        if len(hashes) < 2:
+            return np.empty((0, 2), dtype=np.int64)
+        # Narrow chunks make buckets too big to help; compare everything instead
+        if 64 // (max_distance + 1) < 6:
+            pairs = _brute_force_pairs(hashes, max_distance)
+        else:
+            pairs = _multi_index_pairs(hashes, max_distance)
+        if max_skew is not None and len(pairs):
+            times = np.array(self._times, dtype=np.float64)
+            pairs = pairs[np.abs(times[pairs[:, 0]] - times[pairs[:, 1]]) <= max_skew]
+        return pairs
+
+    def clusters(self, max_distance=DEFAULT_MAX_DISTANCE, max_skew=DEFAULT_MAX_SKEW):
+        # Groups of 2+ labels whose frames match, transitively. Identical
+        # hashes (slates, black frames: the common duplicate) are collapsed
+        # first into one node per run of captures no more than max_skew apart,
+        # chained rather than paired, so only distinct hashes are compared and
+        # a 3000-frame slate costs no more than one frame.
+        n = len(self.labels)
+        if n < 2:
+            return []
+        hashes = self.hashes()
+        times = np.array(self._times, dtype=np.float64)
+        uniq, inverse = np.unique(hashes, return_inverse=True)
+        inverse = inverse.ravel()
+        if max_skew is None:
+            node = inverse
+            node_hashes = uniq
+        else:
+            order = np.lexsort((times, inverse))
+            sorted_hash = inverse[order]
+            sorted_times = times[order]
+            starts = np.ones(n, dtype=bool)
+            starts[1:] = (sorted_hash[1:] != sorted_hash[:-1]) | (np.diff(sorted_times) > max_skew)
+            node = np.empty(n, dtype=np.int64)
+            node[order] = np.cumsum(starts) - 1
+            first = np.flatnonzero(starts)
+            node_hashes = uniq[sorted_hash[first]]
+            lo = sorted_times[first]
+            hi = np.maximum.reduceat(sorted_times, first)
+        if len(node_hashes) < 2:
+            pairs = np.empty((0, 2), dtype=np.int64)
+        elif 64 // (max_distance + 1) < 6:
+            pairs = _brute_force_pairs(node_hashes, max_distance)
+        else:
+            pairs = _multi_index_pairs(node_hashes, max_distance, distinct=False)
+        if max_skew is not None and len(pairs):
+            # Runs have gaps <= max_skew, so two runs hold a pair of captures
+            # within max_skew exactly when their spans are that close
+            a, b = pairs[:, 0], pairs[:, 1]
+            pairs = pairs[np.maximum(lo[a], lo[b]) - np.minimum(hi[a], hi[b]) <= max_skew]
+        roots = _components(len(node_hashes), pairs)[node]
+        order = np.argsort(roots, kind='stable')
+        bounds = np.flatnonzero(np.diff(roots[order])) + 1
+        groups = [members for members in np.split(order, bounds) if len(members) > 1]
+        groups.sort(key=lambda members: members[0])
+        return [[self.labels[i] for i in members.tolist()] for members in groups]
+
+
+def index_captured_images(folder="captured"):
+    index = FrameHashIndex()
+    if not os.path.isdir(folder):
+        return index
+    for entry in sorted(os.listdir(folder)):
+        if not entry.lower().endswith(".jpg"):
+            continue
+        path = os.path.join(folder, entry)
+        try:
+            index.add_image(os.path.splitext(entry)[0], path)
+        except Exception:
+            # Truncated/failed captures are skipped, not fatal
+            continue
+    return index
@@ -0,0 +1,625 @@
+import json
+import os
+import re
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from urllib.parse import urlparse
+
+from dispatcharr_auth import api_get
+from dispatcharr_errors import classify
+from dispatcharr_metrics import METRICS
+from dispatcharr_trace import span
+
+# Probe pipeline shared by the GUI and the CLI. Every analyzed stream becomes
+# a plain result dict so it can be displayed, printed and recorded the same way.
+
+
+def parse_stream_list(data):
+    # The API may return a bare list, a paginated {'results': [...]} or some other dict of lists
+    if isinstance(data, dict):
+        if 'results' in data:
+            return data['results']
+        for v in data.values():
+            if isinstance(v, list):
+                return v
+    return data
+
+
+def fetch_channels(dispatcharr_url, api_key, timeout=30):
+    channels_url = f"{dispatcharr_url}/api/channels/channels/"
+    METRICS.inc('api_calls_total', endpoint='channels')
+    with span('fetch_channels', cat='api'):
+        resp = api_get(channels_url, api_key, timeout=timeout)
+        resp.raise_for_status()
+        return resp.json()
+
+
+def fetch_channel_streams(dispatcharr_url, api_key, channel_id, timeout=10):
+    channel_streams_url = f"{dispatcharr_url}/api/channels/channels/{channel_id}/streams/"
+    METRICS.inc('api_calls_total', endpoint='channel_streams')
+    with span('fetch_streams', cat='api', channel=channel_id):
+        resp = api_get(channel_streams_url, api_key, timeout=timeout)
+        resp.raise_for_status()
+        return parse_stream_list(resp.json())
+
+
+def parse_frame_rate(value):
+    # ffprobe reports rates as "num/den"; never eval() what a stream told us
+    if not value:
+        return None
+    try:
+        if '/' in str(value):
+            num, den = str(value).split('/', 1)
+            return float(num) / float(den) if float(den) else None
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class ProbeCancelled(Exception):
+    pass
+
+
+# ffprobe/ffmpeg children are registered with the run that owns the calling
+# thread (see dispatcharr_runs.AnalyzeRun), so cancelling a run kills them.
+_process_owner = threading.local()
+
+
+def set_process_owner(owner):
+    _process_owner.value = owner
+
+
+def run_command(cmd, timeout, text=False):
+    owner = getattr(_process_owner, 'value', None)
+    if owner is not None and owner.cancelled():
+        raise ProbeCancelled()
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, stdin=subprocess.DEVNULL, text=text)
+    if owner is not None:
+        owner.register(proc)
+    try:
+        out, err = proc.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.communicate()
+        raise
+    finally:
+        if owner is not None:
+            owner.unregister(proc)
+    return subprocess.CompletedProcess(cmd, proc.returncode, out, err)
+
+
+def ffprobe_stream(url):
+    cmd = [
+        "ffprobe", "-v", "error",
+        "-select_streams", "v:0",
+        "-show_entries", "stream=codec_name,width,height,avg_frame_rate",
+        "-of", "json", url
+    ]
+    host = stream_host(url)
+    METRICS.add('probes_in_flight', 1, host=host)
+    try:
+        with span('ffprobe', cat='probe', host=host):
+            result = run_command(cmd, timeout=10, text=True)
+        info = json.loads(result.stdout)
+        stream = info['streams'][0]
+        codec = stream.get('codec_name')
+        width = stream.get('width')
+        height = stream.get('height')
+        fps = parse_frame_rate(stream.get('avg_frame_rate'))
+        return codec, f"{width}x{height}", fps
+    except Exception:
+        return None, None, None
+    finally:
+        METRICS.add('probes_in_flight', -1, host=host)
+
+
+def sanitize_filename(name):
+    # Remove invalid filename characters and strip
+    return re.sub(r'[^\w\-_\. ]', '_', name).strip()
+
+
+def capture_image_from_stream(stream_url, channel_name, folder="captured"):
+    if not os.path.exists(folder):
+        os.makedirs(folder, exist_ok=True)
+    filename = os.path.join(folder, sanitize_filename(channel_name) + ".jpg")
+    # Use ffmpeg to capture a single frame
+    cmd = [
+        "ffmpeg", "-y", "-i", stream_url, "-frames:v", "1", "-q:v", "2", filename
+    ]
+    try:
+        with span('ffmpeg_capture', cat='probe', channel=channel_name, host=stream_host(stream_url)):
+            run_command(cmd, timeout=10)
+    except Exception:
+        pass
+    return filename
+
+
+def stream_url_of(stream):
+    for key in ['url', 'stream_url', 'src']:
+        if key in stream:
+            return stream[key]
+    return None
+
+
+def api_stream_info(stream):
+    # Codec/resolution/fps already present on the stream JSON, if any
+    codec = stream.get('codec') or stream.get('codec_name')
+    resolution = stream.get('resolution')
+    if not resolution and 'width' in stream and 'height' in stream:
+        resolution = f"{stream['width']}x{stream['height']}"
+    fps = stream.get('fps') or stream.get('frame_rate')
+    return codec, resolution, fps
+
+
+# Dispatcharr stores what its proxy learned about a stream while it was being
+# watched (stream_stats) and when (stream_stats_updated_at). Those are as good
+# as a probe while they are recent.
+STREAM_STATS_MAX_AGE = 6 * 3600
+stream_stats_max_age = STREAM_STATS_MAX_AGE
+
+
+def set_stream_stats_max_age(seconds):
+    # 0 disables server stats entirely
+    global stream_stats_max_age
+    stream_stats_max_age = seconds
+
+
+def parse_timestamp(value):
+    # ISO 8601 from the API (Django emits "...Z" or "+00:00") -> epoch seconds
+    if not value:
+        return None
+    try:
+        if isinstance(value, (int, float)):
+            return float(value)
+        dt = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=timezone.utc)
+        return dt.timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def server_stream_stats(stream, max_age=None, now=None):
+    # (codec, resolution, fps) from the stream's stored stats, or Nones if missing/stale
+    max_age = stream_stats_max_age if max_age is None else max_age
+    stats = stream.get('stream_stats')
+    if isinstance(stats, str):
+        try:
+            stats = json.loads(stats)
+        except ValueError:
+            stats = None
+    if not max_age or not isinstance(stats, dict) or not stats:
+        return None, None, None
+    updated = parse_timestamp(stream.get('stream_stats_updated_at'))
+    if updated is None or (now or time.time()) - updated > max_age:
+        return None, None, None
+    codec = stats.get('video_codec') or stats.get('codec') or stats.get('codec_name')
+    resolution = stats.get('resolution')
+    if not resolution and stats.get('width') and stats.get('height'):
+        resolution = f"{stats['width']}x{stats['height']}"
+    fps = None
+    for key in ('source_fps', 'fps', 'frame_rate', 'avg_frame_rate'):
+        fps = parse_frame_rate(stats.get(key))
+        if fps:
+            break
+    return codec, resolution, fps
+
+
+def split_resolution(resolution):
+    try:
+        width, height = str(resolution).lower().split('x', 1)
+        return int(width), int(height)
+    except (AttributeError, ValueError):
+        return None, None
+
+
+class ProbeCache:
+    # Recent successful ffprobe results by URL, so a stream shared by several
+    # channels is probed once per ttl. Concurrent probes of the same URL collapse
+    # into one: later callers wait for the first.
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._inflight = {}
+
+    def probe(self, url, probe_fn):
+        # Returns (info, hit)
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry and time.monotonic() - entry[0] <= self.ttl:
+                METRICS.inc('probe_cache_hits_total')
+                return entry[1], True
+            event = self._inflight.get(url)
+            owner = event is None
+            if owner:
+                event = self._inflight[url] = threading.Event()
+        if not owner:
+            event.wait(timeout=30)
+            with self._lock:
+                entry = self._entries.get(url)
+            if entry:
+                METRICS.inc('probe_cache_hits_total')
+                return entry[1], True
+            return probe_fn(url), False
+        try:
+            info = probe_fn(url)
+            if info[0]:
+                with self._lock:
+                    self._entries[url] = (time.monotonic(), info)
+            return info, False
+        finally:
+            with self._lock:
+                self._inflight.pop(url, None)
+            event.set()
+
+
+probe_cache = None
+
+
+def set_probe_cache(cache):
+    global probe_cache
+    probe_cache = cache
+
+
+def stream_needs_probe(stream):
+    # True if probe_stream would have to open a connection to the stream
+    if all(api_stream_info(stream)):
+        return False
+    return not all(server_stream_stats(stream))
+
+
+def probe_stream(stream):
+    stream_url = stream_url_of(stream)
+    codec, resolution, fps = api_stream_info(stream)
+    probe_ms = None
+    source = 'api'
+    if not codec or not resolution or not fps:
+        st_codec, st_res, st_fps = server_stream_stats(stream)
+        if st_codec and st_res and st_fps:
+            codec, resolution, fps = codec or st_codec, resolution or st_res, fps or st_fps
+            source = 'stats'
+            METRICS.inc('stream_stats_hits_total')
+    # If any are missing, use ffprobe
+    if not codec or not resolution or not fps:
+        ff_codec, ff_res, ff_fps = None, None, None
+        source = 'ffprobe'
+        if stream_url:
+            start = time.monotonic()
+            if probe_cache is not None:
+                (ff_codec, ff_res, ff_fps), hit = probe_cache.probe(stream_url, ffprobe_stream)
+            else:
+                (ff_codec, ff_res, ff_fps), hit = ffprobe_stream(stream_url), False
+            if hit:
+                source = 'cache'
+            else:
+                probe_ms = (time.monotonic() - start) * 1000
+                METRICS.inc('probes_total')
+                METRICS.observe('probe_duration_seconds', probe_ms / 1000)
+        codec = codec or ff_codec
+        resolution = resolution or ff_res
+        fps = fps or ff_fps
+    status = "Online" if codec and resolution and fps else "Offline"
+    if status == "Offline":
+        METRICS.inc('probe_failures_total')
+    return {
+        'ts': time.time(),
+        'stream_url': stream_url,
+        'status': status,
+        'codec': codec,
+        'resolution': resolution,
+        'fps': fps,
+        'probe_ms': probe_ms,
+        'source': source,
+    }
+
+
+def stream_host(url):
+    return urlparse(url).netloc.lower() if url else ""
+
+
+def fetch_proxy_status(dispatcharr_url, api_key, timeout=10):
+    # Channels Dispatcharr's TS proxy is currently streaming to viewers
+    METRICS.inc('api_calls_total', endpoint='proxy_status')
+    with span('proxy_status', cat='api'):
+        resp = api_get(f"{dispatcharr_url}/proxy/ts/status", api_key, timeout=timeout)
+        resp.raise_for_status()
+        data = resp.json()
+    if isinstance(data, dict):
+        data = data.get('channels', [])
+    return [ch for ch in data or [] if isinstance(ch, dict)]
+
+
+def fetch_m3u_accounts(dispatcharr_url, api_key, timeout=10):
+    # Provider accounts, with the max_streams limit the user configured for each
+    METRICS.inc('api_calls_total', endpoint='m3u_accounts')
+    with span('m3u_accounts', cat='api'):
+        resp = api_get(f"{dispatcharr_url}/api/m3u/accounts/", api_key, timeout=timeout)
+        resp.raise_for_status()
+        data = resp.json()
+    if isinstance(data, dict):
+        data = data.get('results', [])
+    return [a for a in data or [] if isinstance(a, dict)]
+
+
+def account_budgets(accounts):
+    # Stream host -> connections its provider accounts allow. A host with any
+    # unlimited (max_streams 0) account has no known budget and is left out.
+    budgets, unlimited = {}, set()
+    for account in accounts:
+        if account.get('is_active') is False:
+            continue
+        host = stream_host(account.get('server_url'))
+        if not host:
+            continue
+        try:
+            max_streams = int(account.get('max_streams') or 0)
+        except (TypeError, ValueError):
+            max_streams = 0
+        if max_streams <= 0:
+            unlimited.add(host)
+        else:
+            budgets[host] = budgets.get(host, 0) + max_streams
+    return {host: n for host, n in budgets.items() if host not in unlimited}
+
+
+class ActiveSessions:
+    # Snapshot of the proxy's live channels, refreshed at most every ttl
+    # seconds. Probing a watched stream opens a second upstream connection
+    # (and can kick the viewer on a 1-connection account), so live channels
+    # report the proxy's own stats instead and their connections count
+    # against the per-host budget. The M3U accounts' max_streams are read
+    # once, as the budget for hosts without an explicit --per-host.
+    def __init__(self, dispatcharr_url, api_key, ttl=15):
+        self.dispatcharr_url = dispatcharr_url
+        self.api_key = api_key
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._fetched = None
+        self._by_channel = {}
+        self._by_host = {}
+        self._budgets = None
+
+    def refresh(self, force=False):
+        # Single-flight: concurrent callers wait for one fetch instead of seeing an empty snapshot
+        with self._refresh_lock:
+            if not force and self._fetched is not None and time.monotonic() - self._fetched < self.ttl:
+                return
+            try:
+                live = fetch_proxy_status(self.dispatcharr_url, self.api_key)
+            except Exception:
+                # Older servers / no permission: behave as if nothing is live
+                live = []
+            if self._budgets is None:
+                try:
+                    self._budgets = account_budgets(fetch_m3u_accounts(self.dispatcharr_url, self.api_key))
+                except Exception:
+                    # No permission to read accounts: no provider budgets known
+                    self._budgets = {}
+            by_channel, by_host = {}, {}
+            for ch in live:
+                if str(ch.get('state', 'active')).lower() != 'active':
+                    continue
+                by_channel[str(ch.get('channel_id'))] = ch
+                host = stream_host(ch.get('url') or ch.get('stream_url'))
+                if host:
+                    by_host[host] = by_host.get(host, 0) + 1
+            with self._lock:
+                self._by_channel = by_channel
+                self._by_host = by_host
+            self._fetched = time.monotonic()
+
+    def lookup(self, channel):
+        self.refresh()
+        with self._lock:
+            for key in (channel.get('uuid'), channel.get('id')):
+                if key is not None and str(key) in self._by_channel:
+                    return self._by_channel[str(key)]
+        return None
+
+    def host_connections(self, host):
+        with self._lock:
+            return self._by_host.get(host, 0)
+
+    def host_budget(self, host):
+        # The provider's max_streams for this host, 0 when unknown/unlimited
+        return (self._budgets or {}).get(host, 0)
+
+
+def live_result(channel, status):
+    # Result dict built from the proxy's live stats, no connection opened
+    codec = status.get('video_codec')
+    resolution = status.get('resolution')
+    if not resolution and status.get('width') and status.get('height'):
+        resolution = f"{status['width']}x{status['height']}"
+    fps = parse_frame_rate(status.get('source_fps') or status.get('fps'))
+    METRICS.inc('live_sessions_total')
+    return {
+        'ts': time.time(),
+        'channel_id': channel.get('id'),
+        'channel_name': channel.get('name'),
+        'stream_url': status.get('url') or status.get('stream_url'),
+        # Viewers are receiving it right now, whatever stats the proxy has gathered so far
+        'status': "Online",
+        'codec': codec,
+        'resolution': resolution,
+        'fps': fps,
+        'probe_ms': None,
+        'source': 'live',
+        'viewers': status.get('client_count'),
+    }
+
+
+def busy_result(stream):
+    # Not probed: viewers already hold every connection the provider allows
+    return {
+        'ts': time.time(),
+        'stream_url': stream_url_of(stream),
+        'status': "Busy",
+        'codec': None,
+        'resolution': None,
+        'fps': None,
+        'probe_ms': None,
+        'source': 'skipped',
+    }
+
+
+def host_capacity(host, per_host=0, sessions=None):
+    # Connections left for probes on host: its budget minus live viewers, or
+    # None when there is no real budget (no --per-host, no account limit)
+    budget = per_host or (sessions.host_budget(host) if sessions else 0)
+    if not budget:
+        return None
+    reserved = sessions.host_connections(host) if sessions else 0
+    return budget - reserved
+
+
+class HostLimiter:
+    # Caps concurrent probes per stream host, so many workers don't pile onto
+    # one provider's connection limit. The budget is --per-host, else the
+    # provider account's max_streams (ActiveSessions.host_budget); connections
+    # held by live viewers use up part of it. Hosts without a known budget
+    # are never limited: the worker count says nothing about the provider.
+    def __init__(self, per_host=0, sessions=None):
+        self.per_host = per_host      # 0 = use the account's max_streams
+        self.sessions = sessions
+        self._cond = threading.Condition()
+        self._inflight = {}
+
+    def _capacity(self, host):
+        return host_capacity(host, self.per_host, self.sessions)
+
+    @contextmanager
+    def limit(self, url):
+        # Yields False when viewers already hold the host's whole budget
+        if not url:
+            yield True
+            return
+        host = stream_host(url)
+        if self._capacity(host) is None:
+            yield True
+            return
+        with self._cond:
+            while True:
+                capacity = self._capacity(host)
+                if capacity is None:
+                    capacity = float('inf')
+                if capacity <= 0 or self._inflight.get(host, 0) < capacity:
+                    break
+                self._cond.wait(timeout=1.0)
+            if capacity <= 0:
+                allowed = False
+            else:
+                allowed = True
+                self._inflight[host] = self._inflight.get(host, 0) + 1
+        if not allowed:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            with self._cond:
+                self._inflight[host] -= 1
+                self._cond.notify_all()
+
+    def observe(self, url, result):
+        # Fixed limits don't learn from results (see dispatcharr_aimd.AdaptiveLimiter)
+        pass
+
+
+NO_STREAMS = "No streams available"
+CAPTURE_PROBED = 'probed'   # snapshot the streams that are probed anyway (GUI preview)
+CAPTURE_ALL = 'all'         # snapshot every stream, even one with fresh stats (CLI --capture-images)
+
+
+def analyze_channel(channel_id, name, channel, url, api_key, run, limiter=None, sessions=None, catalogue=None,
+                    plan=None, incremental=None, capture=None, on_result=None, on_error=None, on_preview=None):
+    # One channel of an analyze run, as the CLI, the GUI, the probe service and
+    # the benchmarks all run it: live viewers, streams (M3U catalogue or API),
+    # --incremental reuse, deadline tier, per-host slot, probe and capture.
+    #   on_result(results, measured)     measured: probed in this run, not live or reused
+    #   on_error(category, message, host) streams fetch failed or the channel has none
+    #   on_preview()                      first snapshot of the channel was written
+    # A run cancelled without a plan killed the probes: the channel gets no
+    # result at all rather than one reported Offline. With a plan it gets the
+    # deadline's Stale results instead.
+    limiter = limiter or HostLimiter()
+    live = sessions.lookup(channel) if sessions else None
+    if live is not None:
+        on_result([live_result({'id': channel_id, 'name': name}, live)], False)
+        return
+    try:
+        if catalogue is not None:
+            channel_streams = catalogue.streams_for(channel)
+        else:
+            channel_streams = fetch_channel_streams(url, api_key, channel.get('id', channel_id))
+    except Exception as e:
+        category, host = classify(e)
+        on_error(category, f"Fetch streams: {e}", host or stream_host(url))
+        return
+    if not channel_streams:
+        on_error('no streams', NO_STREAMS, stream_host(url))
+        return
+    if incremental:
+        from dispatcharr_incremental import stream_fingerprint
+        fingerprint = stream_fingerprint(channel_streams)
+        previous = incremental.reuse(channel_id, fingerprint)
+        if previous is not None:
+            on_result(previous, False)
+            return
+    if plan is not None:
+        plan.note_channel(len(channel_streams))
+    results = []
+    preview = False
+    for stream in channel_streams:
+        stream_url = stream_url_of(stream)
+        # Fresh server-side stats stand in for ffprobe: unless every stream is
+        # to be captured, no connection at all then, so no slot and no tier
+        needs_connection = stream_needs_probe(stream) or capture == CAPTURE_ALL
+        # With a time budget the tail degrades: no capture, stored stats, last results
+        tier = plan.tier(stream_url, run) if plan is not None and needs_connection else 'full'
+        result = plan.quick_result(stream, tier) if plan is not None and needs_connection else None
+        if result is None:
+            with limiter.limit(stream_url if needs_connection else None) as allowed:
+                if allowed:
+                    result = probe_stream(stream)
+                    if capture and needs_connection and stream_url and tier == 'full' and not run.cancelled():
+                        result['image'] = capture_image_from_stream(stream_url, name)
+                        if on_preview is not None and not preview:
+                            on_preview()
+                            preview = True
+                else:
+                    result = busy_result(stream)
+            limiter.observe(stream_url, result)
+            if plan is not None:
+                plan.observe(stream_url, result)
+                if run.cancelled() and result['status'] != "Online":
+                    # Killed at the deadline: not measured, so not Offline either
+                    result = plan.stale_result(stream=stream)
+        if run.cancelled() and plan is None:
+            return
+        result['channel_id'] = channel_id
+        result['channel_name'] = name
+        results.append(result)
+    if incremental and not run.cancelled():
+        incremental.update(channel_id, fingerprint, results)
+    on_result(results, True)
+
+
+def probe_channel(dispatcharr_url, api_key, channel, sessions=None):
+    # Fetch and probe every stream of one channel; raises if the streams fetch fails
+    channel_id = channel.get('id')
+    live = sessions.lookup(channel) if sessions else None
+    if live is not None:
+        return [live_result(channel, live)]
+    results = []
+    for stream in fetch_channel_streams(dispatcharr_url, api_key, channel_id) or []:
+        result = probe_stream(stream)
+        result['channel_id'] = channel_id
+        result['channel_name'] = channel.get('name')
+        results.append(result)
+    return results
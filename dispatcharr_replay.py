@@ -0,0 +1,228 @@
+import hashlib
+import json
+import os
+import subprocess
+import threading
+import time
+import zipfile
+from urllib.parse import urlparse, parse_qsl, urlencode
+
+import requests
+
+import dispatcharr_probe
+
+# Record/replay of everything the analyze pipeline gets from the outside
+# world: Dispatcharr API responses (requests.Session.request) and
+# ffprobe/ffmpeg runs (dispatcharr_probe.run_command), with their timings.
+# A fixture is a zip with manifest.json plus content-addressed blobs, so a
+# lineup where many channels return identical JSON stays small.
+# Replaying a fixture gives the same inputs every time, at the recorded
+# latencies times a speed factor (0 = no delay).
+
+MANIFEST = "manifest.json"
+
+
+def _request_key(method, url, params=None):
+    parsed = urlparse(url)
+    query = parse_qsl(parsed.query) + sorted((params or {}).items())
+    return f"{method.upper()} {parsed.path}?{urlencode(sorted(query))}"
+
+
+def _command_key(cmd):
+    # The server address is not part of the key, so a fixture replays against any URL
+    return json.dumps([urlparse(a).path if str(a).startswith(('http://', 'https://')) else str(a) for a in cmd])
+
+
+class Recorder:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._blobs = {}
+        self._entries = {'http': [], 'commands': []}
+        self._original_request = None
+        self._original_run_command = None
+
+    def _blob(self, data):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        digest = hashlib.sha1(data or b"").hexdigest()
+        with self._lock:
+            self._blobs.setdefault(digest, data or b"")
+        return digest
+
+    def start(self):
+        recorder = self
+        original_request = self._original_request = requests.sessions.Session.request
+        original_run = self._original_run_command = dispatcharr_probe.run_command
+
+        def request(session, method, url, params=None, **kwargs):
+            started = time.monotonic()
+            entry = {'key': _request_key(method, url, params), 'ts': time.time()}
+            try:
+                resp = original_request(session, method, url, params=params, **kwargs)
+                body = resp.content  # read streamed bodies too, so they can be stored
+            except requests.RequestException as e:
+                entry.update({'elapsed': time.monotonic() - started, 'error': type(e).__name__, 'message': str(e)})
+                with recorder._lock:
+                    recorder._entries['http'].append(entry)
+                raise
+            entry.update({
+                'elapsed': time.monotonic() - started,
+                'status': resp.status_code,
+                'reason': resp.reason,
+                'content_type': resp.headers.get('Content-Type'),
+                'body': recorder._blob(body),
+            })
+            with recorder._lock:
+                recorder._entries['http'].append(entry)
+            return resp
+
+        def run_command(cmd, timeout, text=False):
+            started = time.monotonic()
+            entry = {'key': _command_key(cmd), 'ts': time.time()}
+            try:
+                result = original_run(cmd, timeout, text=text)
+            except subprocess.TimeoutExpired:
+                entry.update({'elapsed': time.monotonic() - started, 'timeout': True})
+                with recorder._lock:
+                    recorder._entries['commands'].append(entry)
+                raise
+            except OSError as e:
+                # e.g. ffprobe not installed: replays as the same failure
+                entry.update({'elapsed': time.monotonic() - started, 'error': str(e)})
+                with recorder._lock:
+                    recorder._entries['commands'].append(entry)
+                raise
+            entry.update({
+                'elapsed': time.monotonic() - started,
+                'returncode': result.returncode,
+                'stdout': recorder._blob(result.stdout),
+                'stderr': recorder._blob(result.stderr),
+            })
+            # ffmpeg captures: keep the frame it wrote so replay can write it again
+            output = cmd[-1] if cmd and cmd[0] == "ffmpeg" else None
+            if output and os.path.exists(output):
+                with open(output, 'rb') as f:
+                    entry['output'] = recorder._blob(f.read())
+            with recorder._lock:
+                recorder._entries['commands'].append(entry)
+            return result
+
+        requests.sessions.Session.request = request
+        dispatcharr_probe.run_command = run_command
+        return self
+
+    def stop(self):
+        if self._original_request is not None:
+            requests.sessions.Session.request = self._original_request
+            dispatcharr_probe.run_command = self._original_run_command
+            self._original_request = None
+        with self._lock:
+            manifest = dict(self._entries, version=1, recorded=time.strftime("%Y-%m-%dT%H:%M:%S"))
+            blobs = dict(self._blobs)
+        with zipfile.ZipFile(self.path, "w", zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr(MANIFEST, json.dumps(manifest))
+            for digest, data in blobs.items():
+                zf.writestr(f"blobs/{digest}", data)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class Replayer:
+    def __init__(self, path, speed=1.0):
+        # speed scales recorded latencies: 1.0 = as recorded, 0.5 = half, 0 = none
+        self.speed = speed
+        self._lock = threading.Lock()
+        self._zip = zipfile.ZipFile(path)
+        manifest = json.loads(self._zip.read(MANIFEST))
+        self._http = {}
+        self._commands = {}
+        for entry in manifest.get('http', []):
+            self._http.setdefault(entry['key'], []).append(entry)
+        for entry in manifest.get('commands', []):
+            self._commands.setdefault(entry['key'], []).append(entry)
+        self._next = {}
+        self.misses = 0
+        self._original_request = None
+        self._original_run_command = None
+
+    def _take(self, table, key):
+        # Repeated calls walk the recorded sequence, then keep returning the last one
+        entries = table.get(key)
+        if not entries:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            i = self._next.get(key, 0)
+            self._next[key] = i + 1
+        return entries[min(i, len(entries) - 1)]
+
+    def _blob(self, digest):
+        return self._zip.read(f"blobs/{digest}") if digest else b""
+
+    def _delay(self, entry):
+        if self.speed:
+            time.sleep(entry.get('elapsed', 0) * self.speed)
+
+    def start(self):
+        replayer = self
+        self._original_request = requests.sessions.Session.request
+        self._original_run_command = dispatcharr_probe.run_command
+
+        def request(session, method, url, params=None, **kwargs):
+            entry = replayer._take(replayer._http, _request_key(method, url, params))
+            if entry is None:
+                raise requests.ConnectionError(f"no recording for {method} {url}")
+            replayer._delay(entry)
+            if entry.get('error'):
+                error = getattr(requests.exceptions, entry['error'], requests.RequestException)
+                raise error(entry.get('message'))
+            resp = requests.Response()
+            resp.status_code = entry['status']
+            resp.reason = entry.get('reason')
+            resp.url = url
+            resp._content = replayer._blob(entry['body'])
+            resp._content_consumed = True
+            if entry.get('content_type'):
+                resp.headers['Content-Type'] = entry['content_type']
+            resp.encoding = 'utf-8'
+            return resp
+
+        def run_command(cmd, timeout, text=False):
+            entry = replayer._take(replayer._commands, _command_key(cmd))
+            if entry is None:
+                return subprocess.CompletedProcess(cmd, 1, "" if text else b"", "" if text else b"")
+            replayer._delay(entry)
+            if entry.get('timeout'):
+                raise subprocess.TimeoutExpired(cmd, timeout)
+            if 'error' in entry:
+                raise OSError(entry['error'])
+            if entry.get('output'):
+                with open(cmd[-1], 'wb') as f:
+                    f.write(replayer._blob(entry['output']))
+            stdout, stderr = replayer._blob(entry.get('stdout')), replayer._blob(entry.get('stderr'))
+            if text:
+                stdout, stderr = stdout.decode('utf-8', 'replace'), stderr.decode('utf-8', 'replace')
+            return subprocess.CompletedProcess(cmd, entry['returncode'], stdout, stderr)
+
+        requests.sessions.Session.request = request
+        dispatcharr_probe.run_command = run_command
+        return self
+
+    def stop(self):
+        if self._original_request is not None:
+            requests.sessions.Session.request = self._original_request
+            dispatcharr_probe.run_command = self._original_run_command
+            self._original_request = None
+        self._zip.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
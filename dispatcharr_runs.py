@@ -0,0 +1,202 @@
+import heapq
+import sys
+import threading
+import time
+import traceback
+
+from dispatcharr_probe import set_process_owner
+
+# An analyze run: a priority queue of channels drained by a fixed set of
+# worker threads. Runs can be paused, cancelled (killing in-flight
+# ffprobe/ffmpeg children) and extended while running, so a second
+# "Analyze" click merges into the active run instead of doubling the load.
+
+PRIORITY_SELECTED = 0
+PRIORITY_VISIBLE = 1
+PRIORITY_NORMAL = 2
+
+
+class AnalyzeRun:
+    def __init__(self, task_fn, max_workers=4, key_fn=None, on_done=None, on_error=None):
+        # task_fn(item) does the work; key_fn(item) identifies duplicates;
+        # on_error(item, exception) gets what task_fn raised (default: traceback on stderr)
+        self.task_fn = task_fn
+        self.max_workers = max(1, int(max_workers))
+        self.key_fn = key_fn or (lambda item: item)
+        self.on_done = on_done
+        self.on_error = on_error
+        self.failed = 0
+        self._heap = []
+        self._queued = {}       # key -> (priority, seq, item) of the live heap entry
+        self._seen = set()      # every key ever accepted (queued, running or done)
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._paused = False
+        self._cancelled = False
+        self._finished = False
+        self._workers = 0
+        self._procs = set()
+        self.total = 0
+        self.completed = 0
+        self.active = 0
+        self.started_at = None
+
+    # --- queue ---
+    def add(self, items, priority=PRIORITY_NORMAL):
+        # Returns how many new items were queued, or None if the run is over
+        with self._lock:
+            if self._finished or self._cancelled:
+                return None
+            added = 0
+            for item in items:
+                key = self.key_fn(item)
+                if key in self._seen:
+                    self._reprioritize(key, priority)
+                    continue
+                self._seen.add(key)
+                self._push(key, item, priority)
+                added += 1
+            self.total += added
+            self._cond.notify_all()
+            return added
+
+    def prioritize(self, keys, priority):
+        with self._lock:
+            for key in keys:
+                self._reprioritize(key, priority)
+
+    def _push(self, key, item, priority):
+        self._seq += 1
+        self._queued[key] = (priority, self._seq, item)
+        heapq.heappush(self._heap, (priority, self._seq, key))
+
+    def _reprioritize(self, key, priority):
+        # Only queued items can move, and only ahead; the stale entry is skipped on pop
+        current = self._queued.get(key)
+        if current is not None and priority < current[0]:
+            self._push(key, current[2], priority)
+
+    def _pop(self):
+        while self._heap:
+            priority, seq, key = heapq.heappop(self._heap)
+            current = self._queued.get(key)
+            if current is not None and current[:2] == (priority, seq):
+                del self._queued[key]
+                return current[2]
+        return None
+
+    # --- control ---
+    def start(self):
+        self.started_at = time.time()
+        with self._lock:
+            self._workers = self.max_workers
+        for _ in range(self.max_workers):
+            threading.Thread(target=self._worker, daemon=True).start()
+
+    def pause(self):
+        with self._lock:
+            self._paused = True
+
+    def resume(self):
+        with self._lock:
+            self._paused = False
+            self._cond.notify_all()
+
+    def paused(self):
+        return self._paused
+
+    def cancel(self):
+        with self._lock:
+            self._cancelled = True
+            self._heap.clear()
+            self._queued.clear()
+            procs = list(self._procs)
+            self._cond.notify_all()
+        for proc in procs:
+            try:
+                proc.kill()
+            except Exception:
+                pass
+
+    def cancelled(self):
+        return self._cancelled
+
+    def running(self):
+        return not self._finished
+
+    # --- child processes (called by dispatcharr_probe.run_command) ---
+    def register(self, proc):
+        with self._lock:
+            if self._cancelled:
+                proc.kill()
+            else:
+                self._procs.add(proc)
+
+    def unregister(self, proc):
+        with self._lock:
+            self._procs.discard(proc)
+
+    # --- workers ---
+    def _worker(self):
+        set_process_owner(self)
+        exited = last = False
+        try:
+            while True:
+                with self._lock:
+                    item = None
+                    while not self._cancelled:
+                        if self._paused:
+                            self._cond.wait(timeout=0.5)
+                            continue
+                        item = self._pop()
+                        # Idle workers linger while others run: a merge may still add work
+                        if item is not None or self.active == 0:
+                            break
+                        self._cond.wait(timeout=0.5)
+                    if item is None:
+                        # Decided under the same lock add() takes, so nothing is
+                        # accepted after the last worker has left
+                        exited = True
+                        last = self._exit()
+                        break
+                    self.active += 1
+                try:
+                    self.task_fn(item)
+                except Exception as e:
+                    self._failed(item, e)
+                finally:
+                    with self._lock:
+                        self.active -= 1
+                        self.completed += 1
+                        self._cond.notify_all()
+        finally:
+            set_process_owner(None)
+            if not exited:
+                with self._lock:
+                    last = self._exit()
+            if last and self.on_done:
+                self.on_done(self)
+
+    def _exit(self):
+        # Lock held; True for the last worker out, which finishes the run
+        self._workers -= 1
+        if self._workers == 0:
+            self._finished = True
+        return self._finished
+
+    def _failed(self, item, error):
+        with self._lock:
+            self.failed += 1
+        if self.on_error is not None:
+            try:
+                self.on_error(item, error)
+                return
+            except Exception:
+                pass
+        print(f"Analyze task failed for {self.key_fn(item)!r}:", file=sys.stderr)
+        traceback.print_exception(type(error), error, error.__traceback__, file=sys.stderr)
+
+    def progress(self):
+        with self._lock:
+            return self.completed, self.total, self.active
@@ -0,0 +1,134 @@
+import threading
+
+from dispatcharr_auth import TokenManager, token_manager
+from dispatcharr_probe import fetch_channels, fetch_channel_streams, probe_stream, ActiveSessions, live_result, ProbeCache, set_probe_cache
+import dispatcharr_probe
+
+# Several Dispatcharr instances monitored from one process. Profiles come from
+# the config's SERVERS list ({"name", "url", "api_key"}, optionally
+# "refresh_token"/"username"/"password" so the token is renewed); without it
+# the single DISPATCHARR_URL/API_KEY pair is the only profile, and nothing changes.
+# All servers share the probe engine: one scheduler / worker pool (the global
+# connection budget), one ProbeCache keyed by stream URL (so a provider stream
+# several servers carry is probed once) and the per-host viewer budget, summed
+# over every server's live sessions.
+# Channels are tagged with their server; channel_key() ("server/id") keeps
+# ids from different servers apart in rows, history and incremental state.
+
+DEFAULT_SERVER = "default"
+SHARED_CACHE_TTL = 300
+
+
+def load_profiles(config):
+    profiles = []
+    for i, entry in enumerate(config.get("SERVERS") or []):
+        if entry.get("url"):
+            url = entry["url"].rstrip('/')
+            tokens = TokenManager(url, entry.get("api_key", ""), entry.get("refresh_token"), entry.get("username"), entry.get("password"))
+            profiles.append({'name': str(entry.get("name") or f"server{i + 1}"), 'url': url, 'api_key': tokens})
+    if not profiles:
+        url = (config.get("DISPATCHARR_URL") or "").rstrip('/')
+        profiles.append({'name': DEFAULT_SERVER, 'url': url, 'api_key': token_manager(url, config)})
+    return profiles
+
+
+def channel_key(channel):
+    server = channel.get('server')
+    return f"{server}/{channel.get('id')}" if server else str(channel.get('id'))
+
+
+class ServerPool:
+    def __init__(self, profiles, probe_live=False, cache_ttl=SHARED_CACHE_TTL):
+        self.profiles = {p['name']: p for p in profiles}
+        self.sessions = {} if probe_live else {p['name']: ActiveSessions(p['url'], p['api_key']) for p in profiles}
+        self.errors = {}
+        # Streams common to several servers are probed once per ttl
+        if self.multi() and dispatcharr_probe.probe_cache is None:
+            set_probe_cache(ProbeCache(cache_ttl))
+
+    def names(self):
+        return list(self.profiles)
+
+    def multi(self):
+        return len(self.profiles) > 1
+
+    def _server(self, channel):
+        # Untagged channels (single server) belong to the only profile
+        return channel.get('server') or next(iter(self.profiles))
+
+    def auth(self, channel):
+        # (url, api_key) of the server a channel came from
+        profile = self.profiles[self._server(channel)]
+        return profile['url'], profile['api_key']
+
+    def fetch_channels(self):
+        # Every server's channels, fetched concurrently and tagged with 'server'
+        # (untagged with a single server, so its keys stay plain ids).
+        # A server that fails is skipped (see .errors) so the others still load.
+        results = {}
+        multi = self.multi()
+
+        def fetch(name, profile):
+            try:
+                channels = fetch_channels(profile['url'], profile['api_key'])
+                results[name] = [dict(ch, server=name) for ch in channels] if multi else channels
+            except Exception as e:
+                results[name] = e
+
+        threads = [threading.Thread(target=fetch, args=item, daemon=True) for item in self.profiles.items()]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.errors = {name: r for name, r in results.items() if isinstance(r, Exception)}
+        return [ch for name in self.profiles if isinstance(results.get(name), list) for ch in results[name]]
+
+    # --- ActiveSessions interface, across servers ---
+    def lookup(self, channel):
+        sessions = self.sessions.get(self._server(channel))
+        return sessions.lookup(channel) if sessions else None
+
+    def host_connections(self, host):
+        # A provider's connection limit is shared by every server that uses it
+        return sum(s.host_connections(host) for s in self.sessions.values())
+
+    def host_budget(self, host):
+        # Accounts on that provider across every server
+        return sum(s.host_budget(host) for s in self.sessions.values())
+
+    def streams(self, channel):
+        url, api_key = self.auth(channel)
+        return fetch_channel_streams(url, api_key, channel.get('id'))
+
+    def probe_channel(self, channel):
+        # probe_channel() for a tagged channel, results keyed by channel_key()
+        live = self.lookup(channel)
+        if live is not None:
+            result = live_result(channel, live)
+            result['channel_id'] = channel_key(channel)
+            if channel.get('server'):
+                result['server'] = channel['server']
+            return [result]
+        results = []
+        for stream in self.streams(channel) or []:
+            result = probe_stream(stream)
+            result['channel_id'] = channel_key(channel)
+            result['channel_name'] = channel.get('name')
+            if channel.get('server'):
+                result['server'] = channel['server']
+            results.append(result)
+        return results
+
+    def catalogue(self, direct=True):
+        return _PoolCatalogue(self, direct)
+
+
+class _PoolCatalogue:
+    # M3UCatalogue per server, loaded on first use, same streams_for() interface
+    def __init__(self, pool, direct):
+        from dispatcharr_m3u import M3UCatalogue
+        self._catalogues = {name: M3UCatalogue(p['url'], p['api_key'], direct=direct) for name, p in pool.profiles.items()}
+        self._default = next(iter(self._catalogues.values()))
+
+    def streams_for(self, channel):
+        return self._catalogues.get(channel.get('server'), self._default).streams_for(channel)
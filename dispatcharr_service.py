@@ -0,0 +1,559 @@
+import argparse
+import os
+import secrets
+import subprocess
+import sys
+import threading
+import time
+from collections import deque
+from multiprocessing.connection import Client, Listener, AuthenticationError
+
+from dispatcharr_aimd import AdaptiveLimiter
+from dispatcharr_auth import TokenManager
+from dispatcharr_deadline import DeadlinePlan
+from dispatcharr_diff import Snapshot, notify
+from dispatcharr_errors import ErrorLog, classify
+from dispatcharr_history import HistoryStore
+from dispatcharr_incremental import IncrementalState
+from dispatcharr_probe import analyze_channel, set_stream_stats_max_age, CAPTURE_PROBED
+from dispatcharr_runs import AnalyzeRun
+from dispatcharr_servers import ServerPool
+
+# Analyze runs in a separate, long-lived process. The GUI hands a run (server
+# profiles, channels, settings) to this service over a local
+# multiprocessing.connection socket and only renders what comes back: ffprobe/
+# ffmpeg children, result bookkeeping, history writes and the GC churn of a
+# large run all stay out of the process that runs the Tk main loop. The
+# service is started detached, so closing or restarting the GUI doesn't stop
+# a run; the next GUI to connect replays the run's results so far and follows
+# it from there.
+#
+# Every run keeps an ordered event log (results, changed channels, errors,
+# previews, token renewals, done). A subscribed client is sent the events it
+# hasn't seen in batches, at most every BATCH_INTERVAL, with the run's
+# progress, rather than one message per result. Past MAX_EVENTS the oldest
+# half of the log is folded into a replay (latest result per channel,
+# changes, recent errors, latest token per server) for clients that connect
+# later, so a long run's log doesn't grow without bound.
+#
+#   {"op": "analyze", "profiles", "items": [(key, name, channel)], "settings"}
+#                                         -> {"run", "added", "merged"}
+#   {"op": "add", "items"}                -> {"added"}  (None: no run to merge into)
+#   {"op": "subscribe", "since": seq}     -> batches {"op": "batch", "run", "seq", "events", "progress", ...}
+#   {"op": "prioritize", "keys", "priority"}, {"op": "pause"}, {"op": "resume"}, {"op": "cancel"}
+#   {"op": "status"}                      -> {"run", "running", "progress", "clients"}
+#   {"op": "shutdown"}
+#
+# Requests carry an "id" that is echoed in their reply. Only local clients
+# holding the key in KEY_FILE (created on first use, mode 600) can connect.
+# `python dispatcharr_service.py` runs the service in the foreground,
+# `--stop` shuts a running one down.
+
+DEFAULT_PORT = 9879
+KEY_FILE = "dispatcharr_service.key"
+LOG_FILE = "dispatcharr_service.log"
+BATCH_INTERVAL = 0.25       # seconds between result batches to a client
+MAX_BATCH = 500             # events per batch message (a replay is sent in several)
+MAX_EVENTS = 20000          # events kept verbatim per run before the oldest are folded
+REPLAY_ERRORS = 200         # error events kept in the folded replay
+IDLE_EXIT = 1800            # seconds without a run or a client before the service exits
+CONNECT_TIMEOUT = 10.0
+
+
+def load_authkey(path=KEY_FILE):
+    if not os.path.exists(path):
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            with os.fdopen(fd, "w") as f:
+                f.write(secrets.token_hex(32))
+        except FileExistsError:
+            pass
+    with open(path, "r") as f:
+        return f.read().strip().encode()
+
+
+def profile_state(profile):
+    # A ServerPool profile as plain data; the service builds its own TokenManager from it
+    tokens = profile['api_key']
+    return {'name': profile['name'], 'url': profile['url'], 'api_key': str(tokens),
+            'refresh_token': getattr(tokens, 'refresh_token', None),
+            'username': getattr(tokens, 'username', None), 'password': getattr(tokens, 'password', None)}
+
+
+def connect(port=DEFAULT_PORT, spawn=True, timeout=CONNECT_TIMEOUT):
+    # Connection to the local service, starting it first if it isn't running
+    # (None if it isn't and spawn is off)
+    address = ('127.0.0.1', port)
+    authkey = load_authkey()
+    try:
+        return Client(address, authkey=authkey)
+    except ConnectionRefusedError:
+        if not spawn:
+            return None
+    start_service(port)
+    deadline = time.monotonic() + timeout
+    while True:
+        time.sleep(0.2)
+        try:
+            return Client(address, authkey=authkey)
+        except ConnectionRefusedError:
+            if time.monotonic() > deadline:
+                raise
+
+
+def start_service(port=DEFAULT_PORT):
+    # Detached from the caller's session/console, so it outlives the GUI
+    kwargs = {}
+    if os.name == 'nt':
+        kwargs['creationflags'] = subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP
+    else:
+        kwargs['start_new_session'] = True
+    with open(LOG_FILE, "a") as log:
+        return subprocess.Popen([sys.executable, os.path.abspath(__file__), "--port", str(port)], cwd=os.getcwd(),
+                                stdin=subprocess.DEVNULL, stdout=log, stderr=subprocess.STDOUT, **kwargs)
+
+
+class ServiceRun:
+    # One analyze run inside the service: what the GUI's _start_analyze_run /
+    # _load_selected_data do (both around analyze_channel), with every row
+    # update turned into an event
+    def __init__(self, run_id, profiles, items, settings, history, snapshot):
+        self.id = run_id
+        self.settings = settings
+        self.history = history
+        self.snapshot = snapshot
+        self.errors = ErrorLog()
+        self.events = []
+        self._folded = 0               # seq of events[0]: events before it live in the replay
+        self._replay_results = {}      # channel_id -> latest folded result event
+        self._replay_changed = []
+        self._replay_errors = deque(maxlen=REPLAY_ERRORS)
+        self._replay_tokens = {}       # server -> latest folded token event
+        self._lock = threading.Lock()
+        self._changes = []
+        self._items = []
+        self.tokens = {}
+        for p in profiles:
+            self.tokens[p['name']] = TokenManager(p['url'], p['api_key'], p.get('refresh_token'), p.get('username'),
+                                                  p.get('password'), self._token_callback(p['name']))
+        self.pool = ServerPool([{'name': p['name'], 'url': p['url'], 'api_key': self.tokens[p['name']]} for p in profiles])
+        max_workers = int(settings.get('max_workers') or 4)
+        self.limiter = AdaptiveLimiter(max_workers, int(settings.get('per_host') or 0), self.pool)
+        source = settings.get('source', "API")
+        self.catalogue = self.pool.catalogue(direct=source == "M3U") if source != "API" else None
+        self.incremental = None
+        if settings.get('incremental_max_age') is not None:
+            self.incremental = IncrementalState(max_age=settings['incremental_max_age'])
+        self.plan = None
+        if settings.get('deadline'):
+            self.plan = DeadlinePlan(settings['deadline'], max_workers, history)
+            items = self.plan.order(items, channel_id=lambda item: item[0], number=lambda item: item[2].get('channel_number'))
+        self.run = AnalyzeRun(self._task, max_workers=max_workers, key_fn=lambda item: str(item[0]), on_done=self._finished)
+        self.add(items)
+        if self.plan is not None:
+            self.plan.start(self.run)
+        self.run.start()
+
+    def _token_callback(self, server):
+        return lambda access, refresh: self._emit(kind='token', server=server, access=access, refresh=refresh)
+
+    def _emit(self, **event):
+        with self._lock:
+            self.events.append(event)
+            if len(self.events) > MAX_EVENTS:
+                self._fold(len(self.events) // 2)
+
+    def _fold(self, count):
+        # Folded events only matter to a client that connects later: a
+        # replay needs each channel's latest row, not every update of it
+        folded, self.events = self.events[:count], self.events[count:]
+        self._folded += count
+        for event in folded:
+            kind = event['kind']
+            if kind == 'result':
+                self._replay_results.pop(event['channel_id'], None)
+                self._replay_results[event['channel_id']] = event
+            elif kind == 'changed':
+                self._replay_changed.append(event)
+            elif kind == 'error':
+                self._replay_errors.append(event)
+            elif kind == 'token':
+                self._replay_tokens[event['server']] = event
+
+    def since(self, seq):
+        # (events after seq, next seq); a client behind the folded part of
+        # the log gets the replay in their place
+        with self._lock:
+            if seq < self._folded:
+                replay = (list(self._replay_results.values()) + self._replay_changed
+                          + list(self._replay_errors) + list(self._replay_tokens.values()))
+                if replay:
+                    return replay, self._folded
+                seq = self._folded
+            start = seq - self._folded
+            events = self.events[start:start + MAX_BATCH]
+            return events, seq + len(events)
+
+    def add(self, items):
+        added = self.run.add(items)
+        if added is not None:
+            with self._lock:
+                self._items.extend(items)
+        return added
+
+    def update_tokens(self, profiles):
+        # A merged request carries the GUI's current tokens (e.g. after a new login)
+        for p in profiles:
+            tokens = self.tokens.get(p['name'])
+            if tokens is not None and p['api_key'] and p['api_key'] not in tokens.issued:
+                tokens.set_token(p['api_key'], p.get('refresh_token'))
+
+    def _error(self, category, message, host="", channel_id=None, channel_name=None):
+        self.errors.record(category, message, host, channel_id, channel_name)
+        self._emit(kind='error', category=category, message=str(message), host=host or "",
+                   channel_id=channel_id, channel_name=channel_name)
+
+    def _exception(self, error, context, host="", channel_id=None, channel_name=None):
+        category, error_host = classify(error)
+        self._error(category, f"{context}: {error}", error_host or host, channel_id, channel_name)
+
+    def _result(self, channel_id, name, results):
+        self._emit(kind='result', channel_id=channel_id, name=name, results=results)
+
+    def _task(self, item):
+        channel_id, name, channel = item
+        try:
+            self._analyze(channel_id, name, channel)
+        except Exception as e:
+            self._exception(e, "Analyze", channel_id=channel_id, channel_name=name)
+            return
+        if self.plan is not None:
+            self.plan.done(channel_id)
+
+    def _analyze(self, channel_id, name, channel):
+        url, api_key = self.pool.auth(channel)
+        analyze_channel(channel_id, name, channel, url, api_key, self.run, self.limiter, self.pool, self.catalogue,
+                        self.plan, self.incremental, capture=CAPTURE_PROBED,
+                        on_result=lambda results, measured: self._channel_result(channel_id, name, results, measured),
+                        on_error=lambda category, message, host: self._channel_error(channel_id, name, category, message, host),
+                        on_preview=lambda: self._emit(kind='preview', name=name))
+
+    def _channel_result(self, channel_id, name, results, measured):
+        # As the GUI's _on_channel_result: only new measurements are recorded;
+        # the snapshot skips unmeasured results itself (dispatcharr_diff)
+        if measured:
+            self.history.record(results)
+        self._result(channel_id, name, results)
+        changes = self.snapshot.diff(channel_id, name, results)
+        if changes:
+            self._changes.extend(changes)
+            self._emit(kind='changed', channel_id=channel_id, changes=changes)
+
+    def _channel_error(self, channel_id, name, category, message, host):
+        self._error(category, message, host, channel_id, name)
+        self._result(channel_id, name, [])
+
+    def _finished(self, run):
+        # On the last worker thread, as the GUI's _on_run_finished
+        if self.incremental:
+            try:
+                self.incremental.save()
+            except Exception:
+                pass
+        try:
+            self.snapshot.save()
+        except Exception:
+            pass
+        hook_errors = notify(list(self._changes), self.settings.get('webhook'), self.settings.get('script'))
+        for error in hook_errors:
+            self._error('hook', error)
+        stale, expired = [], False
+        if self.plan is not None:
+            self.plan.stop()
+            expired = self.plan.expired()
+            with self._lock:
+                items = list(self._items)
+            stale = [(item[0], item[1], self.plan.stale_result({'id': item[0], 'name': item[1]}))
+                     for item in self.plan.pending(items, channel_id=lambda item: item[0])]
+        self._emit(kind='done', expired=expired, stale=stale, changes=list(self._changes),
+                   hook_errors=hook_errors, cancelled=run.cancelled())
+
+    def state(self):
+        completed, total, active = self.run.progress()
+        return {'run': self.id, 'progress': (completed, total, active), 'level': self.limiter.level(),
+                'max_workers': self.run.max_workers, 'paused': self.run.paused(), 'running': self.run.running()}
+
+
+class ProbeService:
+    def __init__(self, port=DEFAULT_PORT, idle_exit=IDLE_EXIT):
+        self._authkey = load_authkey()
+        self.listener = Listener(('127.0.0.1', port), authkey=self._authkey)
+        self.idle_exit = idle_exit
+        self.history = HistoryStore()
+        self.snapshot = Snapshot()
+        self.current = None
+        self.clients = 0
+        self._runs = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._idle_since = time.monotonic()
+
+    def serve(self):
+        threading.Thread(target=self._idle_watch, daemon=True).start()
+        while not self._stop.is_set():
+            try:
+                conn = self.listener.accept()
+            except (OSError, EOFError, AuthenticationError):
+                continue
+            threading.Thread(target=self._serve_client, args=(conn,), daemon=True).start()
+        self.listener.close()
+        self.history.close()
+
+    def shutdown(self):
+        self._stop.set()
+        run = self.current
+        if run is not None:
+            run.run.cancel()
+        # Wake the accept() in serve() so it sees the stop
+        try:
+            Client(self.listener.address, authkey=self._authkey).close()
+        except (OSError, AuthenticationError):
+            pass
+
+    def _idle_watch(self):
+        while not self._stop.wait(5.0):
+            run = self.current
+            if self.clients or (run is not None and run.run.running()):
+                self._idle_since = time.monotonic()
+            elif self.idle_exit and time.monotonic() - self._idle_since > self.idle_exit:
+                self.shutdown()
+
+    def _serve_client(self, conn):
+        # One thread per client: answers its requests and, once it has
+        # subscribed, sends it the current run's new events every BATCH_INTERVAL
+        with self._lock:
+            self.clients += 1
+        cursor = None      # (run, next seq) once subscribed
+        last_sent = 0.0
+        try:
+            while not self._stop.is_set():
+                if conn.poll(BATCH_INTERVAL):
+                    msg = conn.recv()
+                    if msg.get('op') == 'subscribe':
+                        cursor = (self.current, int(msg.get('since') or 0))
+                        last_sent = 0.0
+                    reply = self.handle(msg)
+                    if reply is not None:
+                        conn.send(dict(reply, id=msg.get('id')))
+                if cursor is None or time.monotonic() - last_sent < BATCH_INTERVAL:
+                    continue
+                run, seq = cursor
+                fresh = not last_sent
+                if run is not self.current:
+                    # A new run started: follow it from its first event
+                    run, seq, fresh = self.current, 0, True
+                if run is None:
+                    continue
+                # Progress goes out while the run is going even without new events
+                sent = False
+                while True:
+                    events, next_seq = run.since(seq)
+                    if not events and (sent or not (fresh or run.run.running())):
+                        break
+                    seq = next_seq
+                    conn.send(dict(run.state(), op='batch', seq=seq, events=events))
+                    sent = True
+                    if len(events) < MAX_BATCH:
+                        break
+                cursor = (run, seq)
+                last_sent = time.monotonic()
+        except (EOFError, OSError):
+            pass
+        finally:
+            with self._lock:
+                self.clients -= 1
+            conn.close()
+
+    def handle(self, msg):
+        op = msg.get('op')
+        run = self.current
+        if op == 'analyze':
+            if run is not None and run.run.running():
+                run.update_tokens(msg['profiles'])
+                added = run.add(msg['items'])
+                if added is not None:
+                    return {'op': 'analyze', 'run': run.id, 'added': added, 'merged': True}
+            set_stream_stats_max_age(msg['settings'].get('stream_stats_max_age', 6 * 3600))
+            with self._lock:
+                self._runs += 1
+                run_id = f"{os.getpid()}-{self._runs}"
+            run = self.current = ServiceRun(run_id, msg['profiles'], msg['items'], msg['settings'], self.history, self.snapshot)
+            return {'op': 'analyze', 'run': run.id, 'added': len(msg['items']), 'merged': False}
+        if op == 'add':
+            added = run.add(msg['items']) if run is not None and run.run.running() else None
+            return {'op': 'add', 'added': added}
+        if op == 'status':
+            state = run.state() if run is not None else {'run': None, 'running': False}
+            return dict(state, op='status', clients=self.clients)
+        if op == 'shutdown':
+            self.shutdown()
+            return {'op': 'shutdown'}
+        if run is None or op == 'subscribe':
+            return None
+        if op == 'prioritize':
+            run.run.prioritize(msg.get('keys') or [], msg.get('priority'))
+        elif op == 'pause':
+            run.run.pause()
+        elif op == 'resume':
+            run.run.resume()
+        elif op == 'cancel':
+            run.run.cancel()
+        return None
+
+
+class ServiceClient:
+    # The GUI's handle on the service run. Exposes AnalyzeRun's interface
+    # (running/progress/pause/cancel/add/prioritize...) from the latest batch,
+    # so code that drives a local run drives this one the same way; events are
+    # handed to on_batch(batch) on a reader thread.
+    def __init__(self, conn, on_batch, on_lost=None):
+        self.conn = conn
+        self.on_batch = on_batch
+        self.on_lost = on_lost
+        self.run_id = None
+        self.max_workers = 0
+        self.subscribed = False
+        self.closed = False
+        self._state = {}
+        self._done = True
+        self._cancelled = False
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._replies = {}      # request id -> [Event, reply]
+        self._next_id = 0
+        threading.Thread(target=self._read, daemon=True).start()
+
+    def _send(self, msg):
+        with self._send_lock:
+            self.conn.send(msg)
+
+    def _call(self, msg, timeout=CONNECT_TIMEOUT):
+        with self._send_lock:
+            self._next_id += 1
+            waiter = self._replies[self._next_id] = [threading.Event(), None]
+            self.conn.send(dict(msg, id=self._next_id))
+        waiter[0].wait(timeout)
+        return waiter[1]
+
+    def _read(self):
+        try:
+            while True:
+                msg = self.conn.recv()
+                waiter = self._replies.pop(msg.get('id'), None)
+                if waiter is not None:
+                    waiter[1] = msg
+                    waiter[0].set()
+                    continue
+                if msg.get('op') != 'batch':
+                    continue
+                with self._lock:
+                    self._switch(msg['run'])
+                    self._state = msg
+                    self.max_workers = msg['max_workers']
+                    for event in msg['events']:
+                        if event['kind'] == 'done':
+                            self._done = True
+                            self._cancelled = event['cancelled']
+                self.on_batch(msg)
+        except (EOFError, OSError):
+            self._done = self.closed = True
+            if self.on_lost is not None:
+                self.on_lost(self)
+
+    def _switch(self, run_id):
+        if run_id != self.run_id:
+            self.run_id = run_id
+            self._done = self._cancelled = False
+
+    def subscribe(self, since=0):
+        self.subscribed = True
+        self._send({'op': 'subscribe', 'since': since})
+
+    def status(self):
+        return self._call({'op': 'status'})
+
+    def analyze(self, profiles, items, settings):
+        reply = self._call({'op': 'analyze', 'profiles': profiles, 'items': items, 'settings': settings})
+        if reply is not None:
+            # Running from now on, not only once its first batch is in
+            with self._lock:
+                self._switch(reply['run'])
+        return reply
+
+    def close(self):
+        self.closed = True
+        try:
+            self.conn.close()
+        except OSError:
+            pass
+
+    # --- AnalyzeRun interface ---
+    def running(self):
+        return not self._done
+
+    def progress(self):
+        return tuple(self._state.get('progress', (0, 0, 0)))
+
+    def level(self):
+        return self._state.get('level', 0)
+
+    def add(self, items):
+        reply = self._call({'op': 'add', 'items': items})
+        return reply['added'] if reply is not None else None
+
+    def prioritize(self, keys, priority):
+        self._send({'op': 'prioritize', 'keys': list(keys), 'priority': priority})
+
+    def pause(self):
+        self._state = dict(self._state, paused=True)
+        self._send({'op': 'pause'})
+
+    def resume(self):
+        self._state = dict(self._state, paused=False)
+        self._send({'op': 'resume'})
+
+    def paused(self):
+        return self._state.get('paused', False)
+
+    def cancel(self):
+        self._cancelled = True
+        self._send({'op': 'cancel'})
+
+    def cancelled(self):
+        return self._cancelled
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dispatcharr Channel Status probe service (analyze runs for the GUI)")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f'Local port (default {DEFAULT_PORT})')
+    parser.add_argument('--idle-exit', type=float, default=IDLE_EXIT, help=f'Exit after this many seconds without a run or a client (default {IDLE_EXIT}, 0 = never)')
+    parser.add_argument('--stop', action='store_true', help='Shut down the running service')
+    parser.add_argument('--status', action='store_true', help='Show the running service\'s current run')
+    args = parser.parse_args()
+    if args.stop or args.status:
+        conn = connect(args.port, spawn=False)
+        if conn is None:
+            print("Service is not running.")
+            return
+        client = ServiceClient(conn, lambda batch: None)
+        reply = client._call({'op': 'shutdown' if args.stop else 'status'})
+        print("Service stopped." if args.stop else reply)
+        client.close()
+        return
+    service = ProbeService(args.port, args.idle_exit)
+    print(f"Probe service listening on 127.0.0.1:{args.port} (pid {os.getpid()})", flush=True)
+    service.serve()
+
+
+if __name__ == "__main__":
+    main()
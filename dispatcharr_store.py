@@ -0,0 +1,330 @@
+import sys
+import time
+import unicodedata
+from array import array
+
+from dispatcharr_probe import split_resolution
+from dispatcharr_servers import channel_key
+
+# Compact in-memory catalogue. The API returns a dict per channel with ~20
+# fields (logo, EPG, groups, profile ids, stream ids...) of which the tool only
+# reads five; a 50k-channel lineup kept as those dicts plus a string tuple per
+# result row costs hundreds of MB. Here a channel is a __slots__ record of the
+# fields in use, and the latest result of each channel lives in parallel
+# array columns indexed by the channel's row: status as a small code, width/
+# height/fps as numbers, codec as an interned string. channel_key() -> row is
+# a dict, so lookups by tree row / monitor key are O(1) instead of a scan.
+# benchmarks/memory_benchmark.py measures both layouts.
+# The store also answers the GUI's filter box: names are normalized once and
+# indexed by trigram, status/codec/resolution class/server keep a row bitmap
+# (an int, n/8 bytes) per value that add()/set_result() maintain, so a query is
+# a few bitmap ANDs plus verifying name candidates and the matches' fps, not a
+# pass over every row's strings.
+
+STATUS_CODES = {None: 0, "Online": 1, "Offline": 2, "Busy": 3, "Stale": 4}
+STATUS_NAMES = {code: name for name, code in STATUS_CODES.items()}
+UNKNOWN_STATUS = ('unknown', 'none', 'pending')
+
+# Resolution classes by frame height, and what "res:" accepts for each
+RESOLUTION_CLASSES = (('sd', 0), ('hd', 720), ('fhd', 1080), ('uhd', 2160))
+RESOLUTION_ALIASES = {'sd': 'sd', '480': 'sd', '576': 'sd', 'hd': 'hd', '720': 'hd', 'fhd': 'fhd',
+                      '1080': 'fhd', 'uhd': 'uhd', '4k': 'uhd', '2160': 'uhd'}
+FILTER_FIELDS = ('id', 'status', 'codec', 'res', 'fps', 'server')
+NGRAM = 3
+
+
+def _rows_to_mask(rows):
+    bits = bytearray((max(rows) >> 3) + 1 if rows else 0)
+    for row in rows:
+        bits[row >> 3] |= 1 << (row & 7)
+    return int.from_bytes(bits, 'little')
+
+
+_BYTE_BITS = [tuple(bit for bit in range(8) if byte >> bit & 1) for byte in range(256)]
+
+
+def _mask_to_rows(mask):
+    rows = []
+    table = _BYTE_BITS
+    for i, byte in enumerate(mask.to_bytes((mask.bit_length() + 7) >> 3, 'little')):
+        if byte:
+            base = i << 3
+            for bit in table[byte]:
+                rows.append(base + bit)
+    return rows
+
+
+def normalize(text):
+    # Case-folded, accents stripped, whitespace collapsed
+    text = unicodedata.normalize('NFKD', str(text or '')).casefold()
+    return ' '.join(''.join(c for c in text if not unicodedata.combining(c)).split())
+
+
+def resolution_class(height):
+    if not height:
+        return None
+    name = None
+    for cls, min_height in RESOLUTION_CLASSES:
+        if height >= min_height:
+            name = cls
+    return name
+
+
+def parse_query(text):
+    # "news status:online codec:h264 res:hd fps:25-30" -> (name terms, {field: [values]})
+    # Bare words match the name (substring) or the channel ID; repeating a
+    # field ORs its values, everything else is ANDed.
+    terms, fields = [], {}
+    for token in normalize(text).split():
+        field, sep, value = token.partition(':')
+        if sep and field in FILTER_FIELDS:
+            if value:
+                fields.setdefault(field, []).append(value)
+        else:
+            terms.append(token)
+    return terms, fields
+
+
+def parse_fps_range(value):
+    # "25", "24-30", ">50", "<30" -> (low, high)
+    try:
+        if value.startswith('>'):
+            return float(value[1:]), float('inf')
+        if value.startswith('<'):
+            return 0.0, float(value[1:])
+        low, sep, high = value.partition('-')
+        if sep:
+            return float(low or 0), float(high) if high else float('inf')
+        fps = float(value)
+        return fps - 0.5, fps + 0.5
+    except ValueError:
+        return None
+
+
+class ChannelRecord:
+    __slots__ = ('id', 'name', 'uuid', 'channel_number', 'server')
+
+    def __init__(self, channel):
+        self.id = channel.get('id')
+        self.name = channel.get('name')
+        self.uuid = channel.get('uuid')
+        self.channel_number = channel.get('channel_number')
+        self.server = channel.get('server')
+
+    # Read like the channel dict it replaces, so ch.get('name') callers keep working
+    def get(self, key, default=None):
+        value = getattr(self, key, None) if key in self.__slots__ else None
+        return default if value is None else value
+
+    def __getitem__(self, key):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key):
+        return key in self.__slots__ and getattr(self, key) is not None
+
+    def __repr__(self):
+        return f"ChannelRecord({channel_key(self)!r}, {self.name!r})"
+
+
+class CatalogueStore:
+    def __init__(self):
+        self.records = []
+        self._index = {}                # channel_key -> row
+        self.status = array('b')
+        self.width = array('i')         # 0 = unknown
+        self.height = array('i')
+        self.fps = array('f')           # 0.0 = unknown
+        self.updated = array('d')       # epoch of the last result, 0.0 = never
+        self.codec = []                 # interned strings (a handful of distinct values)
+        self.keys = []                  # channel_key per row
+        # Filter index
+        self._names = []                # normalized name per row
+        self._grams = {}                # name trigram -> array of rows
+        self._by_status = {}            # status code -> row bitmap (measured rows only)
+        self._by_codec = {}             # lowercased codec -> row bitmap
+        self._by_class = {}             # resolution class -> row bitmap
+        self._by_server = {}            # normalized server name -> (name, row bitmap)
+
+    def load(self, channels):
+        for ch in channels:
+            self.add(ch)
+        return self
+
+    def add(self, channel):
+        record = channel if isinstance(channel, ChannelRecord) else ChannelRecord(channel)
+        if record.name is not None:
+            record.name = sys.intern(str(record.name))
+        key = channel_key(record)
+        row = self._index.get(key)
+        if row is not None:
+            # Stale trigram postings are harmless: matches are verified against _names
+            self.records[row] = record
+            self._index_name(row, record.name)
+            return record
+        row = len(self.records)
+        self._index[key] = row
+        self.records.append(record)
+        self.keys.append(key)
+        self.status.append(0)
+        self.width.append(0)
+        self.height.append(0)
+        self.fps.append(0.0)
+        self.updated.append(0.0)
+        self.codec.append(None)
+        self._names.append('')
+        self._index_name(row, record.name)
+        if record.server:
+            name, mask = self._by_server.get(normalize(record.server), (record.server, 0))
+            self._by_server[normalize(record.server)] = (name, mask | 1 << row)
+        return record
+
+    def _index_name(self, row, name):
+        name = normalize(name)
+        self._names[row] = name
+        for gram in {name[i:i + NGRAM] for i in range(len(name) - NGRAM + 1)}:
+            postings = self._grams.get(gram)
+            if postings is None:
+                postings = self._grams[gram] = array('i')
+            postings.append(row)
+
+    def __len__(self):
+        return len(self.records)
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def __bool__(self):
+        return bool(self.records)
+
+    def get(self, key):
+        row = self._index.get(str(key))
+        return self.records[row] if row is not None else None
+
+    def row(self, key):
+        return self._index.get(str(key))
+
+    def set_result(self, key, result):
+        # Keep the channel's best result (as its tree row shows it) in the columns
+        row = self._index.get(str(key))
+        if row is None:
+            return
+        result = result or {}
+        width, height = split_resolution(result.get('resolution'))
+        try:
+            fps = float(result.get('fps') or 0.0)
+        except (TypeError, ValueError):
+            fps = 0.0
+        codec = sys.intern(str(result['codec'])) if result.get('codec') else None
+        status = STATUS_CODES.get(result.get('status'), 0)
+        self._move(self._by_status, row, self.status[row] or None, status or None)
+        self._move(self._by_codec, row, self.codec[row] and self.codec[row].lower(), codec and codec.lower())
+        self._move(self._by_class, row, resolution_class(self.height[row]), resolution_class(height))
+        self.status[row] = status
+        self.width[row] = width or 0
+        self.height[row] = height or 0
+        self.fps[row] = fps
+        self.updated[row] = result.get('ts') or time.time()
+        self.codec[row] = codec
+
+    def _move(self, index, row, old, new):
+        if old == new:
+            return
+        if old is not None:
+            index[old] = index.get(old, 0) & ~(1 << row)
+        if new is not None:
+            index[new] = index.get(new, 0) | 1 << row
+
+    def result(self, key):
+        # The stored result as a dict (same keys as a probe result), or None if none yet
+        row = self._index.get(str(key))
+        if row is None or not self.updated[row]:
+            return None
+        width, height = self.width[row], self.height[row]
+        return {
+            'channel_id': str(key), 'status': STATUS_NAMES.get(self.status[row]), 'codec': self.codec[row],
+            'resolution': f"{width}x{height}" if width and height else None,
+            'fps': round(self.fps[row], 2) if self.fps[row] else None, 'ts': self.updated[row],
+        }
+
+    # --- filtering ---
+    def filter(self, query, server=None):
+        # Keys of the rows matching a filter query (see parse_query) and, if
+        # given, a server; None when nothing is filtered
+        terms, fields = parse_query(query)
+        if not terms and not fields and server is None:
+            return None
+        mask = (1 << len(self.records)) - 1
+        if server is not None:
+            mask &= self._by_server.get(normalize(server), (None, 0))[1]
+        for field, values in fields.items():
+            if field != 'fps':
+                found = 0
+                for value in values:
+                    found |= self._match_field(field, value)
+                mask &= found
+        # Name terms last; short ones are a scan, so only of the rows still in
+        for term in terms:
+            if not mask:
+                break
+            mask &= self._match_term(term, mask)
+        rows = _mask_to_rows(mask)
+        if 'fps' in fields:
+            ranges = [r for r in (parse_fps_range(v) for v in fields['fps']) if r is not None]
+            fps = self.fps
+            if len(ranges) == 1:
+                low, high = ranges[0]
+                rows = [row for row in rows if fps[row] and low <= fps[row] <= high]
+            else:
+                rows = [row for row in rows if fps[row] and any(low <= fps[row] <= high for low, high in ranges)]
+        keys = self.keys
+        return {keys[row] for row in rows}
+
+    def _match_term(self, term, within):
+        # Name substring (trigram candidates, then verified) or the channel ID / key
+        names = self._names
+        if len(term) < NGRAM:
+            rows = [row for row in _mask_to_rows(within) if term in names[row]]
+        else:
+            postings = []
+            for i in range(len(term) - NGRAM + 1):
+                found = self._grams.get(term[i:i + NGRAM])
+                if found is None:
+                    postings = None
+                    break
+                postings.append(found)
+            rows = []
+            if postings:
+                postings.sort(key=len)
+                candidates = set(postings[0])
+                for other in postings[1:]:
+                    candidates.intersection_update(other)
+                rows = [row for row in candidates if term in names[row]]
+        return _rows_to_mask(rows) | self._match_field('id', term)
+
+    def _match_field(self, field, value):
+        # Row bitmap of one "field:value"
+        if field == 'id':
+            # The key itself, or the plain id on any server
+            rows = [self._index.get(value)] + [self._index.get(f"{name}/{value}") for name, _ in self._by_server.values()]
+            return _rows_to_mask([row for row in rows if row is not None])
+        mask = 0
+        if field == 'status':
+            if value in UNKNOWN_STATUS:
+                mask = (1 << len(self.records)) - 1
+                for found in self._by_status.values():
+                    mask &= ~found
+                return mask
+            for code, found in self._by_status.items():
+                if STATUS_NAMES[code].lower().startswith(value):
+                    mask |= found
+        elif field == 'codec':
+            for codec, found in self._by_codec.items():
+                if codec.startswith(value):
+                    mask |= found
+        elif field == 'res':
+            mask = self._by_class.get(RESOLUTION_ALIASES.get(value.rstrip('p')), 0)
+        elif field == 'server':
+            mask = self._by_server.get(value, (None, 0))[1]
+        return mask
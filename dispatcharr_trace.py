@@ -0,0 +1,101 @@
+import json
+import os
+import threading
+import time
+
+# Span timing for analyze runs, exported as Chrome Trace Event JSON (open in
+# chrome://tracing or https://ui.perfetto.dev). Tracing is off by default and
+# span() then returns a shared no-op object, so instrumented code pays one
+# global lookup per phase.
+
+
+class _NoSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NO_SPAN = _NoSpan()
+
+
+class _Span:
+    __slots__ = ('tracer', 'name', 'cat', 'args', 'start')
+
+    def __init__(self, tracer, name, cat, args):
+        self.tracer = tracer
+        self.name = name
+        self.cat = cat
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter_ns()
+        if exc_type is not None:
+            self.args['error'] = exc_type.__name__
+        self.tracer.add(self.name, self.cat, self.start, end, self.args)
+        return False
+
+
+class Tracer:
+    def __init__(self):
+        self.origin = time.perf_counter_ns()
+        self.pid = os.getpid()
+        self._lock = threading.Lock()
+        self._events = []
+        self._threads = {}
+
+    def add(self, name, cat, start, end, args):
+        thread = threading.current_thread()
+        event = {
+            'name': name, 'cat': cat, 'ph': 'X', 'pid': self.pid, 'tid': thread.ident,
+            'ts': (start - self.origin) / 1000, 'dur': (end - start) / 1000, 'args': args,
+        }
+        with self._lock:
+            self._events.append(event)
+            if thread.ident not in self._threads:
+                self._threads[thread.ident] = thread.name
+
+    def events(self):
+        with self._lock:
+            events = list(self._events)
+            threads = dict(self._threads)
+        meta = [{'name': 'thread_name', 'ph': 'M', 'pid': self.pid, 'tid': tid, 'args': {'name': name}}
+                for tid, name in threads.items()]
+        return meta + events
+
+    def write(self, path):
+        with open(path, "w") as f:
+            json.dump({'traceEvents': self.events(), 'displayTimeUnit': 'ms'}, f)
+        return path
+
+
+_tracer = None
+
+
+def enable():
+    global _tracer
+    _tracer = Tracer()
+    return _tracer
+
+
+def disable():
+    # Returns the tracer that was running (to write it out), or None
+    global _tracer
+    tracer, _tracer = _tracer, None
+    return tracer
+
+
+def enabled():
+    return _tracer is not None
+
+
+def span(name, cat="analyze", **args):
+    tracer = _tracer
+    if tracer is None:
+        return NO_SPAN
+    return _Span(tracer, name, cat, args)